@@ -0,0 +1,82 @@
+from __future__ import annotations
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Set, Tuple
+
+import numpy as np
+
+class SemanticAnswerCache:
+    """Size-bounded semantic cache of /ask answers.
+
+    Question embeddings are bucketed with random-hyperplane LSH (`n_tables` tables of
+    `n_planes` bits) so a lookup only compares against the few entries that share a
+    bucket; candidates are then verified with exact cosine against `threshold`.
+    Entries are partitioned by `scope` (model, prompt version, KB version) and
+    evicted in LRU order once `maxsize` is reached.
+    """
+
+    def __init__(self, threshold: float = 0.92, maxsize: int = 2048,
+                 n_tables: int = 6, n_planes: int = 10, seed: int = 13):
+        self.threshold, self.maxsize = threshold, maxsize
+        self.n_tables, self.n_planes = n_tables, n_planes
+        self._rng = np.random.default_rng(seed)
+        self._planes: Optional[np.ndarray] = None  # (n_tables, n_planes, dim), created on first vector
+        self._buckets: Dict[Tuple[Hashable, int, int], Set[int]] = {}
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()  # id -> (scope, vec, sigs, value)
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _unit(vec) -> np.ndarray:
+        v = np.asarray(vec, dtype=np.float32).ravel()
+        n = float(np.linalg.norm(v))
+        return v / n if n else v
+
+    def _signatures(self, v: np.ndarray) -> List[int]:
+        if self._planes is None:
+            self._planes = self._rng.standard_normal((self.n_tables, self.n_planes, v.shape[0])).astype(np.float32)
+        bits = (self._planes @ v) > 0  # (n_tables, n_planes)
+        weights = 1 << np.arange(self.n_planes)
+        return [int(x) for x in (bits * weights).sum(axis=1)]
+
+    def lookup(self, scope: Hashable, vec) -> Optional[Tuple[Any, float]]:
+        v = self._unit(vec)
+        with self._lock:
+            if not self._entries:
+                return None
+            sigs = self._signatures(v)
+            cand: Set[int] = set()
+            for t, sig in enumerate(sigs):
+                cand |= self._buckets.get((scope, t, sig), set())
+            best_id, best_sim = None, -1.0
+            for eid in cand:
+                sim = float(np.dot(self._entries[eid][1], v))
+                if sim > best_sim:
+                    best_id, best_sim = eid, sim
+            if best_id is None or best_sim < self.threshold:
+                return None
+            self._entries.move_to_end(best_id)
+            return self._entries[best_id][3], best_sim
+
+    def store(self, scope: Hashable, vec, value: Any) -> None:
+        v = self._unit(vec)
+        with self._lock:
+            sigs = self._signatures(v)
+            eid, self._next_id = self._next_id, self._next_id + 1
+            self._entries[eid] = (scope, v, sigs, value)
+            for t, sig in enumerate(sigs):
+                self._buckets.setdefault((scope, t, sig), set()).add(eid)
+            while len(self._entries) > self.maxsize:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, eid: int) -> None:
+        scope, _, sigs, _ = self._entries.pop(eid)
+        for t, sig in enumerate(sigs):
+            b = self._buckets.get((scope, t, sig))
+            if b is not None:
+                b.discard(eid)
+                if not b:
+                    del self._buckets[(scope, t, sig)]
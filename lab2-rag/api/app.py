@@ -1,7 +1,11 @@
-import os, json, time, datetime
+import atexit, contextlib, os, json, threading, time, uuid
+_IMPORT_T0 = time.monotonic()
+import requests as http
 from typing import List, Tuple, Optional
 
-from flask import Flask, request, jsonify, make_response
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from flask import Flask, Response, request, jsonify, make_response, stream_with_context
 from dotenv import load_dotenv
 from chromadb import HttpClient
 from openai import OpenAI
@@ -12,10 +16,25 @@ from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 
 from utils.pii import mask_pii
+from utils.adaptive_limit import AdaptiveLimiter, Overloaded, Slot
+from utils.single_flight import SingleFlight, flight_key
 from security.guardrails import contains_injection, external_links, is_external_domain
-from .prompts import get_prompt
-from .costs import estimate_cost_usd
+from retrieval.bm25 import BM25Index, rrf_fuse
+from retrieval.kb_version import VersionWatcher, read_kb_version, read_space
+from retrieval.ann import LocalIndex
+from retrieval.chunking import get_tokenizer
+from retrieval.context_pack import ContextPacker
+from .prompts import check_prefix, get_prompt, get_system, is_json, prefix_digest, versions as prompt_versions
+from .cost import estimate_cost_usd
+from . import hallu
 from .hallu import support_score
+from .cache import TTLCache, normalize_query
+from .answer_cache import SemanticAnswerCache
+from .streaming import sse, V2StreamValidator
+from .rerank_batcher import RerankBatcher, as_score_list
+from .rerank_cache import RerankScoreCache
+from .warmup import Warmup
+from .log_writer import JsonlWriter, exit_on_sigterm
 
 try:
     from observability.dd import (
@@ -35,7 +54,7 @@ except Exception:
     def enable_otel_if_configured(_): ...
 
 try:
-    from rapidfuzz import fuzz
+    from rapidfuzz import fuzz, process as rf_process
 except Exception:
     fuzz = None
 try:
@@ -68,31 +87,307 @@ HYBRID_W_KW  = float(os.getenv("HYBRID_W_KW","0.3"))
 RERANK_ENABLED = os.getenv("RERANK_ENABLED","1") == "1"
 RERANK_MODEL   = os.getenv("RERANK_MODEL","BAAI/bge-reranker-large")
 RERANK_BATCH   = int(os.getenv("RERANK_BATCH","8"))
+RERANK_SCHEDULER   = os.getenv("RERANK_SCHEDULER","batch")  # batch (cross-request micro-batching) | direct
+RERANK_MAX_BATCH   = int(os.getenv("RERANK_MAX_BATCH","32"))
+RERANK_MAX_WAIT_MS = float(os.getenv("RERANK_MAX_WAIT_MS","5"))
+RERANK_CACHE_SIZE  = int(os.getenv("RERANK_CACHE_SIZE","50000"))  # 0 = disabled
+RERANK_CACHE_PATH  = os.getenv("RERANK_CACHE_PATH","")  # e.g. ./data/rerank_cache.sqlite for the on-disk tier
+RERANK_CACHE_DISK_ROWS  = int(os.getenv("RERANK_CACHE_DISK_ROWS","500000"))  # on-disk tier row cap (LRU)
+RERANK_CACHE_DISK_TTL_S = float(os.getenv("RERANK_CACHE_DISK_TTL_S","2592000"))  # drop disk rows unused for 30 days; 0 = never
+SPARSE_MODE = os.getenv("SPARSE_MODE","bm25")  # bm25 (inverted index + RRF) | fuzzy (partial_ratio rescoring)
+RRF_K = int(os.getenv("RRF_K","60"))
+RETRIEVE_CACHE_SIZE  = int(os.getenv("RETRIEVE_CACHE_SIZE","1024"))  # 0 = disabled
+RETRIEVE_CACHE_TTL_S = float(os.getenv("RETRIEVE_CACHE_TTL_S","300"))
+KB_VERSION_CHECK_S   = float(os.getenv("KB_VERSION_CHECK_S","5"))
+ANSWER_CACHE_ENABLED   = os.getenv("ANSWER_CACHE_ENABLED","0") == "1"  # opt-in
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD","0.92"))
+ANSWER_CACHE_SIZE      = int(os.getenv("ANSWER_CACHE_SIZE","2048"))
+EMBEDDER_URL = os.getenv("EMBEDDER_URL","http://text-embedder:5001")
+BATCH_MAX_ITEMS       = int(os.getenv("BATCH_MAX_ITEMS","1000"))
+BATCH_CHUNK           = int(os.getenv("BATCH_CHUNK","32"))  # questions retrieved/reranked together
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY","4"))
+HALLU_MODE        = os.getenv("HALLU_MODE","async")  # async (sentence-level, after the response) | sync | answer (whole answer, in-request)
+HALLU_BATCH       = int(os.getenv("HALLU_BATCH","64"))
+HALLU_MAX_WAIT_MS = float(os.getenv("HALLU_MAX_WAIT_MS","20"))
+HALLU_MAX_PENDING = int(os.getenv("HALLU_MAX_PENDING","4096"))  # queued pairs before async scoring is skipped
 
 CHROMA_URL = os.getenv("CHROMA_URL","http://vector-store:8000")
 INDEX_NAME = os.getenv("INDEX_NAME","kb_demo")
 HOST = CHROMA_URL.split("://")[1].split(":")[0]
 PORT = int(CHROMA_URL.split(":")[-1]) if ":" in CHROMA_URL else 8000
-chroma = HttpClient(host=HOST, port=PORT)
-try:
-    col = chroma.get_collection(INDEX_NAME)
-except Exception:
-    col = chroma.create_collection(INDEX_NAME)
+CHROMA_WAIT_S = float(os.getenv("CHROMA_WAIT_S","10"))
+WARMUP_MODE = os.getenv("WARMUP_MODE","background")  # background | eager (block import until models are loaded)
+READY_REQUIRES = [c for c in os.getenv("READY_REQUIRES","chroma").split(",") if c]
+DATA_DIR = os.getenv("DATA_DIR","./data")
+LOG_FLUSH_INTERVAL_S = float(os.getenv("LOG_FLUSH_INTERVAL_S","1.0"))
+LOG_BATCH_SIZE   = int(os.getenv("LOG_BATCH_SIZE","256"))
+LOG_FSYNC        = os.getenv("LOG_FSYNC","batch")        # none | batch | always
+LOG_ROTATE_MB    = float(os.getenv("LOG_ROTATE_MB","64"))
+LOG_QUEUE_SIZE   = int(os.getenv("LOG_QUEUE_SIZE","10000"))
+LOG_BACKPRESSURE = os.getenv("LOG_BACKPRESSURE","drop")  # drop | block
+LOG_COMPRESS     = os.getenv("LOG_COMPRESS","1") == "1"
+BM25_PATH = os.getenv("BM25_PATH", f"./data/bm25_{INDEX_NAME}.json")
+INDEX_BACKEND = os.getenv("INDEX_BACKEND","chroma")  # chroma (HTTP query per retrieval) | local (mmap IVF snapshot)
+ANN_DIR    = os.getenv("ANN_DIR", f"./data/ann/{INDEX_NAME}")
+ANN_NPROBE = int(os.getenv("ANN_NPROBE","16"))
+ANN_NLIST  = int(os.getenv("ANN_NLIST","0"))  # 0 = ~4*sqrt(n)
+# Adaptive cap on in-flight /ask generations (see utils/adaptive_limit.py); excess waits, then 503.
+LIMIT_ENABLED         = os.getenv("LIMIT_ENABLED","1") == "1"
+LIMIT_INITIAL         = int(os.getenv("LIMIT_INITIAL","8"))
+LIMIT_MIN             = int(os.getenv("LIMIT_MIN","2"))
+LIMIT_MAX             = int(os.getenv("LIMIT_MAX","64"))
+LIMIT_QUEUE           = int(os.getenv("LIMIT_QUEUE","32"))
+LIMIT_QUEUE_TIMEOUT_S = float(os.getenv("LIMIT_QUEUE_TIMEOUT_S","10"))
+LIMIT_TOLERANCE       = float(os.getenv("LIMIT_TOLERANCE","1.5"))  # latency growth tolerated before the limit shrinks
+# Endpoints whose identical in-flight generations share one LLM call: ask, ask_stream, ask_batch (off by default)
+PROMPT_TOKENIZER        = os.getenv("PROMPT_TOKENIZER","unsloth/Meta-Llama-3.1-8B-Instruct")  # HF tokenizer of MODEL_NAME; "regex" = offline approximation
+CONTEXT_BUDGET_TOKENS   = int(os.getenv("CONTEXT_BUDGET_TOKENS","1536"))  # retrieved context per prompt; 0 = no limit
+CONTEXT_MIN_TRIM_TOKENS = int(os.getenv("CONTEXT_MIN_TRIM_TOKENS","48"))  # smaller leftovers drop the chunk instead of trimming it
+SINGLE_FLIGHT = {e.strip() for e in os.getenv("SINGLE_FLIGHT","").split(",") if e.strip()}
 
+# Set by the background warmup once loaded; retrieval is hybrid-only until then.
 reranker = None
-if RERANK_ENABLED and FlagReranker:
-    try:
-        reranker = FlagReranker(RERANK_MODEL, use_fp16=True)
-        print(f"[RAG] Re-ranker ready: {RERANK_MODEL}")
-    except Exception as e:
-        print(f"[RAG] Re-ranker not available: {e}")
+rerank_batcher = None
+score_cache = None
 
 REQUESTS = Counter("rag_requests_total", "Total /ask calls", ["model", "prompt_version"])
 RETRIEVE_LAT = Histogram("rag_retrieve_latency_seconds", "Retrieval latency (s)")
 GENERATE_LAT = Histogram("rag_generate_latency_seconds", "Generation latency (s)")
+TTFT_LAT     = Histogram("rag_time_to_first_token_seconds", "Time to first streamed token (s)")
 ANSWER_LEN   = Histogram("rag_answer_length_chars", "Answer length (chars)")
 COST_USD     = Counter("rag_estimated_cost_usd_total", "Estimated total cost (USD)")
 HALLU_SCORE  = Histogram("rag_hallucination_support", "Support score 0..1 (higher=more supported)")
+RETRIEVE_CACHE_REQ   = Counter("rag_retrieve_cache_requests_total", "Retrieval cache lookups", ["result"])
+RETRIEVE_CACHE_EVICT = Counter("rag_retrieve_cache_evictions_total", "Retrieval cache evictions", ["reason"])
+RETRIEVE_CACHE_SAVED = Counter("rag_retrieve_cache_saved_seconds_total", "Retrieval time saved by cache hits (s)")
+ANSWER_CACHE_REQ       = Counter("rag_answer_cache_requests_total", "Semantic answer cache lookups", ["result"])
+ANSWER_CACHE_SAVED_USD = Counter("rag_answer_cache_saved_cost_usd_total", "Estimated LLM cost avoided by answer cache hits (USD)")
+RERANK_QUEUE      = Gauge("rag_rerank_queue_pairs", "Rerank pairs waiting for a micro-batch")
+RERANK_BATCH_FILL = Histogram("rag_rerank_batch_fill_ratio", "Pairs per rerank forward pass / RERANK_MAX_BATCH",
+                              buckets=[0.1, 0.25, 0.5, 0.75, 0.9, 1.0])
+RERANK_WAIT       = Histogram("rag_rerank_queue_wait_seconds", "Time a rerank request waited for its batch (s)",
+                              buckets=[0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25])
+
+def _observe_rerank_batch(pairs: int, fill: float, waits: List[float]):
+    RERANK_BATCH_FILL.observe(fill)
+    for w in waits:
+        RERANK_WAIT.observe(w)
+
+HALLU_QUEUE   = Gauge("rag_hallucination_queue_pairs", "(context, sentence) pairs waiting for async NLI scoring")
+HALLU_DELAY   = Histogram("rag_hallucination_scoring_delay_seconds", "Response sent until async support score recorded (s)",
+                          buckets=[0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30])
+HALLU_SKIPPED = Counter("rag_hallucination_skipped_total", "Answers not scored because the NLI queue was full")
+
+RERANK_CACHE_PAIRS = Counter("rag_rerank_cache_pairs_total", "Rerank score cache lookups per (query, chunk) pair", ["result"])
+LOG_RECORDS   = Counter("rag_log_records_total", "Session/feedback records written", ["stream"])
+LOG_DROPPED   = Counter("rag_log_dropped_total", "Session/feedback records dropped under backpressure", ["stream"])
+LOG_QUEUE     = Gauge("rag_log_queue_depth", "Session/feedback records waiting to be flushed", ["stream"])
+LOG_FLUSH_LAT = Histogram("rag_log_flush_seconds", "Session/feedback batch flush latency (s)", ["stream"],
+                          buckets=[0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1])
+
+def _log_writer(stream: str) -> JsonlWriter:
+    w = JsonlWriter(os.path.join(DATA_DIR, stream), flush_interval_s=LOG_FLUSH_INTERVAL_S,
+                    batch_size=LOG_BATCH_SIZE, fsync=LOG_FSYNC, rotate_bytes=int(LOG_ROTATE_MB * 1024 * 1024),
+                    queue_size=LOG_QUEUE_SIZE, backpressure=LOG_BACKPRESSURE, compress=LOG_COMPRESS,
+                    on_drop=LOG_DROPPED.labels(stream=stream).inc,
+                    on_flush=lambda n, dt: (LOG_RECORDS.labels(stream=stream).inc(n),
+                                            LOG_FLUSH_LAT.labels(stream=stream).observe(dt)))
+    LOG_QUEUE.labels(stream=stream).set_function(w.depth)
+    return w
+
+session_log  = _log_writer("sessions")
+feedback_log = _log_writer("feedback")
+exit_on_sigterm()  # docker stop -> atexit -> writers flush
+
+ANN_DOCS    = Gauge("rag_local_index_docs", "Rows in the live local ANN snapshot")
+ANN_REFRESH = Histogram("rag_local_index_refresh_seconds", "Build/load time of a local ANN snapshot (s)",
+                        buckets=[0.1, 0.5, 1, 2.5, 5, 10, 30, 60])
+
+IMPORT_TO_READY = Gauge("rag_import_to_ready_seconds", "Module import until every warmup component finished (s)")
+COMPONENT_LOAD  = Gauge("rag_component_load_seconds", "Warmup load time per component (s)", ["component"])
+
+LIMIT_INFLIGHT = Gauge("rag_limiter_inflight", "/ask, /ask/stream and /ask/batch generations holding a concurrency slot")
+LIMIT_QUEUED   = Gauge("rag_limiter_queued", "Generations waiting for a concurrency slot")
+LIMIT_CURRENT  = Gauge("rag_limiter_limit", "Current adaptive concurrency limit")
+LIMIT_SHED     = Counter("rag_limiter_shed_total", "Requests / batch items rejected with 503", ["reason"])
+
+def _limiter_changed(in_flight: int, queued: int, limit: int):
+    LIMIT_INFLIGHT.set(in_flight)
+    LIMIT_QUEUED.set(queued)
+    LIMIT_CURRENT.set(limit)
+
+ask_limiter = AdaptiveLimiter(initial=LIMIT_INITIAL, min_limit=LIMIT_MIN, max_limit=LIMIT_MAX, max_queue=LIMIT_QUEUE,
+                              queue_timeout_s=LIMIT_QUEUE_TIMEOUT_S, tolerance=LIMIT_TOLERANCE,
+                              on_change=_limiter_changed,
+                              on_shed=lambda reason: LIMIT_SHED.labels(reason=reason).inc()) if LIMIT_ENABLED else None
+
+LLM_COALESCED = Counter("rag_llm_coalesced_total", "Generations served by an identical in-flight request", ["endpoint"])
+llm_flights = SingleFlight("rag-llm")
+
+def overloaded_body(e: Overloaded) -> Tuple[dict, dict]:
+    """503 body and headers for a shed request."""
+    return {"error":"overloaded","reason": e.reason, "retry_after_s": e.retry_after_s}, {"Retry-After": str(e.retry_after_s)}
+
+_chroma_stop = threading.Event()
+
+def _connect_chroma():
+    delay = 0.5
+    while not _chroma_stop.is_set():
+        try:
+            c = HttpClient(host=HOST, port=PORT)
+            try:
+                return c, c.get_collection(INDEX_NAME)
+            except Exception:
+                return c, c.create_collection(INDEX_NAME)
+        except Exception as e:
+            jlog(event="chroma.connect.retry", error=str(e), retry_in_s=delay)
+            _chroma_stop.wait(delay)
+            delay = min(delay * 2, 10.0)
+    raise RuntimeError("shutting down")
+
+def _stop_chroma_connect():
+    # let the retry loop leave the Chroma client before the interpreter tears daemon threads down
+    _chroma_stop.set()
+    with contextlib.suppress(RuntimeError):
+        warm.wait("chroma", 5)
+
+def _load_reranker():
+    global reranker, rerank_batcher, score_cache
+    m = FlagReranker(RERANK_MODEL, use_fp16=True)
+    m.compute_score([("warmup query", "warmup passage")])  # synthetic inference: first request pays nothing
+    if RERANK_SCHEDULER == "batch":
+        rerank_batcher = RerankBatcher(lambda pairs: reranker.compute_score(pairs, batch_size=RERANK_MAX_BATCH),
+                                       max_batch=RERANK_MAX_BATCH, max_wait_ms=RERANK_MAX_WAIT_MS,
+                                       on_batch=_observe_rerank_batch)
+        RERANK_QUEUE.set_function(rerank_batcher.depth)
+    if RERANK_CACHE_SIZE > 0:
+        try:
+            score_cache = RerankScoreCache(RERANK_MODEL, maxsize=RERANK_CACHE_SIZE, path=RERANK_CACHE_PATH or None,
+                                           disk_max_rows=RERANK_CACHE_DISK_ROWS, disk_ttl_s=RERANK_CACHE_DISK_TTL_S)
+        except Exception as e:
+            print(f"[RAG] Rerank score cache disabled: {e}")
+    reranker = m
+    print(f"[RAG] Re-ranker ready: {RERANK_MODEL}")
+    return RERANK_MODEL
+
+def _warmup_done(after_s: float):
+    comps = warm.status([])["components"]
+    IMPORT_TO_READY.set(after_s)
+    for name, st in comps.items():
+        if st["load_s"] is not None:
+            COMPONENT_LOAD.labels(component=name).set(st["load_s"])
+    jlog(event="warmup.done", import_to_ready_s=after_s, ready={n: st["ready"] for n, st in comps.items()})
+
+warm = Warmup(t0=_IMPORT_T0, on_done=_warmup_done)
+warm.add("chroma", _connect_chroma)
+atexit.register(_stop_chroma_connect)
+if RERANK_ENABLED and FlagReranker:
+    warm.add("reranker", _load_reranker)
+if hallu.CrossEncoder:
+    hallu.defer_loading()  # lexical support scoring until the NLI model is warm
+    warm.add("nli", hallu.load_nli)
+warm.add("tokenizer", lambda: get_tokenizer(PROMPT_TOKENIZER))
+
+# Until the model tokenizer is loaded, prompts are packed and costed with regex token counts.
+context_packer = ContextPacker(CONTEXT_BUDGET_TOKENS, tokenizer=lambda: warm.get("tokenizer") or get_tokenizer("regex"),
+                               min_trim_tokens=CONTEXT_MIN_TRIM_TOKENS)
+
+# One scoring thread per process owns the NLI model: every request thread shares the same
+# instance, and sentences from concurrent answers go through the same batched predict.
+support_batcher = None
+if HALLU_MODE == "async":
+    support_batcher = RerankBatcher(lambda pairs: hallu.predict_pairs(pairs, batch_size=HALLU_BATCH),
+                                    max_batch=HALLU_BATCH, max_wait_ms=HALLU_MAX_WAIT_MS, name="nli-batcher")
+    HALLU_QUEUE.set_function(support_batcher.depth)
+    atexit.register(support_batcher.close)  # registered after the log writers -> runs before they close
+
+# Local ANN snapshot (INDEX_BACKEND=local): queries fall back to Chroma until it is loaded.
+local_index = LocalIndex(ANN_DIR, nprobe=ANN_NPROBE, nlist=ANN_NLIST or None) if INDEX_BACKEND == "local" else None
+
+def _ann_fetch():
+    col = collection(block=True)
+    got = col.get(include=["embeddings","documents","metadatas"])
+    space = read_space(col)
+    return got["ids"], got["embeddings"], got["documents"], got["metadatas"], space
+
+def refresh_local_index(version: str) -> str:
+    t0 = time.time()
+    local_index.refresh(version, _ann_fetch)
+    ANN_REFRESH.observe(time.time() - t0)
+    ANN_DOCS.set(len(local_index.snapshot))
+    jlog(event="ann.refreshed", version=version, docs=len(local_index.snapshot), dir=ANN_DIR,
+         seconds=round(time.time() - t0, 3))
+    return version
+
+if local_index is not None:
+    warm.add("ann", lambda: refresh_local_index(kb_version.current()))
+
+def chroma_client(block: bool = False):
+    """The Chroma client. While it is still connecting, request-path callers (block=False) get
+    RuntimeError at once and degrade to sparse-only; background loaders pass block=True to wait
+    up to CHROMA_WAIT_S."""
+    return warm.wait("chroma", CHROMA_WAIT_S if block else 0)[0]
+
+def collection(block: bool = False):
+    return warm.wait("chroma", CHROMA_WAIT_S if block else 0)[1]
+
+def set_span_tag(s, key: str, value):
+    try:
+        if s is None: return
+        if hasattr(s, "set_tag"): s.set_tag(key, value)
+        else: s.set_attribute(key, value)
+    except Exception:
+        pass
+
+def rerank_scores(query: str, docs: list, sp=None) -> List[float]:
+    return rerank_pairs([(query, d) for d in docs], sp)
+
+def rerank_pairs(items: List[Tuple[str, dict]], sp=None) -> List[float]:
+    """Cross-encoder scores for (query, doc) pairs; only pairs missing from the score cache reach compute_score."""
+    def compute(pairs):
+        if not pairs: return []
+        if rerank_batcher is not None: return rerank_batcher.score(pairs)
+        return as_score_list(reranker.compute_score(pairs, batch_size=RERANK_BATCH))
+    if score_cache is None:
+        return compute([(q, d["text"]) for q, d in items])
+    keys = [score_cache.key(q, d["id"], d["text"]) for q, d in items]
+    known = score_cache.get_many(keys)
+    todo = [i for i, k in enumerate(keys) if k not in known]
+    fresh = compute([(items[i][0], items[i][1]["text"]) for i in todo])
+    score_cache.put_many({keys[i]: s for i, s in zip(todo, fresh)})
+    known.update({keys[i]: s for i, s in zip(todo, fresh)})
+    hits = len(keys) - len(todo)
+    RERANK_CACHE_PAIRS.labels(result="hit").inc(hits)
+    RERANK_CACHE_PAIRS.labels(result="miss").inc(len(todo))
+    set_span_tag(sp, "rerank.cache_hits", hits)
+    set_span_tag(sp, "rerank.cache_hit_ratio", round(hits / len(keys), 3) if keys else 0.0)
+    return [known[k] for k in keys]
+
+retrieve_cache = TTLCache(RETRIEVE_CACHE_SIZE, RETRIEVE_CACHE_TTL_S,
+                          on_evict=lambda reason, n: RETRIEVE_CACHE_EVICT.labels(reason=reason).inc(n)) \
+                 if RETRIEVE_CACHE_SIZE > 0 else None
+
+def _on_kb_version_change(old: Optional[str], new: str):
+    global _bm25
+    jlog(event="kb.version.changed", old=old, new=new, index=INDEX_NAME)
+    if retrieve_cache is not None:
+        retrieve_cache.clear(reason="version")
+    if _bm25_mtime is None:  # built from the collection, not from a snapshot
+        _bm25 = None
+    if local_index is not None:  # keep serving the old snapshot until the new one is swapped in
+        threading.Thread(target=_refresh_quietly, args=(new,), name="ann-refresh", daemon=True).start()
+
+def _refresh_quietly(version: str):
+    try:
+        refresh_local_index(version)
+    except Exception as e:
+        jlog(event="ann.refresh.error", version=version, error=str(e))
+
+kb_version = VersionWatcher(lambda: read_kb_version(chroma_client().get_collection(INDEX_NAME)),
+                            interval_s=KB_VERSION_CHECK_S, on_change=_on_kb_version_change)
+
+answer_cache = SemanticAnswerCache(threshold=ANSWER_CACHE_THRESHOLD, maxsize=ANSWER_CACHE_SIZE) \
+               if ANSWER_CACHE_ENABLED else None
 
 def current_trace_id_hex() -> Optional[str]:
     try:
@@ -116,6 +411,14 @@ class AnswerV2(BaseModel):
     citations: list[str] = []
     confidence: float
 
+def embed_texts(texts: List[str]) -> List[List[float]]:
+    r = http.post(f"{EMBEDDER_URL}/embed", json={"texts": texts}, timeout=10 + len(texts) * 0.05)
+    r.raise_for_status()
+    return r.json()["embeddings"]
+
+def embed_query(q: str) -> List[float]:
+    return embed_texts([q])[0]
+
 def to_dense_similarity(dist: float) -> float:
     if dist is None: return 0.0
     return max(-1.0, min(1.0, 1.0 - float(dist)))
@@ -125,62 +428,260 @@ def sparse_score(query: str, text: str) -> float:
     try: return fuzz.partial_ratio((query or "").lower(), (text or "").lower()) / 100.0
     except Exception: return 0.0
 
+def sparse_scores(pairs: List[Tuple[str, str]]) -> List[float]:
+    """sparse_score for many (query, text) pairs in one call (rapidfuzz cpdist, all cores)."""
+    if not fuzz or not pairs: return [0.0] * len(pairs)
+    try:
+        return (rf_process.cpdist([(q or "").lower() for q, _ in pairs], [(t or "").lower() for _, t in pairs],
+                                  scorer=fuzz.partial_ratio, workers=-1) / 100.0).tolist()
+    except Exception:
+        return [sparse_score(q, t) for q, t in pairs]
+
 def hybrid_score(query: str, text: str, dense_sim: float) -> float:
     return HYBRID_W_VEC * dense_sim + HYBRID_W_KW * sparse_score(query, text)
 
-def hybrid_retrieve(query: str, topk: int = TOP_K):
-    prefetch = max(topk * 2, topk + 2)
-    with span("rag.retrieve.prefetch", top_k=prefetch, index=INDEX_NAME):
-        res = col.query(query_texts=[query], n_results=prefetch,
-                        include=["documents","distances","metadatas","ids"])
-    docs = (res.get("documents") or [[]])[0]
-    dists = (res.get("distances") or [[]])[0]
-    metas = (res.get("metadatas") or [[]])[0]
-    ids   = (res.get("ids") or [[]])[0]
-
-    scored = []
+_bm25: Optional[BM25Index] = None
+_bm25_mtime: Optional[float] = None
+
+def bm25_index() -> Optional[BM25Index]:
+    """Snapshot written by the KB ingester (reloaded when it changes); falls back to building from the collection."""
+    global _bm25, _bm25_mtime
+    try:
+        mtime = os.path.getmtime(BM25_PATH)
+    except OSError:
+        mtime = None
+    if mtime is not None and mtime != _bm25_mtime:
+        try:
+            _bm25, _bm25_mtime = BM25Index.load(BM25_PATH), mtime
+            jlog(event="bm25.loaded", path=BM25_PATH, docs=len(_bm25))
+        except Exception as e:
+            jlog(event="bm25.load.error", path=BM25_PATH, error=str(e))
+    if _bm25_mtime is None:
+        kb_version.current()  # drops a collection-built index when the KB version moves
+    if _bm25 is None:
+        if warm.pending("chroma"):
+            return None  # nothing to build from yet; built on the first call after Chroma connects
+        idx = BM25Index()
+        try:
+            got = collection().get(include=["documents","metadatas"])
+            idx.upsert_many(zip(got.get("ids") or [], got.get("documents") or [],
+                                got.get("metadatas") or [None] * len(got.get("ids") or [])))
+            jlog(event="bm25.built", source="collection", docs=len(idx))
+        except Exception as e:
+            jlog(event="bm25.build.error", error=str(e))
+        _bm25 = idx
+    return _bm25
+
+def prefetch_size(topk: int) -> int:
+    return max(topk * 2, topk + 2)
+
+def local_index_ready() -> bool:
+    return local_index is not None and local_index.snapshot is not None
+
+def vector_query(n: int, texts: List[str], vecs: Optional[List[Optional[List[float]]]] = None) -> dict:
+    """Nearest-neighbour prefetch for one or more queries -> Chroma-shaped result.
+    Served from the local snapshot once loaded (INDEX_BACKEND=local), else one Chroma round trip."""
+    have_vecs = vecs is not None and all(v is not None for v in vecs)
+    if local_index_ready():
+        kb_version.current()  # polls the KB version; a change triggers a background refresh
+        if not have_vecs:
+            vecs = embed_texts(texts)
+        with span("rag.retrieve.prefetch", top_k=n, index=INDEX_NAME, backend="local", queries=len(vecs)):
+            return local_index.query(vecs, n)
+    kw = {"query_embeddings": vecs} if have_vecs else {"query_texts": texts}
+    with span("rag.retrieve.prefetch", top_k=n, index=INDEX_NAME, backend="chroma", queries=len(texts)):
+        return collection().query(n_results=n, include=["documents","distances","metadatas","ids"], **kw)
+
+def dense_query(query: str, n: int, qvec: Optional[List[float]] = None) -> dict:
+    return vector_query(n, [query], [qvec])
+
+def dense_docs(res: dict, qi: int = 0) -> list:
+    """Docs of the qi-th query in a (possibly multi-query) Chroma result."""
+    def col(key):
+        rows = res.get(key) or []
+        return rows[qi] if qi < len(rows) and rows[qi] is not None else []
+    docs, dists, metas, ids = col("documents"), col("distances"), col("metadatas"), col("ids")
+
+    dense = []
     for i, text in enumerate(docs):
-        dense_sim = to_dense_similarity(dists[i] if i < len(dists) else None)
-        scored.append(({
+        dense.append({
             "id": ids[i] if i < len(ids) else None,
             "text": text,
             "metadata": metas[i] if i < len(metas) else {},
-            "dense_sim": dense_sim,
-        }, float(hybrid_score(query, text, dense_sim))))
-    scored.sort(key=lambda x: x[1], reverse=True)
-    top = scored[:topk]
+            "dense_sim": to_dense_similarity(dists[i] if i < len(dists) else None),
+        })
+    return dense
+
+def hybrid_retrieve(query: str, topk: int = TOP_K, qvec: Optional[List[float]] = None):
+    prefetch = prefetch_size(topk)
+    try:
+        res = dense_query(query, prefetch, qvec)
+    except RuntimeError as e:  # Chroma still connecting: sparse-only
+        jlog(event="retrieval.dense.unavailable", error=str(e))
+        res = {}
+    return rank_docs(query, topk, dense_docs(res))
+
+def rank_docs(query: str, topk: int, dense: list):
+    """Sparse fusion + cross-encoder rerank of the dense prefetch."""
+    return rerank_top(query, topk, fuse_docs(query, topk, dense))
 
+def fuse_docs(query: str, topk: int, dense: list, kw: Optional[List[float]] = None):
+    """Top-k (doc, score) after sparse fusion; `kw` = precomputed sparse_score per dense doc (batch path)."""
+    prefetch = prefetch_size(topk)
+    idx = bm25_index() if SPARSE_MODE == "bm25" else None
+    if idx is not None and len(idx):
+        with span("rag.retrieve.bm25", top_k=prefetch, docs=len(idx)):
+            sparse = idx.search(query, prefetch)
+        by_id = {d["id"]: d for d in dense if d["id"] is not None}
+        for doc_id, s in sparse:
+            if doc_id not in by_id:
+                src = idx.docs[doc_id]
+                by_id[doc_id] = {"id": doc_id, "text": src["text"], "metadata": src["metadata"], "dense_sim": 0.0}
+            by_id[doc_id]["bm25"] = round(float(s), 4)
+        fused = rrf_fuse([d["id"] for d in dense], [doc_id for doc_id, _ in sparse], k=RRF_K)
+        scored = [(by_id[doc_id], s) for doc_id, s in fused]
+    else:
+        if kw is None:
+            scored = [(d, float(hybrid_score(query, d["text"], d["dense_sim"]))) for d in dense]
+        else:
+            scored = [(d, HYBRID_W_VEC * d["dense_sim"] + HYBRID_W_KW * k) for d, k in zip(dense, kw)]
+        scored.sort(key=lambda x: x[1], reverse=True)
+    return scored[:topk]
+
+def rerank_top(query: str, topk: int, top: list):
+    prefetch = prefetch_size(topk)
     if reranker:
-        with span("rag.rerank", model=RERANK_MODEL, batch=RERANK_BATCH):
-            pairs = [(query, d["text"]) for (d, _) in top]
+        with span("rag.rerank", model=RERANK_MODEL, batch=RERANK_BATCH, scheduler=RERANK_SCHEDULER) as sp:
             try:
-                from FlagEmbedding import FlagReranker as _F; _ = _F
-                scores = reranker.compute_score(pairs, batch_size=RERANK_BATCH)
-                reranked = list(zip([t[0] for t in top], [float(s) for s in scores]))
+                scores = rerank_scores(query, [d for (d, _) in top], sp)
+                reranked = list(zip([t[0] for t in top], scores))
                 reranked.sort(key=lambda x: x[1], reverse=True)
-                jlog(event="retrieval", stage="rerank", prefetch=prefetch, final_k=topk)
+                jlog(event="retrieval", stage="rerank", sparse=SPARSE_MODE, prefetch=prefetch, final_k=topk)
                 return reranked
             except Exception as e:
                 jlog(event="retrieval.rerank.error", error=str(e))
                 return top
-    jlog(event="retrieval", stage="hybrid-only", prefetch=prefetch, final_k=topk)
+    jlog(event="retrieval", stage="hybrid-only", sparse=SPARSE_MODE, prefetch=prefetch, final_k=topk)
     return top
 
-def choose_model() -> str:
-    override = request.headers.get("X-Model-Override")
+def rerank_many(batch: List[Tuple[str, int, list]]) -> list:
+    """rerank_top for several (query, topk, top) at once: one cross-encoder pass over every pair."""
+    if not reranker:
+        return [rerank_top(q, k, top) for q, k, top in batch]
+    items = [(q, d) for q, _, top in batch for (d, _) in top]
+    with span("rag.rerank", model=RERANK_MODEL, batch=len(items), scheduler=RERANK_SCHEDULER, queries=len(batch)) as sp:
+        try:
+            scores = rerank_pairs(items, sp)
+        except Exception as e:
+            jlog(event="retrieval.rerank.error", error=str(e))
+            return [top for _, _, top in batch]
+    out, i = [], 0
+    for _, _, top in batch:
+        reranked = list(zip([d for (d, _) in top], scores[i:i + len(top)]))
+        reranked.sort(key=lambda x: x[1], reverse=True)
+        out.append(reranked)
+        i += len(top)
+    jlog(event="retrieval", stage="rerank", sparse=SPARSE_MODE, queries=len(batch), pairs=len(items))
+    return out
+
+def batch_retrieve(queries: List[Tuple[str, int, Optional[List[float]]]]) -> list:
+    """cached_retrieve for many (query, topk, qvec): one multi-query Chroma call, one batched
+    sparse scoring pass and one rerank pass for every question the retrieval cache misses."""
+    out: list = [None] * len(queries)
+    keys: list = [None] * len(queries)
+    if retrieve_cache is not None:
+        for i, (q, k, _) in enumerate(queries):
+            keys[i] = retrieve_cache_key(q, k)
+            out[i] = retrieve_cache_get(keys[i])
+    todo = [i for i, docs in enumerate(out) if docs is None]
+    if not todo:
+        return out
+    t0, warming = time.time(), retrieval_warming()
+    n = max(prefetch_size(queries[i][1]) for i in todo)
+    try:
+        res = vector_query(n, [queries[i][0] for i in todo], [queries[i][2] for i in todo])
+    except RuntimeError as e:  # Chroma still connecting: sparse-only
+        jlog(event="retrieval.dense.unavailable", error=str(e))
+        res = {}
+    dense = [dense_docs(res, j)[:prefetch_size(queries[i][1])] for j, i in enumerate(todo)]
+
+    kws: list = [None] * len(todo)
+    idx = bm25_index() if SPARSE_MODE == "bm25" else None
+    if idx is None or not len(idx):
+        flat = sparse_scores([(queries[i][0], d["text"]) for j, i in enumerate(todo) for d in dense[j]])
+        pos = 0
+        for j in range(len(todo)):
+            kws[j], pos = flat[pos:pos + len(dense[j])], pos + len(dense[j])
+    tops = [fuse_docs(queries[i][0], queries[i][1], dense[j], kws[j]) for j, i in enumerate(todo)]
+    ranked = rerank_many([(queries[i][0], queries[i][1], tops[j]) for j, i in enumerate(todo)])
+
+    cost_s = (time.time() - t0) / len(todo)
+    for j, i in enumerate(todo):
+        out[i] = ranked[j]
+        if retrieve_cache is not None and not warming:
+            retrieve_cache.put(keys[i], (ranked[j], cost_s))
+    return out
+
+def retrieval_warming() -> bool:
+    """While Chroma or the reranker is still loading, results are sparse-only or unreranked:
+    serve them, but keep them out of the retrieval cache."""
+    return warm.pending("chroma") or warm.pending("reranker")
+
+def retrieve_cache_key(query: str, topk: int):
+    return (kb_version.current(), normalize_query(query), topk)
+
+def retrieve_cache_get(key):
+    hit = retrieve_cache.get(key)
+    if hit is None:
+        RETRIEVE_CACHE_REQ.labels(result="miss").inc()
+        return None
+    docs, cost_s = hit
+    RETRIEVE_CACHE_REQ.labels(result="hit").inc()
+    RETRIEVE_CACHE_SAVED.inc(cost_s)
+    return docs
+
+def cached_retrieve(query: str, topk: int = TOP_K, qvec: Optional[List[float]] = None):
+    """hybrid_retrieve behind a versioned LRU+TTL cache of the final ranked (doc, score) list."""
+    if retrieve_cache is None:
+        return hybrid_retrieve(query, topk=topk, qvec=qvec)
+    key = retrieve_cache_key(query, topk)
+    docs = retrieve_cache_get(key)
+    if docs is not None:
+        return docs
+    t0, warming = time.time(), retrieval_warming()
+    docs = hybrid_retrieve(query, topk=topk, qvec=qvec)
+    if not warming:
+        retrieve_cache.put(key, (docs, time.time() - t0))
+    return docs
+
+def choose_model(headers=None) -> str:
+    override = (headers if headers is not None else request.headers).get("X-Model-Override")
     if override: return override
     import random
     if CANARY_RATIO > 0 and random.random() < CANARY_RATIO:
         return MODEL_ALT
     return MODEL_MAIN
 
-def choose_prompt_version() -> str:
-    pv = request.headers.get("X-Prompt-Version")
-    return pv if pv in ("v1","v2") else PROMPT_VERSION_DEFAULT
+def choose_prompt_version(headers=None) -> str:
+    pv = (headers if headers is not None else request.headers).get("X-Prompt-Version")
+    return pv if pv in PROMPT_VERSIONS else PROMPT_VERSION_DEFAULT
 
 def build_prompt(pv: str, q: str, ctx: str) -> str:
     return get_prompt(pv, q, ctx)
 
+def pack_context(ctx: "AskContext", docs: list) -> Tuple[list, str]:
+    """Fit ranked docs into CONTEXT_BUDGET_TOKENS -> (docs that made it into the prompt, some
+    possibly trimmed; prompt). Records the packed size on the span and on ctx (session record)."""
+    with span("rag.context.pack", budget_tokens=CONTEXT_BUDGET_TOKENS, candidates=len(docs)) as sp:
+        packed = context_packer.pack([d["text"] for (d, _) in docs],
+                                     [(d.get("metadata") or {}).get("content_hash") for (d, _) in docs])
+        set_span_tag(sp, "packed_tokens", packed.tokens)
+        set_span_tag(sp, "dropped_chunks", packed.dropped)
+        set_span_tag(sp, "trimmed_chunks", packed.trimmed)
+    ctx.context_tokens, ctx.context_dropped = packed.tokens, packed.dropped
+    kept = [({**docs[i][0], "text": text}, docs[i][1]) for i, text in zip(packed.kept, packed.texts)]
+    return kept, build_prompt(ctx.pv, ctx.q, packed.text)
+
 def dd_link(trace_id_hex: str|None) -> Optional[str]:
     base = os.getenv("DD_SITE", "datadoghq.com")
     # simple deep link (user can adjust org/app params)
@@ -191,9 +692,465 @@ def tempo_link(trace_id_hex: str|None) -> Optional[str]:
     graf = os.getenv("GRAFANA_URL", "http://localhost:3000")
     return f"{graf}/explore?left=%5B%22now-1h%22,%22now%22,%22Tempo%22,%7B%22query%22:%22{trace_id_hex}%22%7D%5D" if trace_id_hex else None
 
+SYSTEM_PROMPT = "Answer using only the provided CONTEXT."  # for versions without their own system message (v1, v2)
+PROMPT_VERSIONS = prompt_versions()
+
+def system_prompt(pv: Optional[str]) -> str:
+    return get_system(pv, SYSTEM_PROMPT) if pv else SYSTEM_PROMPT
+
+def chat_messages(prompt: str, pv: Optional[str] = None) -> list:
+    return [
+        {"role":"system","content": system_prompt(pv)},
+        {"role":"user","content": prompt},
+    ]
+
+def prompt_prefix(pv: str, prompt: str) -> str:
+    """Digest of the request's static prefix; constant per version when the KV-cache prefix is reusable."""
+    return prefix_digest(pv, SYSTEM_PROMPT, prompt)
+
+for _pv in PROMPT_VERSIONS:
+    jlog(event="prompt.prefix", **check_prefix(_pv, SYSTEM_PROMPT))
+
+def guardrail_error(q: str) -> Optional[dict]:
+    if contains_injection(q):
+        return {"error":"prompt_injection_detected"}
+    urls = external_links(q)
+    if any(is_external_domain(u, allowlist=set()) for u in urls):
+        return {"error":"external_links_blocked", "urls": urls}
+    return None
+
+def observe(hist, value: float, exid: Optional[str]):
+    if exid: hist.observe(value, exemplar={'trace_id': exid})
+    else:    hist.observe(value)
+
+def check_v2(completion: Optional[str], pv: str, tries: int, temperature: float) -> Tuple[Optional[str], float]:
+    """v2 must be valid AnswerV2 JSON: retry once cooler, then wrap the raw text."""
+    if completion and is_json(pv):
+        try:
+            AnswerV2.model_validate_json(completion)
+        except ValidationError:
+            if tries < 2:
+                return None, max(0.0, temperature - 0.2)
+            return json.dumps({"answer": completion, "citations": [], "confidence": 0.5}), temperature
+    return completion, temperature
+
+def cache_hit_result(entry: dict, sim: float, q: str, model: str, pv: str, topk: int, temperature: float):
+    """(session record, response) for an answer served from the semantic cache."""
+    ANSWER_CACHE_SAVED_USD.inc(entry["estimated_cost_usd"])
+    rec = {
+        "answer_id": uuid.uuid4().hex,
+        "ts": time.time(),
+        "q": q,
+        "answer": entry["answer"],
+        "model": model,
+        "prompt_version": pv,
+        "top_k": topk,
+        "support": entry["support"],
+        "estimated_cost_usd": 0.0,
+        "saved_cost_usd": entry["estimated_cost_usd"],
+        "answer_cache": "hit",
+        "cache_similarity": round(sim, 4),
+        "trace_id": current_trace_id_hex(),
+        "sources": entry["sources"],
+    }
+    resp = {
+        "answer": entry["answer"],
+        "sources": entry["sources"],
+        "used_reranker": bool(reranker),
+        "top_k": topk,
+        "model": model,
+        "prompt_version": pv,
+        "temperature": temperature,
+        "support": entry["support"],
+        "estimated_cost_usd": 0.0,
+        "cached": True,
+    }
+    return rec, resp
+
+def answer_result(q: str, completion: str, docs: list, prompt: str, model: str, pv: str, topk: int,
+                  temperature: float, supp: Optional[float], est_cost: float, exid: Optional[str],
+                  cache_state: str, explain: bool):
+    """(session record, response) for a freshly generated answer."""
+    rec = {
+        "answer_id": uuid.uuid4().hex,
+        "ts": time.time(),
+        "q": q,
+        "answer": completion,
+        "model": model,
+        "prompt_version": pv,
+        "top_k": topk,
+        "support": supp,
+        "estimated_cost_usd": round(est_cost, 6),
+        "answer_cache": cache_state,
+        "trace_id": exid,
+        "sources": [{"id": d["id"], "metadata": d["metadata"], "dense_sim": d["dense_sim"]} for (d, _) in docs],
+    }
+    resp = {
+        "answer": completion,
+        "sources": rec["sources"],
+        "used_reranker": bool(reranker),
+        "top_k": topk,
+        "model": model,
+        "prompt_version": pv,
+        "temperature": temperature,
+        "support": round(supp,3) if supp is not None else None,
+        "estimated_cost_usd": round(est_cost,6),
+        "cached": False,
+    }
+    if supp is None:
+        resp["support_pending"] = True  # scored after the response; lands in the session log by answer_id
+        resp["answer_id"] = rec["answer_id"]
+    if explain:
+        resp["trace_id"] = exid
+        resp["trace_link_datadog"] = dd_link(exid)
+        resp["trace_link_tempo"] = tempo_link(exid)
+        resp["prompt"] = prompt
+        resp["contexts"] = [d["text"] for (d, _) in docs]
+    return rec, resp
+
+def append_session(rec: dict):
+    session_log.write(rec)
+
+def append_feedback(data: dict):
+    feedback_log.write(data)
+
+def record_answer(rec: dict, **timings):
+    append_session(rec)
+    jlog(event="rag.answer",
+         question=rec["q"], source_count=len(rec["sources"]), rerank=bool(reranker),
+         top_k=rec["top_k"], model=rec["model"], prompt_version=rec["prompt_version"],
+         support=round(rec["support"],3) if rec["support"] is not None else None,
+         estimated_cost_usd=rec["estimated_cost_usd"],
+         answer_cache=rec["answer_cache"], **timings)
+
+@dataclass
+class AskContext:
+    q: str
+    topk: int
+    temperature: float
+    explain: bool
+    model: str
+    pv: str
+    scope: Optional[tuple] = None
+    qvec: Optional[List[float]] = None
+    cached: Optional[tuple] = None
+    coalesced: bool = False  # the completion came from an identical in-flight request (SINGLE_FLIGHT)
+    context_tokens: Optional[int] = None  # packed context size (pack_context)
+    context_dropped: int = 0
+
+def ask_prelude(payload: dict, headers) -> Tuple[Optional[AskContext], Optional[Tuple[dict, int]]]:
+    """Validation, guardrails, routing and semantic-cache lookup shared by /ask and /ask/stream."""
+    ctx, err = ask_context(payload, headers)
+    if err:
+        return None, err
+    answer_cache_lookup(ctx)
+    return ctx, None
+
+def ask_context(payload: dict, headers) -> Tuple[Optional[AskContext], Optional[Tuple[dict, int]]]:
+    raw_q = payload.get("question")
+    raw_q = raw_q.strip() if isinstance(raw_q, str) else ""
+    if not raw_q:
+        return None, ({"error":"question is required"}, 400)
+
+    q = mask_pii(raw_q)
+    err = guardrail_error(q)
+    if err:
+        return None, (err, 400)
+
+    ctx = AskContext(
+        q=q,
+        topk=int(payload.get("top_k", TOP_K)),
+        temperature=float(payload.get("temperature", os.getenv("TEMPERATURE","0.2"))),
+        explain=bool(payload.get("explain", False)),  # Transparency Mode
+        model=choose_model(headers),
+        pv=choose_prompt_version(headers),
+    )
+    REQUESTS.labels(model=ctx.model, prompt_version=ctx.pv).inc()
+    return ctx, None
+
+def answer_cache_lookup(ctx: AskContext):
+    """Semantic answer cache (opt-in). Transparency mode always runs the full pipeline."""
+    if answer_cache is None or ctx.explain:
+        return
+    ctx.scope = (ctx.model, ctx.pv, kb_version.current())
+    try:
+        with span("rag.answer_cache.lookup", model=ctx.model, prompt_version=ctx.pv):
+            if ctx.qvec is None:
+                ctx.qvec = embed_query(ctx.q)
+            ctx.cached = answer_cache.lookup(ctx.scope, ctx.qvec)
+    except Exception as e:
+        jlog(event="answer_cache.error", error=str(e))
+    ANSWER_CACHE_REQ.labels(result="hit" if ctx.cached else "miss").inc()
+
+def retrieve_for(ctx: AskContext):
+    t0 = time.time()
+    with span("rag.retrieve", top_k=ctx.topk, index=INDEX_NAME, rerank=bool(reranker)):
+        docs = cached_retrieve(ctx.q, topk=ctx.topk, qvec=ctx.qvec)
+    rt = time.time() - t0
+    exid = current_trace_id_hex()
+    observe(RETRIEVE_LAT, rt, exid)
+    return docs, rt, exid
+
+def _support_done(rec: dict, entry: Optional[dict], sents: List[str], n_ctx: int, fut):
+    """Runs on the NLI thread once an answer's sentences are scored: histogram + session record by answer id."""
+    try:
+        detail = hallu.aggregate(sents, n_ctx, fut.result())
+    except Exception as e:
+        jlog(event="hallu.error", error=str(e), trace_id=rec["trace_id"])
+        return
+    observe(HALLU_SCORE, detail["support"], rec["trace_id"])
+    HALLU_DELAY.observe(time.time() - rec["ts"])
+    if entry is not None:
+        entry["support"] = round(detail["support"],3)  # answer-cache hits from now on carry the score
+    out = {"type": "support", "answer_id": rec["answer_id"], "answer_ts": rec["ts"], **detail}
+    if rec["trace_id"]:
+        out["trace_id"] = rec["trace_id"]
+    append_session(out)
+
+def score_support(rec: dict, completion: str, contexts: List[str], entry: Optional[dict] = None) -> bool:
+    """Queue sentence-level NLI scoring for an answer already sent; False if the queue is full."""
+    if support_batcher.depth() >= HALLU_MAX_PENDING:
+        HALLU_SKIPPED.inc()
+        return False
+    sents, pairs = hallu.sentence_pairs(completion, contexts)
+    fut = support_batcher.submit(pairs)
+    fut.add_done_callback(lambda f: _support_done(rec, entry, sents, len(contexts), f))
+    return True
+
+def finish_answer(ctx: AskContext, completion: str, docs: list, prompt: str, exid: Optional[str], **timings):
+    """Support score, cost, session record and answer-cache store for a generated answer -> response dict.
+
+    Explain mode and HALLU_MODE=sync score sentences before returning; HALLU_MODE=async
+    (default) returns `support: null` and scores on the NLI thread afterwards."""
+    contexts = [d["text"] for (d, _) in docs]
+    supp, detail = None, None
+    if ctx.explain or HALLU_MODE == "sync":
+        with span("rag.support", mode="sentence", contexts=len(contexts)):
+            detail = hallu.sentence_support(completion, contexts, batch_size=HALLU_BATCH)
+        supp = detail["support"]
+    elif HALLU_MODE == "answer" or support_batcher is None:
+        supp = support_score(completion, contexts)
+    if supp is not None:
+        observe(HALLU_SCORE, supp, exid)
+
+    est_cost = estimate_cost_usd(ctx.model, prompt, completion, context_packer.tokenizer())
+    if not ctx.coalesced:
+        COST_USD.inc(est_cost)
+
+    rec, resp = answer_result(ctx.q, completion, docs, prompt, ctx.model, ctx.pv, ctx.topk, ctx.temperature,
+                              supp, 0.0 if ctx.coalesced else est_cost, exid,
+                              "miss" if ctx.scope is not None else "off", ctx.explain)
+    if ctx.context_tokens is not None:
+        rec["context_tokens"], rec["context_dropped"] = ctx.context_tokens, ctx.context_dropped
+    rec["prompt_prefix"] = prompt_prefix(ctx.pv, prompt)
+    if ctx.coalesced:  # the leader paid for (and caches) this completion
+        rec["coalesced"] = resp["coalesced"] = True
+        rec["saved_cost_usd"] = round(est_cost, 6)
+    if detail is not None:
+        rec["support_sentences"] = detail["sentences"]
+        if ctx.explain:
+            resp["support_sentences"] = detail["sentences"]
+    if "ttft_ms" in timings:
+        rec["streamed"] = True
+        rec["ttft_ms"] = timings["ttft_ms"]
+    record_answer(rec, **timings)
+    entry = None
+    if ctx.scope is not None and ctx.qvec is not None and not ctx.coalesced:
+        entry = {"answer": completion, "sources": rec["sources"],
+                 "support": round(supp,3) if supp is not None else None, "estimated_cost_usd": round(est_cost,6)}
+        answer_cache.store(ctx.scope, ctx.qvec, entry)
+    if supp is None:
+        score_support(rec, completion, contexts, entry)
+    return resp
+
+def generate(ctx: AskContext, prompt: str) -> Tuple[Optional[str], float, Optional[str]]:
+    """Blocking completion with the v2 retry -> (completion, latency_s, last_error); updates ctx.temperature."""
+    model, pv, temperature = ctx.model, ctx.pv, ctx.temperature
+    tries, gen_latency, last_err = 0, 0.0, None
+    completion = None
+
+    while tries < 2 and completion is None:
+        tries += 1
+        t1 = time.time()
+        with span("llm.generate", model=model, provider="ollama", temperature=temperature,
+                  prompt_version=pv, prompt_prefix=prompt_prefix(pv, prompt), attempt=tries):
+            try:
+                out = client.chat.completions.create(
+                    model=model,
+                    messages=chat_messages(prompt, pv),
+                    temperature=temperature,
+                )
+                completion = out.choices[0].message.content
+            except Exception as e:
+                last_err = str(e)
+                completion = None
+        gen_latency = time.time() - t1
+        completion, temperature = check_v2(completion, pv, tries, temperature)
+    ctx.temperature = temperature
+    return completion, gen_latency, last_err
+
+def generate_shared(ctx: AskContext, prompt: str, endpoint: str) -> Tuple[Optional[str], float, Optional[str]]:
+    """generate(), joined to an identical in-flight generation when `endpoint` is in SINGLE_FLIGHT."""
+    if endpoint not in SINGLE_FLIGHT:
+        return generate(ctx, prompt)
+
+    def lead():
+        return generate(ctx, prompt), ctx.temperature
+
+    key = flight_key(ctx.model, system_prompt(ctx.pv), prompt, ctx.temperature, ctx.pv)
+    with span("llm.single_flight", model=ctx.model, prompt_version=ctx.pv, endpoint=endpoint) as sp:
+        (out, temperature), shared = llm_flights.do(key, lead)
+        set_span_tag(sp, "coalesced", shared)
+    if shared:
+        ctx.temperature, ctx.coalesced = temperature, True
+        LLM_COALESCED.labels(endpoint=endpoint).inc()
+    return out
+
+def llm_deltas(model: str, prompt: str, temperature: float, pv: Optional[str] = None):
+    """Non-empty content deltas of a streamed completion."""
+    stream = client.chat.completions.create(
+        model=model,
+        messages=chat_messages(prompt, pv),
+        temperature=temperature,
+        stream=True,
+    )
+    for chunk in stream:
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if delta:
+            yield delta
+
+def stream_deltas(ctx: AskContext, prompt: str, sp=None):
+    """llm_deltas(), or a replay of an identical in-flight stream when ask_stream is in SINGLE_FLIGHT."""
+    if "ask_stream" not in SINGLE_FLIGHT:
+        return llm_deltas(ctx.model, prompt, ctx.temperature, ctx.pv)
+    key = flight_key(ctx.model, system_prompt(ctx.pv), prompt, ctx.temperature, ctx.pv)
+    deltas, shared = llm_flights.stream(key, lambda: llm_deltas(ctx.model, prompt, ctx.temperature, ctx.pv))
+    set_span_tag(sp, "coalesced", shared)
+    if shared:
+        ctx.coalesced = True
+        LLM_COALESCED.labels(endpoint="ask_stream").inc()
+    return deltas
+
+def answer_for(ctx: AskContext, docs: list, rt: float, exid: Optional[str], slot: Optional[Slot] = None,
+               endpoint: str = "ask") -> Tuple[dict, int]:
+    """Prompt, generation and finish_answer for retrieved docs -> (response body, status).
+    `slot` (the request's concurrency slot) gets the generation latency, or is marked dropped."""
+    docs, prompt = pack_context(ctx, docs)
+    completion, gen_latency, last_err = generate_shared(ctx, prompt, endpoint)
+    observe(GENERATE_LAT, gen_latency, exid)
+    if slot is not None:
+        slot.observe(gen_latency)
+
+    if not completion:
+        if slot is not None:
+            slot.drop()
+        jlog(event="llm.error", error=last_err or "unknown")
+        return {"error":"llm_failed","detail": last_err}, 500
+
+    resp = finish_answer(ctx, completion, docs, prompt, exid,
+                         latency_retrieve_ms=int(rt*1000), latency_generate_ms=int(gen_latency*1000))
+    return resp, 200
+
+def batch_answer(ctx: AskContext, docs: list, rt: float, exid: Optional[str]) -> Tuple[dict, int]:
+    """answer_for one /ask/batch item. Like /ask, each generation holds an ask_limiter slot, so
+    batch load feeds the adaptive limit; an item shed by the limiter gets its own 503."""
+    if ask_limiter is None:
+        return answer_for(ctx, docs, rt, exid, endpoint="ask_batch")
+    try:
+        with ask_limiter.limit_slot() as slot:
+            return answer_for(ctx, docs, rt, exid, slot, endpoint="ask_batch")
+    except Overloaded as e:
+        return overloaded_body(e)[0], 503
+
+# --- /ask/batch -------------------------------------------------------------
+# Shared by every batch request, so BATCH_LLM_CONCURRENCY bounds LLM calls process-wide.
+batch_pool = ThreadPoolExecutor(max_workers=BATCH_LLM_CONCURRENCY, thread_name_prefix="rag-batch-llm")
+
+def batch_items(payload: dict) -> Tuple[Optional[List[dict]], Optional[Tuple[dict, int]]]:
+    """`questions`: strings or {question, top_k, temperature, explain}; top-level values are defaults."""
+    qs = payload.get("questions")
+    if not isinstance(qs, list) or not qs:
+        return None, ({"error":"questions(list) is required"}, 400)
+    if len(qs) > BATCH_MAX_ITEMS:
+        return None, ({"error":"too_many_questions","max": BATCH_MAX_ITEMS}, 413)
+    items = []
+    for q in qs:
+        item = dict(q) if isinstance(q, dict) else {"question": q}
+        for k in ("top_k", "temperature", "explain"):
+            if k in payload:
+                item.setdefault(k, payload[k])
+        items.append(item)
+    return items, None
+
+def run_batch(items: List[dict], headers):
+    """Yield one {"index", "status", ...body} per item as it completes.
+
+    Items go through in chunks of BATCH_CHUNK (one embed call, one Chroma query, one rerank pass
+    per chunk), so only a chunk's retrieved docs are held at a time."""
+    with span("rag.ask.batch", size=len(items), chunk=BATCH_CHUNK):
+        for start in range(0, len(items), BATCH_CHUNK):
+            yield from _run_chunk(start, items[start:start + BATCH_CHUNK], headers)
+
+def _run_chunk(base: int, chunk: List[dict], headers):
+    ctxs = []
+    for i, item in enumerate(chunk, base):
+        try:
+            ctx, err = ask_context(item, headers)
+        except (TypeError, ValueError) as e:
+            ctx, err = None, ({"error":"invalid_item","detail": str(e)}, 400)
+        if err:
+            yield {"index": i, "status": err[1], **err[0]}
+        else:
+            ctxs.append((i, ctx))
+
+    need = [ctx for _, ctx in ctxs if answer_cache is not None and not ctx.explain]
+    if need:
+        try:
+            for ctx, vec in zip(need, embed_texts([ctx.q for ctx in need])):
+                ctx.qvec = vec
+        except Exception as e:
+            jlog(event="answer_cache.error", error=str(e), batch=len(need))
+        for ctx in need:
+            answer_cache_lookup(ctx)
+
+    todo = []
+    for i, ctx in ctxs:
+        if ctx.cached:
+            entry, sim = ctx.cached
+            rec, resp = cache_hit_result(entry, sim, ctx.q, ctx.model, ctx.pv, ctx.topk, ctx.temperature)
+            record_answer(rec, cache_similarity=rec["cache_similarity"], batch=True)
+            yield {"index": i, "status": 200, **resp}
+        else:
+            todo.append((i, ctx))
+    if not todo:
+        return
+
+    t0 = time.time()
+    with span("rag.retrieve", top_k=max(c.topk for _, c in todo), index=INDEX_NAME, rerank=bool(reranker), batch=len(todo)):
+        ranked = batch_retrieve([(c.q, c.topk, c.qvec) for _, c in todo])
+    rt = time.time() - t0
+    exid = current_trace_id_hex()
+    for _ in todo:
+        observe(RETRIEVE_LAT, rt, exid)
+
+    futs = {batch_pool.submit(batch_answer, ctx, docs, rt, exid): i for (i, ctx), docs in zip(todo, ranked)}
+    del ranked
+    for fut in as_completed(futs):
+        try:
+            resp, status = fut.result()
+        except Exception as e:
+            jlog(event="batch.item.error", error=str(e), index=futs[fut])
+            resp, status = {"error":"internal_error","detail": str(e)}, 500
+        yield {"index": futs[fut], "status": status, **resp}
+
 app = Flask(__name__)
 limiter = Limiter(get_remote_address, app=app, default_limits=["120/minute"], storage_uri="memory://")
 
+@app.errorhandler(Overloaded)
+def overloaded(e: Overloaded):
+    body, headers = overloaded_body(e)
+    return jsonify(body), 503, headers
+
 @app.after_request
 def security_headers(resp):
     resp.headers["X-Content-Type-Options"] = "nosniff"
@@ -205,6 +1162,11 @@ def security_headers(resp):
 def healthz():
     return {"ok": True, "service": SERVICE}, 200
 
+@app.get("/readyz")
+def readyz():
+    st = warm.status(READY_REQUIRES)
+    return st, (200 if st["ready"] else 503)
+
 @app.get("/metrics")
 def metrics():
     return generate_latest(), 200, {"Content-Type": CONTENT_TYPE_LATEST}
@@ -218,138 +1180,111 @@ def openapi():
 @app.post("/feedback")
 @limiter.limit("10/minute")
 def feedback():
-    os.makedirs("./data", exist_ok=True)
     data = request.get_json(silent=True) or {}
     data["ts"] = time.time()
-    with open("./data/feedback.jsonl","a",encoding="utf-8") as f:
-        f.write(json.dumps(data, ensure_ascii=False)+"\n")
+    append_feedback(data)
     jlog(event="feedback", payload=data)
     return {"ok": True}, 200
 
 @app.post("/ask")
 @limiter.limit("60/minute")
 def ask():
-    payload = request.get_json(silent=True) or {}
-    raw_q = (payload.get("question") or "").strip()
-    if not raw_q:
-        return jsonify({"error":"question is required"}), 400
-
-    q = mask_pii(raw_q)
-    if contains_injection(q):
-        return jsonify({"error":"prompt_injection_detected"}), 400
-    urls = external_links(q)
-    if any(is_external_domain(u, allowlist=set()) for u in urls):
-        return jsonify({"error":"external_links_blocked", "urls": urls}), 400
+    ctx, err = ask_prelude(request.get_json(silent=True) or {}, request.headers)
+    if err:
+        return jsonify(err[0]), err[1]
+    if ctx.cached:
+        entry, sim = ctx.cached
+        rec, resp = cache_hit_result(entry, sim, ctx.q, ctx.model, ctx.pv, ctx.topk, ctx.temperature)
+        record_answer(rec, cache_similarity=rec["cache_similarity"])
+        return jsonify(resp), 200
 
-    topk = int(payload.get("top_k", TOP_K))
-    temperature = float(payload.get("temperature", os.getenv("TEMPERATURE","0.2")))
-    explain = bool(payload.get("explain", False))  # Transparency Mode
+    with ask_limiter.limit_slot() if ask_limiter else contextlib.nullcontext() as slot:
+        docs, rt, exid = retrieve_for(ctx)
+        resp, status = answer_for(ctx, docs, rt, exid, slot)
+    return jsonify(resp), status
 
-    model = choose_model()
-    pv = choose_prompt_version()
-    REQUESTS.labels(model=model, prompt_version=pv).inc()
+@app.post("/ask/batch")
+@limiter.limit("10/minute")
+def ask_batch():
+    """Many questions in one call, each with /ask's guardrails and its own status. Returns
+    {"results": [...]} in input order, or NDJSON lines in completion order when the client
+    sends `Accept: application/x-ndjson` (or ?stream=1)."""
+    items, err = batch_items(request.get_json(silent=True) or {})
+    if err:
+        return jsonify(err[0]), err[1]
+    if request.args.get("stream") == "1" or "application/x-ndjson" in request.headers.get("Accept", ""):
+        lines = (json.dumps(r, ensure_ascii=False) + "\n" for r in run_batch(items, request.headers))
+        return Response(stream_with_context(lines), mimetype="application/x-ndjson",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    results = sorted(run_batch(items, request.headers), key=lambda r: r["index"])
+    return jsonify({"count": len(results), "errors": sum(r["status"] != 200 for r in results),
+                    "results": results}), 200
 
-    t0 = time.time()
-    with span("rag.retrieve", top_k=topk, index=INDEX_NAME, rerank=bool(reranker)):
-        docs = hybrid_retrieve(q, topk=topk)
-    rt = time.time() - t0
-    exid = current_trace_id_hex()
-    if exid: RETRIEVE_LAT.observe(rt, exemplar={'trace_id': exid})
-    else:    RETRIEVE_LAT.observe(rt)
+@app.post("/ask/stream")
+@limiter.limit("60/minute")
+def ask_stream():
+    """/ask as server-sent events: `token` events while the LLM streams, then one `done` event
+    with the same body /ask returns (sources, support, cost)."""
+    ctx, err = ask_prelude(request.get_json(silent=True) or {}, request.headers)
+    if err:
+        return jsonify(err[0]), err[1]
+    # taken before the stream starts so an overloaded server still answers 503; released when the response closes
+    slot = ask_limiter.acquire() if ask_limiter and not ctx.cached else None
 
-    contexts = [d["text"] for (d, _) in docs]
-    context_text = "\n\n".join(contexts)
+    def events():
+        if ctx.cached:
+            entry, sim = ctx.cached
+            rec, resp = cache_hit_result(entry, sim, ctx.q, ctx.model, ctx.pv, ctx.topk, ctx.temperature)
+            record_answer(rec, cache_similarity=rec["cache_similarity"])
+            yield sse("token", {"t": resp["answer"]})
+            yield sse("done", resp)
+            return
 
-    prompt = build_prompt(pv, q, context_text)
-    tries, gen_latency, last_err = 0, 0.0, None
-    completion = None
-
-    while tries < 2 and completion is None:
-        tries += 1
+        docs, rt, exid = retrieve_for(ctx)
+        docs, prompt = pack_context(ctx, docs)
+        validator = V2StreamValidator() if is_json(ctx.pv) else None
+        parts, ttft = [], None
         t1 = time.time()
-        with span("llm.generate", model=model, provider="ollama",
-                  temperature=temperature, prompt_version=pv, attempt=tries):
+        with span("llm.generate", model=ctx.model, provider="ollama", temperature=ctx.temperature,
+                  prompt_version=ctx.pv, prompt_prefix=prompt_prefix(ctx.pv, prompt), attempt=1, stream=True) as sp:
             try:
-                out = client.chat.completions.create(
-                    model=model,
-                    messages=[
-                        {"role":"system","content":"Answer using only the provided CONTEXT."},
-                        {"role":"user","content": prompt},
-                    ],
-                    temperature=temperature,
-                )
-                completion = out.choices[0].message.content
+                for delta in stream_deltas(ctx, prompt, sp):
+                    if ttft is None:
+                        ttft = time.time() - t1
+                        observe(TTFT_LAT, ttft, exid)
+                    parts.append(delta)
+                    if validator and validator.ok and not validator.feed(delta):
+                        yield sse("warning", {"error": "v2_invalid_json", "at": validator.pos})
+                    yield sse("token", {"t": delta})
             except Exception as e:
-                last_err = str(e)
-                completion = None
+                jlog(event="llm.error", error=str(e), stream=True)
+                if slot:
+                    slot.drop()
+                yield sse("error", {"error": "llm_failed", "detail": str(e)})
+                return
         gen_latency = time.time() - t1
+        observe(GENERATE_LAT, gen_latency, exid)
+        if slot:
+            slot.observe(gen_latency)
+            slot.release()
 
-        if completion and pv=="v2":
-            try:
-                AnswerV2.model_validate_json(completion)
-            except ValidationError:
-                if tries < 2:
-                    temperature = max(0.0, temperature - 0.2)
-                    completion = None
-                else:
-                    completion = json.dumps({"answer": completion, "citations": [], "confidence": 0.5})
-
-    if exid: GENERATE_LAT.observe(gen_latency, exemplar={'trace_id': exid})
-    else:    GENERATE_LAT.observe(gen_latency)
-
-    if not completion:
-        jlog(event="llm.error", error=last_err or "unknown")
-        return jsonify({"error":"llm_failed","detail": last_err}), 500
-
-    supp = support_score(completion, contexts)
-    HALLU_SCORE.observe(supp)
+        completion = "".join(parts)
+        if not completion:
+            yield sse("error", {"error": "llm_failed", "detail": "empty completion"})
+            return
+        if validator:
+            completion, _ = check_v2(completion, ctx.pv, 2, ctx.temperature)
+        resp = finish_answer(ctx, completion, docs, prompt, exid, latency_retrieve_ms=int(rt*1000),
+                             latency_generate_ms=int(gen_latency*1000), ttft_ms=int((ttft or gen_latency)*1000))
+        yield sse("done", resp)
 
-    est_cost = estimate_cost_usd(model, prompt, completion)
-    COST_USD.inc(est_cost)
-
-    os.makedirs("./data/sessions", exist_ok=True)
-    sess_file = f"./data/sessions/{datetime.date.today().isoformat()}.jsonl"
-    rec = {
-        "ts": time.time(),
-        "q": q,
-        "answer": completion,
-        "model": model,
-        "prompt_version": pv,
-        "top_k": topk,
-        "support": supp,
-        "estimated_cost_usd": round(est_cost, 6),
-        "trace_id": exid,
-        "sources": [{"id": d["id"], "metadata": d["metadata"], "dense_sim": d["dense_sim"]} for (d, _) in docs],
-    }
-    with open(sess_file, "a", encoding="utf-8") as f:
-        f.write(json.dumps(rec, ensure_ascii=False) + "\n")
-
-    jlog(event="rag.answer",
-         question=q, source_count=len(contexts), rerank=bool(reranker),
-         top_k=topk, model=model, prompt_version=pv,
-         latency_retrieve_ms=int(rt*1000), latency_generate_ms=int(gen_latency*1000),
-         support=round(supp,3), estimated_cost_usd=round(est_cost,6))
-
-    resp = {
-        "answer": completion,
-        "sources": rec["sources"],
-        "used_reranker": bool(reranker),
-        "top_k": topk,
-        "model": model,
-        "prompt_version": pv,
-        "temperature": temperature,
-        "support": round(supp,3),
-        "estimated_cost_usd": round(est_cost,6),
-    }
-
-    if explain:
-        resp["trace_id"] = exid
-        resp["trace_link_datadog"] = dd_link(exid)
-        resp["trace_link_tempo"] = tempo_link(exid)
-        resp["prompt"] = prompt
-        resp["contexts"] = contexts
+    resp = Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    if slot:
+        resp.call_on_close(slot.release)
+    return resp
 
-    return jsonify(resp), 200
+warm.start(block=WARMUP_MODE == "eager")
 
 if __name__ == "__main__":
     app.run(host=os.getenv("HOST","0.0.0.0"), port=int(os.getenv("PORT","8081")), debug=False)
@@ -0,0 +1,368 @@
+"""Async (ASGI) serving mode for the lab2 RAG API.
+
+Same /ask, /feedback, /metrics and /healthz contract as the Flask app, but one
+event loop serves many concurrent slow LLM calls:
+- OpenAI, embedder and Chroma calls use async clients;
+- reranker / NLI run in a bounded CPU executor (CPU_WORKERS);
+- in-flight generations are capped by core.ask_limiter (shared with the
+  Flask app's settings); excess requests queue briefly, then get 503;
+- with SINGLE_FLIGHT, identical in-flight generations (and streams) share
+  one LLM call through core.llm_flights;
+- guardrails overlap with the query embedding, support scoring runs after the
+  response (HALLU_MODE), and session/feedback records go to the buffered log writers.
+
+Run from the repo root (lab2_rag/ is the import alias of lab2-rag/):
+    uvicorn lab2_rag.api.asgi:app --host 0.0.0.0 --port 8081
+or `python -m lab2_rag.api.asgi`.
+"""
+from __future__ import annotations
+import asyncio, contextlib, json, os, time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import List, Optional
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+from openai import AsyncOpenAI
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+
+from utils.pii import mask_pii
+from utils.adaptive_limit import Overloaded
+from utils.single_flight import flight_key
+from . import app as core
+from .streaming import sse, V2StreamValidator
+
+CPU_WORKERS = int(os.getenv("CPU_WORKERS","4"))
+cpu_pool = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="rag-cpu")
+
+aclient: Optional[AsyncOpenAI] = None
+http_client: Optional[httpx.AsyncClient] = None
+acol = None  # chromadb async collection; None -> sync client in a worker thread
+
+app = FastAPI(title="RAG API (async)", version="1.0.0")
+
+async def run_cpu(fn, *args, **kw):
+    return await asyncio.get_running_loop().run_in_executor(cpu_pool, partial(fn, *args, **kw))
+
+@app.on_event("startup")
+async def _startup() -> None:
+    global aclient, http_client, acol
+    base = os.getenv("OPENAI_BASE_URL")
+    key = os.getenv("OPENAI_API_KEY")
+    aclient = AsyncOpenAI(base_url=base, api_key=key or "ollama") if base else AsyncOpenAI(api_key=key)
+    http_client = httpx.AsyncClient(timeout=httpx.Timeout(10.0, connect=2.0))
+    try:
+        from chromadb import AsyncHttpClient
+        achroma = await AsyncHttpClient(host=core.HOST, port=core.PORT)
+        acol = await achroma.get_or_create_collection(core.INDEX_NAME)
+    except Exception as e:
+        core.jlog(event="chroma.async.unavailable", error=str(e))
+        acol = None
+
+@app.on_event("shutdown")
+async def _shutdown() -> None:
+    if http_client is not None:
+        await http_client.aclose()
+    if aclient is not None:
+        await aclient.close()
+    cpu_pool.shutdown(wait=False)
+    if core.support_batcher is not None:
+        core.support_batcher.close()  # pending support records go out before the session log closes
+    core.session_log.close()
+    core.feedback_log.close()
+
+@app.exception_handler(Overloaded)
+async def overloaded(request: Request, e: Overloaded):
+    body, headers = core.overloaded_body(e)
+    return JSONResponse(body, 503, headers=headers)
+
+@app.middleware("http")
+async def security_headers(request: Request, call_next):
+    resp = await call_next(request)
+    resp.headers["X-Content-Type-Options"] = "nosniff"
+    resp.headers["X-Frame-Options"] = "DENY"
+    resp.headers["Referrer-Policy"] = "no-referrer"
+    return resp
+
+async def embed_query(q: str) -> Optional[List[float]]:
+    try:
+        r = await http_client.post(f"{core.EMBEDDER_URL}/embed", json={"texts": [q]})
+        r.raise_for_status()
+        return r.json()["embeddings"][0]
+    except Exception as e:
+        core.jlog(event="embed.error", error=str(e))
+        return None
+
+async def retrieve(q: str, topk: int, qvec: Optional[List[float]]):
+    key = None
+    if core.retrieve_cache is not None:
+        key = await asyncio.to_thread(core.retrieve_cache_key, q, topk)
+        docs = core.retrieve_cache_get(key)
+        if docs is not None:
+            return docs
+    t0, warming = time.time(), core.retrieval_warming()
+    n = core.prefetch_size(topk)
+    if qvec is not None and acol is not None and not core.local_index_ready():
+        with core.span("rag.retrieve.prefetch", top_k=n, index=core.INDEX_NAME, backend="chroma"):
+            res = await acol.query(query_embeddings=[qvec], n_results=n,
+                                   include=["documents","distances","metadatas","ids"])
+    else:
+        try:
+            res = await asyncio.to_thread(core.dense_query, q, n, qvec)
+        except RuntimeError as e:  # Chroma still connecting: sparse-only
+            core.jlog(event="retrieval.dense.unavailable", error=str(e))
+            res = {}
+    docs = await run_cpu(core.rank_docs, q, topk, core.dense_docs(res))
+    if key is not None and not warming:
+        core.retrieve_cache.put(key, (docs, time.time() - t0))
+    return docs
+
+async def generate(model: str, prompt: str, temperature: float, pv: str):
+    tries, gen_latency, last_err = 0, 0.0, None
+    completion = None
+    while tries < 2 and completion is None:
+        tries += 1
+        t1 = time.time()
+        with core.span("llm.generate", model=model, provider="ollama", temperature=temperature,
+                       prompt_version=pv, prompt_prefix=core.prompt_prefix(pv, prompt), attempt=tries):
+            try:
+                out = await aclient.chat.completions.create(
+                    model=model,
+                    messages=core.chat_messages(prompt, pv),
+                    temperature=temperature,
+                )
+                completion = out.choices[0].message.content
+            except Exception as e:
+                last_err = str(e)
+                completion = None
+        gen_latency = time.time() - t1
+        completion, temperature = core.check_v2(completion, pv, tries, temperature)
+    return completion, temperature, gen_latency, last_err
+
+async def generate_shared(ctx, prompt: str):
+    """generate(), joined to an identical in-flight generation when ask is in SINGLE_FLIGHT."""
+    if "ask" not in core.SINGLE_FLIGHT:
+        return await generate(ctx.model, prompt, ctx.temperature, ctx.pv)
+    key = flight_key(ctx.model, core.system_prompt(ctx.pv), prompt, ctx.temperature, ctx.pv)
+    with core.span("llm.single_flight", model=ctx.model, prompt_version=ctx.pv, endpoint="ask") as sp:
+        out, shared = await core.llm_flights.ado(key, lambda: generate(ctx.model, prompt, ctx.temperature, ctx.pv))
+        core.set_span_tag(sp, "coalesced", shared)
+    if shared:
+        ctx.coalesced = True
+        core.LLM_COALESCED.labels(endpoint="ask").inc()
+    return out
+
+async def llm_deltas(model: str, prompt: str, temperature: float, pv: Optional[str] = None):
+    stream = await aclient.chat.completions.create(
+        model=model,
+        messages=core.chat_messages(prompt, pv),
+        temperature=temperature,
+        stream=True,
+    )
+    async for chunk in stream:
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if delta:
+            yield delta
+
+def stream_deltas(ctx, prompt: str, sp=None):
+    """Async counterpart of core.stream_deltas (call from the event loop)."""
+    if "ask_stream" not in core.SINGLE_FLIGHT:
+        return llm_deltas(ctx.model, prompt, ctx.temperature, ctx.pv)
+    key = flight_key(ctx.model, core.system_prompt(ctx.pv), prompt, ctx.temperature, ctx.pv)
+    deltas, shared = core.llm_flights.astream(key, lambda: llm_deltas(ctx.model, prompt, ctx.temperature, ctx.pv))
+    core.set_span_tag(sp, "coalesced", shared)
+    if shared:
+        ctx.coalesced = True
+        core.LLM_COALESCED.labels(endpoint="ask_stream").inc()
+    return deltas
+
+@app.get("/healthz")
+async def healthz():
+    return {"ok": True, "service": core.SERVICE, "mode": "asgi"}
+
+@app.get("/readyz")
+async def readyz():
+    st = core.warm.status(core.READY_REQUIRES)
+    return JSONResponse(st, 200 if st["ready"] else 503)
+
+@app.get("/metrics")
+async def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@app.post("/feedback")
+async def feedback(request: Request):
+    try:
+        data = await request.json()
+    except Exception:
+        data = None
+    data = data if isinstance(data, dict) else {}
+    data["ts"] = time.time()
+    core.append_feedback(data)
+    core.jlog(event="feedback", payload=data)
+    return {"ok": True}
+
+async def prelude(request: Request):
+    """Async counterpart of core.ask_prelude -> (AskContext, None) or (None, error response)."""
+    try:
+        payload = await request.json()
+    except Exception:
+        payload = None
+    payload = payload if isinstance(payload, dict) else {}
+    raw_q = payload.get("question")
+    raw_q = raw_q.strip() if isinstance(raw_q, str) else ""
+    if not raw_q:
+        return None, JSONResponse({"error":"question is required"}, 400)
+
+    q = mask_pii(raw_q)
+    embed_task = asyncio.create_task(embed_query(q))
+    err = await asyncio.to_thread(core.guardrail_error, q)  # the embed request runs meanwhile
+    if err:
+        embed_task.cancel()
+        return None, JSONResponse(err, 400)
+
+    ctx = core.AskContext(
+        q=q,
+        topk=int(payload.get("top_k", core.TOP_K)),
+        temperature=float(payload.get("temperature", os.getenv("TEMPERATURE","0.2"))),
+        explain=bool(payload.get("explain", False)),
+        model=core.choose_model(request.headers),
+        pv=core.choose_prompt_version(request.headers),
+    )
+    core.REQUESTS.labels(model=ctx.model, prompt_version=ctx.pv).inc()
+    ctx.qvec = await embed_task
+
+    if core.answer_cache is not None and not ctx.explain and ctx.qvec is not None:
+        ctx.scope = (ctx.model, ctx.pv, await asyncio.to_thread(core.kb_version.current))
+        with core.span("rag.answer_cache.lookup", model=ctx.model, prompt_version=ctx.pv):
+            ctx.cached = core.answer_cache.lookup(ctx.scope, ctx.qvec)
+        core.ANSWER_CACHE_REQ.labels(result="hit" if ctx.cached else "miss").inc()
+    return ctx, None
+
+async def retrieve_for(ctx):
+    t0 = time.time()
+    with core.span("rag.retrieve", top_k=ctx.topk, index=core.INDEX_NAME, rerank=bool(core.reranker)):
+        docs = await retrieve(ctx.q, ctx.topk, ctx.qvec)
+    rt = time.time() - t0
+    exid = core.current_trace_id_hex()
+    core.observe(core.RETRIEVE_LAT, rt, exid)
+    return docs, rt, exid
+
+@app.post("/ask")
+async def ask(request: Request):
+    ctx, err = await prelude(request)
+    if err is not None:
+        return err
+    if ctx.cached:
+        entry, sim = ctx.cached
+        rec, resp = core.cache_hit_result(entry, sim, ctx.q, ctx.model, ctx.pv, ctx.topk, ctx.temperature)
+        core.record_answer(rec, cache_similarity=rec["cache_similarity"])
+        return JSONResponse(resp)
+
+    async with core.ask_limiter.alimit_slot() if core.ask_limiter else contextlib.nullcontext() as slot:
+        docs, rt, exid = await retrieve_for(ctx)
+        docs, prompt = await run_cpu(core.pack_context, ctx, docs)
+        completion, ctx.temperature, gen_latency, last_err = await generate_shared(ctx, prompt)
+        core.observe(core.GENERATE_LAT, gen_latency, exid)
+        if slot is not None:
+            slot.observe(gen_latency)
+            if not completion:
+                slot.drop()
+
+    if not completion:
+        core.jlog(event="llm.error", error=last_err or "unknown")
+        return JSONResponse({"error":"llm_failed","detail": last_err}, 500)
+
+    resp = await run_cpu(core.finish_answer, ctx, completion, docs, prompt, exid,
+                         latency_retrieve_ms=int(rt*1000), latency_generate_ms=int(gen_latency*1000))
+    return JSONResponse(resp)
+
+@app.post("/ask/batch")
+async def ask_batch(request: Request):
+    """Same contract as the Flask /ask/batch; the batch pipeline runs in the threadpool."""
+    try:
+        payload = await request.json()
+    except Exception:
+        payload = None
+    items, err = core.batch_items(payload if isinstance(payload, dict) else {})
+    if err:
+        return JSONResponse(err[0], err[1])
+    if request.query_params.get("stream") == "1" or "application/x-ndjson" in request.headers.get("accept", ""):
+        lines = (json.dumps(r, ensure_ascii=False) + "\n" for r in core.run_batch(items, request.headers))
+        return StreamingResponse(lines, media_type="application/x-ndjson",  # sync iterator -> threadpool
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    results = await asyncio.to_thread(lambda: sorted(core.run_batch(items, request.headers), key=lambda r: r["index"]))
+    return JSONResponse({"count": len(results), "errors": sum(r["status"] != 200 for r in results),
+                         "results": results})
+
+@app.post("/ask/stream")
+async def ask_stream(request: Request):
+    ctx, err = await prelude(request)
+    if err is not None:
+        return err
+    slot = await core.ask_limiter.acquire_async() if core.ask_limiter and not ctx.cached else None
+
+    async def events():
+        if ctx.cached:
+            entry, sim = ctx.cached
+            rec, resp = core.cache_hit_result(entry, sim, ctx.q, ctx.model, ctx.pv, ctx.topk, ctx.temperature)
+            core.record_answer(rec, cache_similarity=rec["cache_similarity"])
+            yield sse("token", {"t": resp["answer"]})
+            yield sse("done", resp)
+            return
+
+        try:
+            docs, rt, exid = await retrieve_for(ctx)
+            docs, prompt = await run_cpu(core.pack_context, ctx, docs)
+        except Exception as e:
+            core.jlog(event="retrieval.error", error=str(e), stream=True)
+            if slot:
+                slot.drop()
+            yield sse("error", {"error": "internal_error", "detail": str(e)})
+            return
+        validator = V2StreamValidator() if core.is_json(ctx.pv) else None
+        parts, ttft = [], None
+        t1 = time.time()
+        with core.span("llm.generate", model=ctx.model, provider="ollama", temperature=ctx.temperature,
+                       prompt_version=ctx.pv, prompt_prefix=core.prompt_prefix(ctx.pv, prompt), attempt=1,
+                       stream=True) as sp:
+            try:
+                async for delta in stream_deltas(ctx, prompt, sp):
+                    if ttft is None:
+                        ttft = time.time() - t1
+                        core.observe(core.TTFT_LAT, ttft, exid)
+                    parts.append(delta)
+                    if validator and validator.ok and not validator.feed(delta):
+                        yield sse("warning", {"error": "v2_invalid_json", "at": validator.pos})
+                    yield sse("token", {"t": delta})
+            except Exception as e:
+                core.jlog(event="llm.error", error=str(e), stream=True)
+                if slot:
+                    slot.drop()
+                yield sse("error", {"error": "llm_failed", "detail": str(e)})
+                return
+        gen_latency = time.time() - t1
+        core.observe(core.GENERATE_LAT, gen_latency, exid)
+        if slot:
+            slot.observe(gen_latency)
+            slot.release()
+
+        completion = "".join(parts)
+        if not completion:
+            yield sse("error", {"error": "llm_failed", "detail": "empty completion"})
+            return
+        if validator:
+            completion, _ = core.check_v2(completion, ctx.pv, 2, ctx.temperature)
+        resp = await run_cpu(core.finish_answer, ctx, completion, docs, prompt, exid,
+                             latency_retrieve_ms=int(rt*1000), latency_generate_ms=int(gen_latency*1000),
+                             ttft_ms=int((ttft or gen_latency)*1000))
+        yield sse("done", resp)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+                             background=BackgroundTask(slot.release) if slot else None)
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host=os.getenv("HOST","0.0.0.0"), port=int(os.getenv("PORT","8081")))
@@ -0,0 +1,56 @@
+from __future__ import annotations
+import time, threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+def normalize_query(q: str) -> str:
+    return " ".join((q or "").lower().split())
+
+class TTLCache:
+    """Bounded LRU with per-entry TTL. `on_evict(reason)` is called for lru/ttl/clear evictions."""
+
+    def __init__(self, maxsize: int = 1024, ttl_s: float = 300.0,
+                 on_evict: Optional[Callable[[str, int], None]] = None):
+        self.maxsize, self.ttl_s, self.on_evict = maxsize, ttl_s, on_evict
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _evicted(self, reason: str, n: int = 1) -> None:
+        if self.on_evict and n:
+            self.on_evict(reason, n)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if self.ttl_s and expires < time.monotonic():
+                del self._data[key]
+                expired = True
+            else:
+                self._data.move_to_end(key)
+                expired = False
+        if expired:
+            self._evicted("ttl")
+            return None
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        evicted = 0
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_s, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                evicted += 1
+        self._evicted("lru", evicted)
+
+    def clear(self, reason: str = "clear") -> None:
+        with self._lock:
+            n = len(self._data)
+            self._data.clear()
+        self._evicted(reason, n)
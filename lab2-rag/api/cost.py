@@ -1,13 +1,16 @@
+from retrieval.chunking import get_tokenizer
+
 RATES = {
     # example rates (USD per 1K tokens); adjust per your infra
     "llama3.1": {"input": 0.2/1000, "output": 0.2/1000},
 }
 
-def estimate_tokens(text: str) -> int:
-    return max(1, int(len(text) / 4))
+def estimate_tokens(text: str, tokenizer=None) -> int:
+    """Token count under `tokenizer` (a retrieval.chunking tokenizer, e.g. the model's); regex words/punctuation by default."""
+    return max(1, len((tokenizer or get_tokenizer("regex")).spans(text)))
 
-def estimate_cost_usd(model: str, prompt: str, completion: str|None) -> float:
+def estimate_cost_usd(model: str, prompt: str, completion: str|None, tokenizer=None) -> float:
     r = RATES.get(model, {"input":0.0001, "output":0.0001})
-    t_in = estimate_tokens(prompt or "")
-    t_out = estimate_tokens((completion or ""))
+    t_in = estimate_tokens(prompt or "", tokenizer)
+    t_out = estimate_tokens((completion or ""), tokenizer)
     return t_in * r["input"] + t_out * r["output"]
@@ -2,12 +2,43 @@
 # dataset format: JSONL with {"question": "...", "ground_truth": "..."}
 import json, argparse, statistics, time, requests
 
-def run_eval(api, path, limit=None):
+def is_hit(gt, ans):
+    # naive hit: GT substring present
+    return (gt.lower() in ans.lower()) if gt else (len(ans)>0)
+
+def run_eval_batch(api, qs, batch):
+    """Same scoring through /ask/batch (NDJSON): one request per `batch` questions."""
+    hits, errors = 0, 0
+    t0 = time.time()
+    for start in range(0, len(qs), batch):
+        rows = qs[start:start+batch]
+        r = requests.post(f"{api}/ask/batch", json={"questions": [row["question"] for row in rows], "top_k": 8},
+                          headers={"Accept": "application/x-ndjson"}, stream=True, timeout=600)
+        if not r.ok:
+            print("ERR", r.status_code, r.text[:200])
+            errors += len(rows)
+            continue
+        for line in r.iter_lines():
+            if not line: continue
+            item = json.loads(line)
+            if item.get("status") != 200:
+                print("ERR", item.get("index"), item.get("error"))
+                errors += 1
+                continue
+            hits += is_hit(rows[item["index"]].get("ground_truth", ""), item.get("answer",""))
+    wall = time.time() - t0
+    total = len(qs)
+    print(json.dumps({"precision_like": round(hits/total if total else 0.0, 3), "errors": errors,
+                      "wall_s": round(wall,3), "questions_per_s": round(total/wall, 2) if wall else 0}, indent=2))
+
+def run_eval(api, path, limit=None, batch=0):
     qs = []
     with open(path, "r", encoding="utf-8") as f:
         for i, line in enumerate(f):
             if limit and i >= limit: break
             qs.append(json.loads(line))
+    if batch:
+        return run_eval_batch(api, qs, batch)
 
     latencies = []
     hits = 0
@@ -21,10 +52,7 @@ def run_eval(api, path, limit=None):
         latencies.append(dt)
         total += 1
         if r.ok:
-            ans = r.json().get("answer","")
-            # naive hit: GT substring present
-            ok = (gt.lower() in ans.lower()) if gt else (len(ans)>0)
-            hits += 1 if ok else 0
+            hits += 1 if is_hit(gt, r.json().get("answer","")) else 0
         else:
             print("ERR", r.status_code, r.text[:200])
 
@@ -38,5 +66,6 @@ if __name__ == "__main__":
     ap.add_argument("--api", default="http://localhost:8081")
     ap.add_argument("--dataset", default="./data/eval.jsonl")
     ap.add_argument("--limit", type=int)
+    ap.add_argument("--batch", type=int, default=0, help="questions per /ask/batch call (0 = one /ask per question)")
     args = ap.parse_args()
-    run_eval(args.api, args.dataset, args.limit)
+    run_eval(args.api, args.dataset, args.limit, args.batch)
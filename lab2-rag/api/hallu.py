@@ -1,6 +1,7 @@
 from __future__ import annotations
-import os
-from typing import List
+import json, os, re
+from typing import List, Sequence, Tuple
+import numpy as np
 try:
     from sentence_transformers import CrossEncoder
 except Exception:
@@ -8,10 +9,25 @@ except Exception:
 
 _MODEL_NAME = os.getenv("NLI_MODEL", "cross-encoder/nli-deberta-v3-base")
 _ce = None
+_deferred = False
+
+def defer_loading():
+    """Never load the model inside a request; `load_nli` (background warmup) does it."""
+    global _deferred
+    _deferred = True
+
+def load_nli():
+    global _ce
+    if CrossEncoder is None:
+        raise RuntimeError("sentence_transformers not installed")
+    ce = CrossEncoder(_MODEL_NAME)
+    ce.predict([("The sky is blue.", "The sky is blue.")])  # synthetic warmup inference
+    _ce = ce
+    return _MODEL_NAME
 
 def _ensure_ce():
     global _ce
-    if _ce is None and CrossEncoder:
+    if _ce is None and CrossEncoder and not _deferred:
         try:
             _ce = CrossEncoder(_MODEL_NAME)
         except Exception:
@@ -35,3 +51,85 @@ def support_score(answer: str, contexts: List[str]) -> float:
         inter = len(aw & cw)
         best = max(best, inter / max(1, len(aw)))
     return best
+
+# --- sentence-level scoring ---------------------------------------------------
+_SENT_SPLIT = re.compile(r"(?<=[.!?\u3002])\s+|\n+")
+_WORD = re.compile(r"\w+")
+
+def answer_text(completion: str) -> str:
+    """The prose to verify: v2 answers are JSON, only their `answer` field is a claim."""
+    try:
+        obj = json.loads(completion)
+        if isinstance(obj, dict) and isinstance(obj.get("answer"), str):
+            return obj["answer"]
+    except Exception:
+        pass
+    return completion
+
+def split_sentences(text: str, min_chars: int = 3) -> List[str]:
+    parts = (p.strip(" -*\t") for p in _SENT_SPLIT.split(text or ""))
+    return [p for p in parts if len(p) >= min_chars]
+
+def sentence_pairs(answer: str, contexts: List[str]) -> Tuple[List[str], List[Tuple[str, str]]]:
+    """(sentences, [(context, sentence) for every sentence x context]) -- premise first, as NLI expects."""
+    sents = split_sentences(answer_text(answer))
+    return sents, [(ctx, s) for s in sents for ctx in contexts]
+
+def _entailment_index(ce) -> int:
+    labels = getattr(getattr(ce, "config", None), "id2label", None) or {}
+    for i, name in labels.items():
+        if "entail" in str(name).lower():
+            return int(i)
+    return 1  # cross-encoder/nli-*: contradiction, entailment, neutral
+
+def _entailment(ce, scores) -> List[float]:
+    arr = np.asarray(scores, dtype=np.float64)
+    if arr.ndim == 2:  # NLI head -> softmax over labels, keep P(entailment)
+        arr = np.exp(arr - arr.max(axis=1, keepdims=True))
+        arr = (arr / arr.sum(axis=1, keepdims=True))[:, _entailment_index(ce)]
+    return arr.reshape(-1).tolist()
+
+def _lexical(pairs: Sequence[Tuple[str, str]]) -> List[float]:
+    out = []
+    for ctx, sent in pairs:
+        sw = set(_WORD.findall(sent.lower()))
+        cw = set(_WORD.findall(ctx.lower()))
+        out.append(len(sw & cw) / max(1, len(sw)))
+    return out
+
+def predict_pairs(pairs: Sequence[Tuple[str, str]], batch_size: int = 64) -> List[float]:
+    """Entailment score per (context, sentence) pair.
+
+    Pairs are length-bucketed (sorted by length, then cut into `batch_size`
+    slices) so each forward pass pads to similar lengths; scores come back in
+    input order. Lexical overlap stands in while the NLI model is not loaded.
+    """
+    if not pairs:
+        return []
+    ce = _ensure_ce()
+    if ce is None:
+        return _lexical(pairs)
+    order = sorted(range(len(pairs)), key=lambda i: len(pairs[i][0]) + len(pairs[i][1]))
+    out = [0.0] * len(pairs)
+    for start in range(0, len(order), batch_size):
+        idx = order[start:start + batch_size]
+        scores = _entailment(ce, ce.predict([pairs[i] for i in idx], batch_size=len(idx)))
+        for i, v in zip(idx, scores):
+            out[i] = float(v)
+    return out
+
+def aggregate(sentences: List[str], n_contexts: int, scores: Sequence[float]) -> dict:
+    """Per-sentence support = best context; answer support = mean over sentences."""
+    if not sentences or not n_contexts:
+        return {"support": 0.0, "min_sentence_support": 0.0, "sentences": []}
+    best = np.asarray(scores, dtype=np.float64).reshape(len(sentences), n_contexts).max(axis=1)
+    return {
+        "support": float(best.mean()),
+        "min_sentence_support": float(best.min()),
+        "sentences": [{"text": s, "support": round(float(b), 3)} for s, b in zip(sentences, best)],
+    }
+
+def sentence_support(answer: str, contexts: List[str], batch_size: int = 64) -> dict:
+    """Synchronous sentence-level scoring (explain mode / HALLU_MODE=sync)."""
+    sents, pairs = sentence_pairs(answer, contexts)
+    return aggregate(sents, len(contexts), predict_pairs(pairs, batch_size))
@@ -0,0 +1,162 @@
+from __future__ import annotations
+import atexit, datetime, gzip, json, os, queue, shutil, signal, sys, threading, time
+from typing import Callable, List, Optional
+
+class JsonlWriter:
+    """Non-blocking JSONL append pipeline.
+
+    `write()` only enqueues; one background thread per writer drains the queue
+    in batches (`batch_size` records or every `flush_interval_s`) and appends
+    them with a single write call. Each process writes its own segment
+    (`<dir>/<date>.<pid>.jsonl`), so workers never interleave partial lines.
+    Segments roll over at `rotate_bytes` or at midnight; closed segments are
+    gzip-compressed in the background.
+
+    fsync:        none (leave it to the OS) | batch (after every flush) | always (after every record)
+    backpressure: drop (count and discard when the queue is full) | block (caller waits)
+    """
+
+    def __init__(self, directory: str, flush_interval_s: float = 1.0, batch_size: int = 256,
+                 fsync: str = "batch", rotate_bytes: int = 64 * 1024 * 1024, queue_size: int = 10000,
+                 backpressure: str = "drop", compress: bool = True,
+                 on_drop: Optional[Callable[[], None]] = None,
+                 on_flush: Optional[Callable[[int, float], None]] = None):
+        self.directory = directory
+        self.flush_interval_s, self.batch_size = flush_interval_s, (1 if fsync == "always" else batch_size)
+        self.fsync, self.rotate_bytes, self.compress = fsync, rotate_bytes, compress
+        self.block = backpressure == "block"
+        self.on_drop, self.on_flush = on_drop, on_flush
+        self._q: "queue.Queue[Optional[str]]" = queue.Queue(maxsize=queue_size)
+        self._f = None
+        self._date: Optional[str] = None
+        self._seq = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=f"jsonl-writer:{directory}", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def depth(self) -> int:
+        return self._q.qsize()
+
+    def write(self, rec: dict) -> bool:
+        """Enqueue one record; False if it was dropped under backpressure."""
+        if self._closed:
+            return False
+        line = json.dumps(rec, ensure_ascii=False) + "\n"
+        try:
+            self._q.put(line, block=self.block)
+            return True
+        except queue.Full:
+            if self.on_drop:
+                self.on_drop()
+            return False
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Flush everything still buffered (graceful shutdown)."""
+        if self._closed:
+            return
+        self._closed = True
+        self._q.put(None)
+        self._thread.join(timeout)
+
+    # --- writer thread ---
+    def _path(self, date: str, seq: Optional[int] = None) -> str:
+        suffix = f".{seq}" if seq else ""
+        return os.path.join(self.directory, f"{date}.{os.getpid()}{suffix}.jsonl")
+
+    def _open(self, date: str) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        self._date = date
+        self._f = open(self._path(date), "a", encoding="utf-8")
+
+    def _seal(self) -> None:
+        """Close the active segment and hand it to the compressor."""
+        if self._f is None:
+            return
+        self._f.close()
+        self._f = None
+        src = self._path(self._date)
+        self._seq += 1
+        dst = self._path(self._date, self._seq)
+        while os.path.exists(dst) or os.path.exists(dst + ".gz"):
+            self._seq += 1
+            dst = self._path(self._date, self._seq)
+        os.replace(src, dst)
+        if self.compress:
+            threading.Thread(target=_gzip_file, args=(dst,), name="jsonl-gzip").start()
+
+    def _flush(self, lines: List[str]) -> None:
+        t0 = time.monotonic()
+        today = datetime.date.today().isoformat()
+        if self._f is not None and today != self._date:
+            self._seal()
+            self._seq = 0
+        if self._f is None:
+            self._open(today)
+        self._f.write("".join(lines))
+        self._f.flush()
+        if self.fsync in ("batch", "always"):
+            os.fsync(self._f.fileno())
+        if self.rotate_bytes and self._f.tell() >= self.rotate_bytes:
+            self._seal()
+        if self.on_flush:
+            self.on_flush(len(lines), time.monotonic() - t0)
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            lines: List[str] = []
+            deadline = time.monotonic() + self.flush_interval_s
+            while len(lines) < self.batch_size:
+                try:
+                    item = self._q.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                lines.append(item)
+            if lines:
+                try:
+                    self._flush(lines)
+                except Exception as e:
+                    print(json.dumps({"event": "log_writer.error", "dir": self.directory, "error": str(e)}))
+        # drain anything enqueued behind the sentinel, then close the segment
+        rest = []
+        while True:
+            try:
+                item = self._q.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                rest.append(item)
+        if rest:
+            self._flush(rest)
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+def exit_on_sigterm() -> bool:
+    """Make SIGTERM a normal interpreter exit, so atexit closes (and flushes) every writer.
+
+    Python's default SIGTERM action kills the process without running atexit, so
+    `docker stop` on a bare `app.run` server would lose the buffered records.
+    Servers that handle SIGTERM themselves (gunicorn, uvicorn) shut down
+    gracefully and exit normally already; an installed handler is left alone.
+    Returns True if the handler was installed (main thread, default action only).
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return False
+    if signal.getsignal(signal.SIGTERM) is not signal.SIG_DFL:
+        return False
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+    return True
+
+def _gzip_file(path: str) -> None:
+    try:
+        with open(path, "rb") as src, gzip.open(path + ".gz.tmp", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(path + ".gz.tmp", path + ".gz")
+        os.remove(path)
+    except Exception as e:
+        print(json.dumps({"event": "log_writer.gzip.error", "path": path, "error": str(e)}))
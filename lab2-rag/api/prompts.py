@@ -1,13 +1,65 @@
-import os, yaml
+import hashlib, os, yaml
+from typing import List, Optional
 
 PROMPT_PATH = os.path.join(os.path.dirname(__file__), "prompts.yaml")
 
+# A version is either a plain user-message template (v1, v2: sent after the app's default
+# system prompt) or a mapping {system, user[, format]} whose system message is fixed text
+# (v3, v4). `format: json` versions must answer as AnswerV2 JSON.
+
 def load_prompts():
     with open(PROMPT_PATH, "r", encoding="utf-8") as f:
         return yaml.safe_load(f)
 
 _PROMPTS = load_prompts()
 
+def versions() -> List[str]:
+    return list(_PROMPTS)
+
+def _tmpl(version: str):
+    return _PROMPTS.get(version) or _PROMPTS["v1"]
+
 def get_prompt(version: str, q: str, ctx: str) -> str:
-    tmpl = _PROMPTS.get(version) or _PROMPTS["v1"]
+    """The user message."""
+    tmpl = _tmpl(version)
+    if isinstance(tmpl, dict):
+        tmpl = tmpl["user"]
     return tmpl.format(q=q, ctx=ctx)
+
+def get_system(version: str, default: str) -> str:
+    tmpl = _tmpl(version)
+    return tmpl["system"] if isinstance(tmpl, dict) else default
+
+def is_json(version: str) -> bool:
+    tmpl = _tmpl(version)
+    return version == "v2" or (isinstance(tmpl, dict) and tmpl.get("format") == "json")
+
+def _serialize(system: str, user: str) -> str:
+    # the order a chat template lays the messages out in; only used to measure/compare prefixes
+    return f"system\x00{system}\x00user\x00{user}"
+
+_MARK = "\x01"
+
+def static_prefix(version: str, default_system: str) -> str:
+    """Everything a request of `version` sends before its first variable ({ctx} or {q})."""
+    user = get_prompt(version, _MARK, _MARK)
+    return _serialize(get_system(version, default_system), user[:user.index(_MARK)])
+
+def prefix_digest(version: str, default_system: str, prompt: str) -> Optional[str]:
+    """Hash of the leading static_prefix-length bytes of an actual request. Every request of a
+    version must report the same digest; a different one means the prefix is not reusable."""
+    n = len(static_prefix(version, default_system))
+    sent = _serialize(get_system(version, default_system), prompt)
+    return hashlib.sha256(sent[:n].encode("utf-8")).hexdigest()[:16]
+
+def check_prefix(version: str, default_system: str) -> dict:
+    """Render two unrelated requests and compare them byte for byte. `ok` when their common
+    prefix covers the whole static part; `static_share` is that part's share of the template."""
+    a = _serialize(get_system(version, default_system), get_prompt(version, "alpha?", "ctx one"))
+    b = _serialize(get_system(version, default_system), get_prompt(version, "omega!", "other text"))
+    common = next((i for i, (x, y) in enumerate(zip(a, b)) if x != y), min(len(a), len(b)))
+    static = static_prefix(version, default_system)
+    total = len(_serialize(get_system(version, default_system), get_prompt(version, "", "")))  # all fixed text
+    return {"version": version, "ok": common >= len(static), "static_chars": len(static),
+            "template_chars": total, "static_share": round(len(static) / total, 3),
+            "digest": prefix_digest(version, default_system, get_prompt(version, "alpha?", "ctx one"))}
@@ -0,0 +1,112 @@
+from __future__ import annotations
+import queue, threading, time
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Sequence, Tuple
+
+Pair = Tuple[str, str]
+
+def as_score_list(scores) -> List[float]:
+    # FlagReranker.compute_score returns a bare float for a single pair
+    if hasattr(scores, "tolist"):
+        scores = scores.tolist()
+    if isinstance(scores, (list, tuple)):
+        return [float(s) for s in scores]
+    return [float(scores)]
+
+class _Req:
+    __slots__ = ("pairs", "future", "t_enq")
+
+    def __init__(self, pairs: List[Pair]):
+        self.pairs, self.future, self.t_enq = pairs, Future(), time.monotonic()
+
+class RerankBatcher:
+    """Cross-request micro-batching for a cross-encoder.
+
+    Callers block in `score(pairs)`; a single worker thread collects pending
+    requests until `max_batch` pairs are queued or the oldest one has waited
+    `max_wait_ms`, runs one `score_fn` call over all of them and hands each
+    caller its own slice. `on_batch(pairs, fill_ratio, waits_s)` is called
+    after every forward pass. `submit()` is the fire-and-forget variant for
+    work that must not hold up the caller (e.g. post-response NLI scoring).
+    """
+
+    def __init__(self, score_fn: Callable[[List[Pair]], Sequence[float]], max_batch: int = 32,
+                 max_wait_ms: float = 5.0, on_batch: Optional[Callable[[int, float, List[float]], None]] = None,
+                 name: str = "rerank-batcher"):
+        self.score_fn, self.max_batch, self.max_wait_s = score_fn, max_batch, max_wait_ms / 1000.0
+        self.on_batch = on_batch
+        self._q: "queue.Queue[Optional[_Req]]" = queue.Queue()
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def depth(self) -> int:
+        """Pairs queued but not yet in a forward pass."""
+        return self._pending
+
+    def submit(self, pairs: Sequence[Pair]) -> Future:
+        req = _Req(list(pairs))
+        if not req.pairs:
+            req.future.set_result([])
+            return req.future
+        with self._lock:
+            self._pending += len(req.pairs)
+        self._q.put(req)
+        return req.future
+
+    def score(self, pairs: Sequence[Pair], timeout: Optional[float] = None) -> List[float]:
+        return self.submit(pairs).result(timeout)
+
+    def close(self) -> None:
+        self._q.put(None)
+        self._thread.join(timeout=5)
+
+    def _run(self) -> None:
+        carry: Optional[_Req] = None
+        while True:
+            first = carry or self._q.get()
+            carry = None
+            if first is None:
+                return
+            batch, n = [first], len(first.pairs)
+            deadline = first.t_enq + self.max_wait_s
+            stop = False
+            while n < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    # past the deadline, still drain whatever queued up during the last pass
+                    nxt = self._q.get(timeout=remaining) if remaining > 0 else self._q.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    stop = True
+                    break
+                if n + len(nxt.pairs) > self.max_batch:
+                    carry = nxt
+                    break
+                batch.append(nxt)
+                n += len(nxt.pairs)
+            self._flush(batch, n)
+            if stop:
+                return
+
+    def _flush(self, batch: List[_Req], n: int) -> None:
+        started = time.monotonic()
+        with self._lock:
+            self._pending -= n
+        try:
+            scores = as_score_list(self.score_fn([p for r in batch for p in r.pairs]))
+        except Exception as e:
+            for r in batch:
+                r.future.set_exception(e)
+            return
+        i = 0
+        for r in batch:
+            r.future.set_result(scores[i:i + len(r.pairs)])
+            i += len(r.pairs)
+        if self.on_batch:
+            try:
+                self.on_batch(n, min(1.0, n / self.max_batch), [started - r.t_enq for r in batch])
+            except Exception:
+                pass
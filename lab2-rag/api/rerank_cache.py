@@ -0,0 +1,96 @@
+from __future__ import annotations
+import hashlib, os, sqlite3, threading, time
+from typing import Dict, Iterable, Optional
+
+from .cache import TTLCache, normalize_query
+
+def _h(text: str) -> str:
+    return hashlib.sha1((text or "").encode("utf-8")).hexdigest()
+
+class RerankScoreCache:
+    """Cross-encoder score cache: in-memory LRU tier plus an optional SQLite tier that survives restarts.
+
+    Keys cover the normalized query, chunk id, chunk content hash and model, so an
+    edited chunk or a different RERANK_MODEL never reuses a stale score.
+
+    The SQLite tier is bounded: rows carry a last-used time, rows older than
+    `disk_ttl_s` (0 = no age limit) are deleted, and past `disk_max_rows` the
+    least recently used rows go. Pruning runs on open and every few thousand writes.
+    """
+
+    def __init__(self, model: str, maxsize: int = 50000, path: Optional[str] = None,
+                 disk_max_rows: int = 500000, disk_ttl_s: float = 0.0):
+        self.model = model
+        self.mem = TTLCache(maxsize=maxsize, ttl_s=0)
+        self.disk_max_rows, self.disk_ttl_s = disk_max_rows, disk_ttl_s
+        self._prune_every = max(1000, disk_max_rows // 20)
+        self._writes = 0
+        self._db = None
+        self._lock = threading.Lock()
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS scores (k TEXT PRIMARY KEY, s REAL NOT NULL, t REAL NOT NULL DEFAULT 0)")
+            if "t" not in {row[1] for row in self._db.execute("PRAGMA table_info(scores)")}:  # files from before pruning
+                self._db.execute("ALTER TABLE scores ADD COLUMN t REAL NOT NULL DEFAULT 0")
+            self._db.execute("CREATE INDEX IF NOT EXISTS scores_t ON scores (t)")
+            self.prune()
+
+    def prune(self) -> int:
+        """Apply the disk tier's age and row limits; returns the number of rows deleted."""
+        if self._db is None:
+            return 0
+        with self._lock:
+            deleted = 0
+            if self.disk_ttl_s > 0:
+                deleted += self._db.execute("DELETE FROM scores WHERE t < ?", (time.time() - self.disk_ttl_s,)).rowcount
+            if self.disk_max_rows > 0:
+                over = self._db.execute("SELECT COUNT(*) FROM scores").fetchone()[0] - self.disk_max_rows
+                if over > 0:
+                    deleted += self._db.execute(
+                        "DELETE FROM scores WHERE k IN (SELECT k FROM scores ORDER BY t LIMIT ?)", (over,)).rowcount
+            self._writes = 0
+        return deleted
+
+    def key(self, query: str, chunk_id: Optional[str], text: str) -> str:
+        raw = "\x1f".join([_h(normalize_query(query)), str(chunk_id), _h(text), self.model])
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, float]:
+        found: Dict[str, float] = {}
+        missing = []
+        for k in keys:
+            v = self.mem.get(k)
+            if v is None:
+                missing.append(k)
+            else:
+                found[k] = v
+        if missing and self._db is not None:
+            with self._lock:
+                marks = ",".join("?" * len(missing))
+                rows = self._db.execute(f"SELECT k, s FROM scores WHERE k IN ({marks})", missing).fetchall()
+                if rows:
+                    self._db.execute(f"UPDATE scores SET t = ? WHERE k IN ({','.join('?' * len(rows))})",
+                                     [time.time(), *(k for k, _ in rows)])
+            for k, v in rows:
+                found[k] = float(v)
+                self.mem.put(k, float(v))
+        return found
+
+    def put_many(self, scores: Dict[str, float]) -> None:
+        if not scores:
+            return
+        for k, v in scores.items():
+            self.mem.put(k, float(v))
+        if self._db is not None:
+            now = time.time()
+            with self._lock:
+                self._db.execute("BEGIN")
+                self._db.executemany("INSERT OR REPLACE INTO scores (k, s, t) VALUES (?, ?, ?)",
+                                     [(k, float(v), now) for k, v in scores.items()])
+                self._db.execute("COMMIT")
+                self._writes += len(scores)
+                due = self._writes >= self._prune_every
+            if due:
+                self.prune()
@@ -0,0 +1,56 @@
+from __future__ import annotations
+import json
+
+def sse(event: str, data) -> str:
+    """One server-sent event frame."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+class V2StreamValidator:
+    """Incremental structural check of a streamed v2 (JSON object) answer.
+
+    `feed` returns False as soon as the text seen so far can no longer be the
+    prefix of a single JSON object (wrong first character, unbalanced or
+    mismatched closer, trailing text after the object). Field-level validation still happens on
+    the full text with AnswerV2 once the stream ends.
+    """
+
+    def __init__(self):
+        self.ok = True
+        self.pos = 0
+        self.stack = []  # open "{" / "[" not yet closed
+        self.started = False
+        self.closed = False
+        self.in_str = False
+        self.esc = False
+
+    @property
+    def complete(self) -> bool:
+        return self.ok and self.closed
+
+    def feed(self, chunk: str) -> bool:
+        if not self.ok:
+            return False
+        for ch in chunk:
+            self.pos += 1
+            if self.in_str:
+                if self.esc: self.esc = False
+                elif ch == "\\": self.esc = True
+                elif ch == '"': self.in_str = False
+                continue
+            if ch.isspace():
+                continue
+            if self.closed or (not self.started and ch != "{"):
+                self.ok = False
+                return False
+            if ch == '"':
+                self.in_str = True
+            elif ch in "{[":
+                self.started = True
+                self.stack.append(ch)
+            elif ch in "}]":
+                if not self.stack or self.stack.pop() != ("{" if ch == "}" else "["):
+                    self.ok = False
+                    return False
+                if not self.stack:
+                    self.closed = True
+        return True
@@ -0,0 +1,82 @@
+from __future__ import annotations
+import threading, time
+from typing import Any, Callable, Dict, List, Optional
+
+class Warmup:
+    """Background initialization of slow dependencies (Chroma client, reranker, NLI model).
+
+    Each component loads in its own daemon thread so a multi-second model load
+    never delays the app object or the Chroma connection; callers check `get()`
+    (non-blocking) or `wait()` (blocking, for hard dependencies).
+    """
+
+    def __init__(self, t0: Optional[float] = None, on_done: Optional[Callable[[float], None]] = None):
+        self.t0 = t0 if t0 is not None else time.monotonic()
+        self.on_done = on_done
+        self.ready_after_s: Optional[float] = None
+        self._loaders: Dict[str, Callable[[], Any]] = {}
+        self._state: Dict[str, dict] = {}
+        self._events: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, loader: Callable[[], Any]) -> None:
+        self._loaders[name] = loader
+        self._state[name] = {"ready": False, "load_s": None, "error": None, "value": None}
+        self._events[name] = threading.Event()
+
+    def start(self, block: bool = False) -> None:
+        threads = [threading.Thread(target=self._load, args=(n,), name=f"warmup-{n}", daemon=True)
+                   for n in self._loaders]
+        for t in threads: t.start()
+        if block:
+            for t in threads: t.join()
+
+    def _load(self, name: str) -> None:
+        t = time.monotonic()
+        st = self._state[name]
+        try:
+            st["value"] = self._loaders[name]()
+            st["ready"] = True
+        except Exception as e:
+            st["error"] = str(e)
+        st["load_s"] = round(time.monotonic() - t, 3)
+        self._events[name].set()
+        with self._lock:
+            if self.ready_after_s is None and all(e.is_set() for e in self._events.values()):
+                self.ready_after_s = round(time.monotonic() - self.t0, 3)
+                done = True
+            else:
+                done = False
+        if done and self.on_done:
+            self.on_done(self.ready_after_s)
+
+    def is_ready(self, name: str) -> bool:
+        return bool(self._state.get(name, {}).get("ready"))
+
+    def pending(self, name: str) -> bool:
+        """True while a registered component is still loading (neither ready nor failed)."""
+        ev = self._events.get(name)
+        return ev is not None and not ev.is_set()
+
+    def get(self, name: str) -> Any:
+        st = self._state.get(name)
+        return st["value"] if st and st["ready"] else None
+
+    def wait(self, name: str, timeout: Optional[float] = None) -> Any:
+        ev = self._events.get(name)
+        if ev is None or not ev.wait(timeout):
+            raise RuntimeError(f"{name} not ready")
+        st = self._state[name]
+        if not st["ready"]:
+            raise RuntimeError(f"{name} failed to load: {st['error']}")
+        return st["value"]
+
+    def status(self, required: List[str]) -> dict:
+        comps = {n: {k: v for k, v in st.items() if k != "value"} for n, st in self._state.items()}
+        return {
+            "ready": all(self.is_ready(n) for n in required if n in self._state),
+            "required": required,
+            "components": comps,
+            "uptime_s": round(time.monotonic() - self.t0, 3),
+            "import_to_ready_s": self.ready_after_s,
+        }
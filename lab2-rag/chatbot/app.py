@@ -1,5 +1,5 @@
 import os, requests
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from dotenv import load_dotenv
 from observability.dd import enable_llmobs_if_configured, enable_tracing_if_configured, span
 SERVICE = "chatbot"
@@ -38,6 +38,18 @@ def chat():
     r = requests.post(f"{API_URL}/ask", json={"question":q}, timeout=120)
     return jsonify(r.json()), r.status_code
 
+@app.post("/chat/stream")
+def chat_stream():
+    data = request.get_json(silent=True) or {}
+    q = (data.get("message") or "").strip()
+    if not q:
+        return jsonify({"error":"message is required"}), 400
+    r = requests.post(f"{API_URL}/ask/stream", json={"question":q}, stream=True, timeout=(5, 120))
+    if not r.ok:
+        return Response(r.content, r.status_code, content_type=r.headers.get("Content-Type"))
+    return Response(stream_with_context(r.iter_content(chunk_size=None)), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.get("/")
 def health():
     return {"ok": True, "api_url": API_URL}
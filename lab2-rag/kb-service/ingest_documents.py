@@ -1,4 +1,5 @@
-import os, requests
+import os, argparse, requests
+import numpy as np
 from dotenv import load_dotenv
 from observability.dd import (
     enable_llmobs_if_configured, enable_tracing_if_configured, span, jlog
@@ -7,9 +8,6 @@ SERVICE = "kb_service"
 enable_llmobs_if_configured(SERVICE)
 enable_tracing_if_configured(SERVICE)
 
-with span("rag.embed", count=len(texts), index=INDEX_NAME):
-    vectors = embed(texts)
-jlog(event="kb.ingested", count=len(ids), index=INDEX_NAME)
 load_dotenv()
 
 # --- Datadog LLMObs (옵션) ---
@@ -26,34 +24,146 @@ if os.getenv("DD_LLMOBS_ENABLED","0") == "1":
     except Exception as e:
         print(f"[DD] LLMObs not active: {e}")
 
-from utils import load_md_docs
+from utils import md_paths
+from pipeline import Checkpoint, run_pipeline
+from retrieval.bm25 import BM25Index
+from retrieval import embed_wire
+from retrieval.kb_sync import Manifest, SyncPlan
+from retrieval.kb_version import bump_kb_version
 from chromadb import HttpClient
 from chromadb.utils import embedding_functions
 
 CHROMA_URL = os.getenv("CHROMA_URL","http://vector-store:8000")
 INDEX_NAME = os.getenv("INDEX_NAME","kb_demo")
 EMBEDDER_URL = os.getenv("EMBEDDER_URL","http://text-embedder:5001")
+BM25_PATH = os.getenv("BM25_PATH", f"./data/bm25_{INDEX_NAME}.json")
+EMBED_WIRE = os.getenv("EMBED_WIRE","float32")  # json | float32 | float16 | int8
+EMBED_TIMEOUT_S = float(os.getenv("EMBED_TIMEOUT_S","60"))
+KB_DOCS_PATH = os.getenv("KB_DOCS_PATH","/kb_data/docs")
+CHECKPOINT_PATH = os.getenv("INGEST_CHECKPOINT", f"./data/ingest_{INDEX_NAME}.ckpt")
+MANIFEST_PATH = os.getenv("KB_MANIFEST", f"./data/manifest_{INDEX_NAME}.json")
+# streaming pipeline: texts per /embed call, rows per Chroma upsert, parallel /embed calls,
+# batches buffered between stages (bounds memory), attempts per failed call
+INGEST_EMBED_BATCH = int(os.getenv("INGEST_EMBED_BATCH","32"))
+INGEST_UPSERT_BATCH = int(os.getenv("INGEST_UPSERT_BATCH","256"))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS","4"))
+INGEST_QUEUE = int(os.getenv("INGEST_QUEUE","8"))
+INGEST_RETRIES = int(os.getenv("INGEST_RETRIES","4"))
+# chunking: token window/overlap per chunk, tokenizer used to count them ("regex" = no download),
+# processes chunking files in parallel
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS","200"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP","32"))
+CHUNK_TOKENIZER = os.getenv("CHUNK_TOKENIZER", os.getenv("EMBED_MODEL","sentence-transformers/all-MiniLM-L6-v2"))
+CHUNK_PROCESSES = int(os.getenv("CHUNK_PROCESSES", str(min(4, os.cpu_count() or 1))))
 
 def embed(texts):
-    r = requests.post(f"{EMBEDDER_URL}/embed", json={"texts": texts}, timeout=60)
+    """(n, dim) float array. Binary formats are decoded in place (no per-float parsing);
+    an embedder that only speaks JSON still works, its reply is detected by Content-Type."""
+    headers = {"Accept": embed_wire.content_type(EMBED_WIRE)} if EMBED_WIRE != "json" else {}
+    r = requests.post(f"{EMBEDDER_URL}/embed", json={"texts": texts}, headers=headers, timeout=EMBED_TIMEOUT_S)
     r.raise_for_status()
-    return r.json()["embeddings"]
+    if r.headers.get("Content-Type", "").startswith(embed_wire.MEDIA_TYPE):
+        return embed_wire.decode(r.content)
+    return np.asarray(r.json()["embeddings"], dtype=np.float32)
+
+def _batches(items, n):
+    for i in range(0, len(items), n):
+        yield items[i:i + n]
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Sync markdown docs into the KB collection: only new or changed "
+                                             "chunks are embedded, chunks of removed files are deleted (resumable).")
+    ap.add_argument("--path", default=KB_DOCS_PATH)
+    ap.add_argument("--full", action="store_true", help="re-embed every chunk, not just new or changed ones")
+    ap.add_argument("--batch-size", type=int, default=INGEST_EMBED_BATCH)
+    ap.add_argument("--upsert-batch", type=int, default=INGEST_UPSERT_BATCH)
+    ap.add_argument("--workers", type=int, default=INGEST_WORKERS)
+    ap.add_argument("--queue", type=int, default=INGEST_QUEUE)
+    ap.add_argument("--retries", type=int, default=INGEST_RETRIES)
+    ap.add_argument("--chunk-tokens", type=int, default=CHUNK_TOKENS)
+    ap.add_argument("--chunk-overlap", type=int, default=CHUNK_OVERLAP)
+    ap.add_argument("--processes", type=int, default=CHUNK_PROCESSES)
+    ap.add_argument("--fresh", action="store_true", help="ignore an existing checkpoint and re-ingest everything")
+    args = ap.parse_args(argv)
 
-def main():
     client = HttpClient(host=CHROMA_URL.split("://")[1].split(":")[0], port=8000)
     try:
         collection = client.get_collection(INDEX_NAME)
     except Exception:
         collection = client.create_collection(INDEX_NAME)
-    docs = load_md_docs()
-    if not docs:
-        print("No docs to ingest.")
-        return
-    ids = [d["id"] for d in docs]
-    texts = [d["text"] for d in docs]
-    vectors = embed(texts)
-    collection.upsert(documents=texts, ids=ids, embeddings=vectors)
-    print(f"Ingested {len(ids)} documents into collection '{INDEX_NAME}'")
+
+    ckpt = Checkpoint(CHECKPOINT_PATH)
+    if args.fresh:
+        ckpt.clear()
+    elif ckpt.done:
+        jlog(event="kb.ingest.resume", index=INDEX_NAME, already_upserted=len(ckpt.done))
+    manifest = Manifest(MANIFEST_PATH)
+    # the BM25 snapshot is rebuilt in memory (it keeps every text); BM25_PATH="" skips it for
+    # corpora that don't fit. Resumed docs skip embed/upsert but are still indexed here.
+    bm25, full = None, args.full or args.fresh
+    if BM25_PATH:
+        if os.path.exists(BM25_PATH):
+            bm25 = BM25Index.load(BM25_PATH)
+        else:
+            bm25 = BM25Index()
+            full = full or bool(manifest.files)  # unchanged chunks would be missing from the new snapshot
+    paths = md_paths(args.path)
+    if not manifest.files:
+        legacy = [src for _, src in paths]  # whole-file docs from before chunking were keyed by file name
+        if legacy:  # Chroma rejects delete(ids=[]) (empty corpus)
+            collection.delete(ids=legacy)
+        if bm25 is not None:
+            for doc_id in legacy:
+                bm25.remove(doc_id)
+
+    def embed_batch(texts):
+        with span("rag.embed", count=len(texts), index=INDEX_NAME):
+            return embed(texts)
+
+    def upsert(ids, texts, metadatas, vectors):
+        with span("kb.upsert", count=len(ids), index=INDEX_NAME):
+            # rows of the decoded float32 matrices go to Chroma as one (n, dim) array, never as Python floats
+            collection.upsert(ids=ids, documents=texts, metadatas=metadatas,
+                              embeddings=np.asarray(vectors, dtype=np.float32))
+        if bm25 is not None:
+            bm25.upsert_many(zip(ids, texts, metadatas))
+
+    def skip(doc):
+        if bm25 is not None:
+            bm25.upsert(doc["id"], doc["text"], doc.get("metadata"))
+
+    plan = SyncPlan(manifest, paths, args.chunk_tokens, args.chunk_overlap, CHUNK_TOKENIZER,
+                    processes=args.processes, force=full,
+                    exists=lambda ids: collection.get(ids=list(ids), include=[])["ids"])
+    stats = run_pipeline(plan.changes(), embed_batch, upsert,
+                         batch_size=args.batch_size, upsert_batch=args.upsert_batch, workers=args.workers,
+                         queue_size=args.queue, retries=args.retries, checkpoint=ckpt, on_skip=skip,
+                         log=lambda **kw: jlog(index=INDEX_NAME, **kw))
+    # kept chunks of changed files: same text and vector, new offsets / heading path
+    for batch in _batches(plan.refresh, args.upsert_batch):
+        collection.update(ids=[c["id"] for c in batch], metadatas=[c["metadata"] for c in batch])
+        if bm25 is not None:
+            bm25.upsert_many((c["id"], c["text"], c["metadata"]) for c in batch)
+    for ids in _batches(plan.deletes, args.upsert_batch):
+        with span("kb.delete", count=len(ids), index=INDEX_NAME):
+            collection.delete(ids=ids)
+        if bm25 is not None:
+            for doc_id in ids:
+                bm25.remove(doc_id)
+    plan.commit()
+    ckpt.clear()  # complete: the next run starts over
+
+    version = None
+    if plan.changed:
+        if bm25 is not None:
+            bm25.save(BM25_PATH)
+            print(f"BM25 index: {len(bm25)} documents -> {BM25_PATH}")
+        version = bump_kb_version(collection)
+    jlog(event="kb.synced", index=INDEX_NAME, kb_version=version, full=full, **plan.counts, **stats)
+    c = plan.counts
+    print(f"Synced '{INDEX_NAME}': {c['added']} added, {c['updated']} updated, {c['deleted']} deleted, "
+          f"{c['skipped']} skipped ({c['files_read']} files read"
+          + (f", kb_version={version})" if version else ", unchanged)"))
 
 if __name__ == "__main__":
     main()
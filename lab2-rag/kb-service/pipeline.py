@@ -0,0 +1,190 @@
+from __future__ import annotations
+import json, os, queue, random, threading, time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+# Streaming ingestion: read -> embed -> upsert.
+#
+#   docs (generator) --[embed_q, bounded]--> N embed workers --[upsert_q, bounded]--> 1 upserter
+#
+# At most (queue_size + workers) embed batches plus one upsert batch are in
+# flight, so memory is bounded by the batch sizes, not by the corpus. Each
+# upsert is followed by a checkpoint append; a rerun skips every id already in
+# the checkpoint (those docs are still passed to `on_skip`, e.g. for BM25).
+
+Doc = Dict  # {"id": str, "text": str, "metadata": dict | None}
+
+class Checkpoint:
+    """Append-only list of upserted ids (one per line, fsync'd per batch)."""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.done = set()
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.done = {line.rstrip("\n") for line in f if line.strip()}
+
+    def add(self, ids: Sequence[str]) -> None:
+        self.done.update(ids)
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("".join(f"{i}\n" for i in ids))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def clear(self) -> None:
+        self.done = set()
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+class StageStats:
+    def __init__(self, name: str):
+        self.name, self.items, self.busy_s = name, 0, 0.0
+        self._lock = threading.Lock()
+
+    def add(self, items: int, seconds: float) -> None:
+        with self._lock:
+            self.items += items
+            self.busy_s += seconds
+
+    def report(self, wall_s: float) -> dict:
+        return {"items": self.items, "busy_s": round(self.busy_s, 3),
+                "items_per_s": round(self.items / wall_s, 1) if wall_s else 0.0,
+                "items_per_busy_s": round(self.items / self.busy_s, 1) if self.busy_s else 0.0}
+
+def with_retry(fn: Callable, retries: int = 4, base_delay_s: float = 0.5, max_delay_s: float = 15.0,
+               on_retry: Optional[Callable[[int, Exception], None]] = None):
+    """Call fn(); on failure back off exponentially (with jitter) up to `retries` extra attempts."""
+    for attempt in range(retries + 1):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == retries:
+                raise
+            if on_retry:
+                on_retry(attempt + 1, e)
+            time.sleep(min(max_delay_s, base_delay_s * 2 ** attempt) * (0.5 + random.random()))
+
+def run_pipeline(docs: Iterable[Doc], embed_fn: Callable[[List[str]], Sequence],
+                 upsert_fn: Callable[[List[str], List[str], List[Optional[dict]], Sequence], None],
+                 batch_size: int = 32, upsert_batch: int = 256, workers: int = 4, queue_size: int = 8,
+                 retries: int = 4, checkpoint: Optional[Checkpoint] = None,
+                 on_skip: Optional[Callable[[Doc], None]] = None,
+                 log: Callable[..., None] = lambda **kw: print(json.dumps(kw, ensure_ascii=False)),
+                 progress_every_s: float = 10.0) -> dict:
+    """Run the pipeline to completion; returns per-stage throughput. The first stage error stops
+    every stage and is re-raised here (everything upserted before it is checkpointed)."""
+    ckpt = checkpoint or Checkpoint(None)
+    stats = {n: StageStats(n) for n in ("read", "embed", "upsert")}
+    skipped = 0
+    embed_q: "queue.Queue[Optional[list]]" = queue.Queue(maxsize=queue_size)
+    upsert_q: "queue.Queue[Optional[tuple]]" = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors: List[BaseException] = []
+
+    def fail(e: BaseException):
+        errors.append(e)
+        stop.set()
+
+    def put(q: queue.Queue, item) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def embed_worker():
+        while True:
+            batch = embed_q.get()
+            if batch is None:
+                upsert_q.put(None)  # the upserter drains until it has one of these per worker
+                return
+            if stop.is_set():
+                continue
+            t0 = time.monotonic()
+            try:
+                texts = [d["text"] for d in batch]
+                vecs = with_retry(lambda: embed_fn(texts), retries=retries,
+                                  on_retry=lambda n, e: log(event="ingest.embed.retry", attempt=n, error=str(e)))
+            except Exception as e:
+                fail(e)
+                continue
+            stats["embed"].add(len(batch), time.monotonic() - t0)
+            upsert_q.put((batch, vecs))
+
+    def flush(rows: list):
+        t0 = time.monotonic()
+        ids = [d["id"] for d, _ in rows]
+        with_retry(lambda: upsert_fn(ids, [d["text"] for d, _ in rows], [d.get("metadata") for d, _ in rows],
+                                     [v for _, v in rows]), retries=retries,
+                   on_retry=lambda n, e: log(event="ingest.upsert.retry", attempt=n, error=str(e)))
+        ckpt.add(ids)
+        stats["upsert"].add(len(rows), time.monotonic() - t0)
+
+    def upserter():
+        # keeps writing (and checkpointing) whatever was embedded before another stage failed;
+        # only its own failure makes it discard the rest
+        rows, finished, failed = [], 0, False
+        while finished < workers:
+            item = upsert_q.get()
+            if item is None:
+                finished += 1
+                continue
+            if failed:
+                continue
+            batch, vecs = item
+            rows.extend(zip(batch, vecs))
+            try:
+                while len(rows) >= upsert_batch:
+                    flush(rows[:upsert_batch])
+                    rows = rows[upsert_batch:]
+            except Exception as e:
+                failed = True
+                fail(e)
+        if rows and not failed:
+            try:
+                flush(rows)
+            except Exception as e:
+                fail(e)
+
+    threads = [threading.Thread(target=embed_worker, name=f"ingest-embed-{i}", daemon=True) for i in range(workers)]
+    threads.append(threading.Thread(target=upserter, name="ingest-upsert", daemon=True))
+    for t in threads:
+        t.start()
+
+    t_start = last_log = time.monotonic()
+    it = iter(docs)
+    try:
+        while not stop.is_set():
+            t0 = time.monotonic()
+            batch = []
+            for d in it:
+                if d["id"] in ckpt.done:
+                    skipped += 1
+                    if on_skip:
+                        on_skip(d)
+                    continue
+                batch.append(d)
+                if len(batch) >= batch_size:
+                    break
+            stats["read"].add(len(batch), time.monotonic() - t0)
+            if not batch or not put(embed_q, batch):
+                break
+            if time.monotonic() - last_log >= progress_every_s:
+                last_log = time.monotonic()
+                log(event="ingest.progress", skipped=skipped, queued_embed=embed_q.qsize(),
+                    queued_upsert=upsert_q.qsize(), **{n: s.items for n, s in stats.items()})
+    except Exception as e:
+        fail(e)
+    for _ in range(workers):
+        embed_q.put(None)  # workers drain (or discard, once stopped) everything ahead of these
+    for t in threads:
+        t.join()
+    if errors:
+        raise errors[0]
+    wall = time.monotonic() - t_start
+    return {"wall_s": round(wall, 3), "skipped": skipped,
+            "stages": {n: s.report(wall) for n, s in stats.items()}}
@@ -1,9 +1,12 @@
 import os, glob
 
+def md_paths(path="/kb_data/docs"):
+    # (file path, source id) pairs; the source id (file name) prefixes every chunk id
+    return [(f, os.path.basename(f)) for f in sorted(glob.glob(os.path.join(path, "*.md")))]
+
 def load_md_docs(path="/kb_data/docs"):
-    files = sorted(glob.glob(os.path.join(path, "*.md")))
     docs = []
-    for f in files:
+    for f, name in md_paths(path):
         with open(f, "r", encoding="utf-8") as fh:
-            docs.append({"id": os.path.basename(f), "text": fh.read()})
+            docs.append({"id": name, "text": fh.read()})
     return docs
@@ -1,4 +1,4 @@
-import os, requests, streamlit as st
+import os, json, requests, streamlit as st
 from observability.dd import enable_tracing_if_configured, enable_otel_if_configured, span
 
 SERVICE="streamlit-ui"
@@ -15,15 +15,28 @@ if st.button("Ask"):
     if not q.strip():
         st.warning("what ever u want what... it is... tellme pls.")
     else:
-        with st.spinner(" gomin gomin ..."):
-            with span("ui.ask", ui="streamlit"):
-                r = requests.post(f"{API_URL}/ask", json={"question": q}, timeout=120)
-            if not r.ok:
-                st.error(f"API error: {r.status_code}\n{r.text}")
-            else:
-                j = r.json()
-                st.success(f"Sources={j.get('source_count',0)}")
-                st.markdown(j.get("answer",""))
+        final = {}
+        def tokens():
+            # /ask/stream: `token` events while generating, then `done` with sources/support/cost
+            with requests.post(f"{API_URL}/ask/stream", json={"question": q}, stream=True, timeout=(5, 120)) as r:
+                if not r.ok:
+                    final["error"] = f"API error: {r.status_code}\n{r.text}"
+                    return
+                event = None
+                for line in r.iter_lines(decode_unicode=True):
+                    if line.startswith("event: "):
+                        event = line[7:]
+                    elif line.startswith("data: "):
+                        data = json.loads(line[6:])
+                        if event == "token": yield data["t"]
+                        elif event == "done": final.update(data)
+                        elif event == "error": final["error"] = f"API error: {data}"
+        with span("ui.ask", ui="streamlit"):
+            st.write_stream(tokens())
+        if "error" in final:
+            st.error(final["error"])
+        elif final:
+            st.success(f"Sources={len(final.get('sources',[]))}  support={final.get('support')}  cost=${final.get('estimated_cost_usd')}")
 
 @app.get("/healthz")
 def healthz():
@@ -1,10 +1,75 @@
 import os
-from flask import Flask, request, jsonify
+import numpy as np
+from flask import Flask, Response, request, jsonify
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
 from sentence_transformers import SentenceTransformer
 
+from batcher import EncodeQueue
+from embed_cache import EmbeddingCache
+from retrieval import embed_wire  # repo-root package: build the image from the repo root (see Dockerfile)
+
 MODEL_NAME = os.getenv("EMBED_MODEL","sentence-transformers/all-MiniLM-L6-v2")
+EMBED_SCHEDULER   = os.getenv("EMBED_SCHEDULER","batch")  # batch (cross-request dynamic batching) | direct
+EMBED_MAX_BATCH   = int(os.getenv("EMBED_MAX_BATCH","64"))
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS","5"))
+EMBED_BUCKETS     = [int(b) for b in os.getenv("EMBED_BUCKETS","64,256,1024").split(",") if b]  # text length (chars)
+EMBED_CACHE_SIZE  = int(os.getenv("EMBED_CACHE_SIZE","100000"))  # in-memory entries; 0 = cache disabled
+EMBED_CACHE_DIR   = os.getenv("EMBED_CACHE_DIR","")  # e.g. /cache (shared volume) for the persistent mmap tier
 _model = SentenceTransformer(MODEL_NAME)
 
+QUEUE_DEPTH = Gauge("embed_queue_texts", "Texts waiting for a forward pass")
+BATCH_SIZE  = Histogram("embed_batch_size", "Texts per forward pass", ["bucket"],
+                        buckets=[1, 2, 4, 8, 16, 32, 64, 128, 256])
+BATCH_LAT   = Histogram("embed_batch_latency_seconds", "Forward pass latency (s)", ["bucket"],
+                        buckets=[0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5])
+
+CACHE_REQ   = Counter("embed_cache_requests_total", "Embedding cache lookups per text", ["result"])
+CACHE_SAVED = Counter("embed_cache_saved_bytes_total", "Embedding bytes served from cache instead of encode()")
+
+def _encode(texts):
+    return _model.encode(texts, batch_size=max(len(texts), 1), normalize_embeddings=True, convert_to_numpy=True)
+
+def _observe_batch(bucket, size, seconds):
+    BATCH_SIZE.labels(bucket=bucket).observe(size)
+    BATCH_LAT.labels(bucket=bucket).observe(seconds)
+
+encode_queue = None
+if EMBED_SCHEDULER == "batch":
+    encode_queue = EncodeQueue(_encode, max_batch=EMBED_MAX_BATCH, max_wait_ms=EMBED_MAX_WAIT_MS,
+                                  buckets=EMBED_BUCKETS, on_batch=_observe_batch)
+    QUEUE_DEPTH.set_function(encode_queue.depth)
+
+cache = None
+if EMBED_CACHE_SIZE > 0:
+    cache = EmbeddingCache(MODEL_NAME, _model.get_sentence_embedding_dimension(), maxsize=EMBED_CACHE_SIZE,
+                           directory=EMBED_CACHE_DIR or None)
+    Gauge("embed_cache_hit_ratio", "Cache hits / lookups since start").set_function(
+        lambda: cache.stats()["hit_ratio"])
+
+def encode(texts):
+    return encode_queue.encode(texts) if encode_queue is not None else _encode(texts)
+
+def encode_cached(texts):
+    """Only texts without a cached vector (deduplicated) reach the model."""
+    if cache is None:
+        return encode(texts)
+    keys = [cache.key(t) for t in texts]
+    found = cache.get_many(keys)
+    todo = {}
+    for k, t in zip(keys, texts):
+        if k not in found:
+            todo.setdefault(k, t)
+    if todo:
+        fresh = dict(zip(todo, encode(list(todo.values()))))
+        cache.put_many(fresh)
+        found.update(fresh)
+    hits = len(texts) - len(todo)
+    cache.record(hits, len(todo))
+    CACHE_REQ.labels(result="hit").inc(hits)
+    CACHE_REQ.labels(result="miss").inc(len(todo))
+    CACHE_SAVED.inc(hits * cache.vector_bytes)
+    return np.stack([found[k] for k in keys])
+
 app = Flask(__name__)
 
 @app.post("/embed")
@@ -13,12 +78,24 @@ def embed():
     texts = data.get("texts") or []
     if not isinstance(texts, list) or not texts:
         return jsonify({"error":"texts(list) required"}), 400
-    vectors = _model.encode(texts, normalize_embeddings=True).tolist()
-    return jsonify({"embeddings": vectors})
-
-if __name__ == "__main__":
-    app.run(host=os.getenv("HOST","0.0.0.0"), port=int(os.getenv("PORT","5001")))
+    vectors = encode_cached(texts)
+    # Accept: application/x-embeddings; dtype=float32|float16|int8 -> raw buffer with a shape/dtype header
+    dtype = embed_wire.negotiate(request.headers.get("Accept"))
+    if dtype:
+        return Response(embed_wire.encode(vectors, dtype), content_type=embed_wire.content_type(dtype))
+    return jsonify({"embeddings": vectors.tolist()})
 
 @app.get("/healthz")
 def healthz():
     return {"ok": True}, 200
+
+@app.get("/cache/stats")
+def cache_stats():
+    return (cache.stats() if cache is not None else {"enabled": False}), 200
+
+@app.get("/metrics")
+def metrics():
+    return generate_latest(), 200, {"Content-Type": CONTENT_TYPE_LATEST}
+
+if __name__ == "__main__":
+    app.run(host=os.getenv("HOST","0.0.0.0"), port=int(os.getenv("PORT","5001")), threaded=True)
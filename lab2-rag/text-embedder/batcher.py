@@ -0,0 +1,125 @@
+from __future__ import annotations
+import threading, time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Deque, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+class _Req:
+    __slots__ = ("out", "left", "future", "t_enq")
+
+    def __init__(self, n: int):
+        self.out: List[Optional[np.ndarray]] = [None] * n
+        self.left, self.future, self.t_enq = n, Future(), time.monotonic()
+
+class EncodeQueue:
+    """Dynamic batching for SentenceTransformer.encode.
+
+    Each text of a request is queued in a length bucket (`buckets` = upper
+    bounds in characters, plus one open-ended bucket), so a forward pass pads
+    short queries against short queries and long chunks against long chunks.
+    A bucket is flushed when it holds `max_batch` texts or its oldest text has
+    waited `max_wait_ms`; one worker thread runs every forward pass. A request
+    may span several buckets and batches, but `encode()` always returns its
+    rows in input order. `on_batch(bucket, size, seconds)` is called after
+    every pass.
+    """
+
+    def __init__(self, encode_fn: Callable[[List[str]], np.ndarray], max_batch: int = 64,
+                 max_wait_ms: float = 5.0, buckets: Sequence[int] = (64, 256, 1024),
+                 on_batch: Optional[Callable[[str, int, float], None]] = None):
+        self.encode_fn, self.max_batch, self.max_wait_s = encode_fn, max_batch, max_wait_ms / 1000.0
+        self.bounds = sorted(buckets)
+        self.labels = [f"<={b}" for b in self.bounds] + [f">{self.bounds[-1]}" if self.bounds else "all"]
+        self.on_batch = on_batch
+        self._pending: List[Deque[Tuple[_Req, int, str]]] = [deque() for _ in self.labels]
+        self._depth = 0
+        self._closed = False
+        self._cv = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="embed-batcher", daemon=True)
+        self._thread.start()
+
+    def depth(self) -> int:
+        """Texts queued but not yet in a forward pass."""
+        return self._depth
+
+    def _bucket(self, text: str) -> int:
+        n = len(text)
+        for i, b in enumerate(self.bounds):
+            if n <= b:
+                return i
+        return len(self.bounds)
+
+    def encode(self, texts: Sequence[str], timeout: Optional[float] = None) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        req = _Req(len(texts))
+        with self._cv:
+            if self._closed:
+                raise RuntimeError("encode queue closed")
+            for i, t in enumerate(texts):
+                self._pending[self._bucket(t)].append((req, i, t))
+            self._depth += len(texts)
+            self._cv.notify()
+        return req.future.result(timeout)
+
+    def close(self) -> None:
+        with self._cv:
+            self._closed = True
+            self._cv.notify()
+        self._thread.join(timeout=5)
+
+    def _next_batch(self) -> Optional[Tuple[int, List[Tuple[_Req, int, str]]]]:
+        """Under the lock: wait for a bucket that is full or past its deadline, then pop it."""
+        while True:
+            now = time.monotonic()
+            ready, wait = None, None
+            for b, q in enumerate(self._pending):
+                if not q:
+                    continue
+                age = now - q[0][0].t_enq
+                if len(q) >= self.max_batch or age >= self.max_wait_s or self._closed:
+                    if ready is None or q[0][0].t_enq < self._pending[ready][0][0].t_enq:
+                        ready = b  # oldest head first, so no bucket starves
+                else:
+                    left = self.max_wait_s - age
+                    wait = left if wait is None else min(wait, left)
+            if ready is not None:
+                q = self._pending[ready]
+                items = [q.popleft() for _ in range(min(self.max_batch, len(q)))]
+                self._depth -= len(items)
+                return ready, items
+            if self._closed:
+                return None
+            self._cv.wait(wait)
+
+    def _run(self) -> None:
+        while True:
+            with self._cv:
+                nxt = self._next_batch()
+            if nxt is None:
+                return
+            self._flush(*nxt)
+
+    def _flush(self, bucket: int, items: List[Tuple[_Req, int, str]]) -> None:
+        t0 = time.monotonic()
+        try:
+            vecs = self.encode_fn([t for _, _, t in items])
+        except Exception as e:
+            for req, _, _ in items:
+                if not req.future.done():
+                    req.future.set_exception(e)
+            return
+        for (req, i, _), v in zip(items, vecs):
+            if req.future.done():  # an earlier batch of this request failed
+                continue
+            req.out[i] = v
+            req.left -= 1
+            if req.left == 0:
+                req.future.set_result(np.stack(req.out))
+        if self.on_batch:
+            try:
+                self.on_batch(self.labels[bucket], len(items), time.monotonic() - t0)
+            except Exception:
+                pass
@@ -0,0 +1,142 @@
+from __future__ import annotations
+import fcntl, hashlib, os, re, threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+_MAGIC = b"EMBC1\0\0\0"
+_HEADER = 16  # magic + uint32 dim + reserved
+
+class EmbeddingCache:
+    """Content-addressed embedding cache: key = blake2b(EMBED_MODEL, text).
+
+    Tier 1 is an in-process LRU. Tier 2 (optional `directory`) is an
+    append-only file of fixed-size records (16-byte key, `dim` float32s),
+    memory-mapped for reads. Appends take an exclusive flock and write whole
+    records in one call, so several embedder replicas on a node can share the
+    file; each process indexes records appended by others the next time it
+    misses. A torn tail (crash mid-append) is ignored and cut by the next append.
+    """
+
+    def __init__(self, model: str, dim: int, maxsize: int = 100000, directory: Optional[str] = None):
+        self.model, self.dim, self.maxsize = model, dim, maxsize
+        self.dtype = np.dtype([("key", "V16"), ("vec", "<f4", (dim,))])
+        self._mem: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._index: Dict[bytes, int] = {}
+        self._rows = 0
+        self._mm = None
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+        self.path = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            safe = re.sub(r"[^A-Za-z0-9_.-]+", "_", model)
+            self.path = os.path.join(directory, f"{safe}.{dim}.f32")
+            self._open()
+
+    @property
+    def vector_bytes(self) -> int:
+        return self.dim * 4
+
+    def key(self, text: str) -> bytes:
+        h = hashlib.blake2b(digest_size=16)
+        h.update(self.model.encode("utf-8"))
+        h.update(b"\x1f")
+        h.update(text.encode("utf-8"))
+        return h.digest()
+
+    # --- disk tier ---
+    def _open(self) -> None:
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            if os.fstat(fd).st_size == 0:
+                os.write(fd, _MAGIC + np.uint32(self.dim).tobytes() + b"\0" * 4)
+            else:
+                head = os.pread(fd, _HEADER, 0)
+                if head[:8] != _MAGIC or int(np.frombuffer(head[8:12], "<u4")[0]) != self.dim:
+                    raise ValueError(f"{self.path}: not an embedding cache for dim={self.dim}")
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+        self._refresh()
+
+    def _refresh(self) -> None:
+        """Index records appended since the last look (by this or another process)."""
+        rows = (os.path.getsize(self.path) - _HEADER) // self.dtype.itemsize
+        if rows <= self._rows:
+            return
+        self._mm = np.memmap(self.path, dtype=self.dtype, mode="r", offset=_HEADER, shape=(rows,))
+        for i, k in enumerate(self._mm["key"][self._rows:rows], self._rows):
+            self._index[bytes(k)] = i
+        self._rows = rows
+
+    def _append(self, items: Dict[bytes, np.ndarray]) -> None:
+        rec = np.empty(len(items), dtype=self.dtype)
+        rec["key"] = [np.void(k) for k in items]
+        rec["vec"] = np.stack(list(items.values())).astype("<f4", copy=False)
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            size = os.fstat(fd).st_size
+            whole = _HEADER + (size - _HEADER) // self.dtype.itemsize * self.dtype.itemsize
+            if size != whole:  # drop a torn tail so records stay aligned
+                os.ftruncate(fd, whole)
+            os.write(fd, rec.tobytes())
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    # --- public ---
+    def _remember(self, k: bytes, v: np.ndarray) -> None:
+        self._mem[k] = v
+        self._mem.move_to_end(k)
+        while len(self._mem) > self.maxsize:
+            self._mem.popitem(last=False)
+
+    def get_many(self, keys: Iterable[bytes]) -> Dict[bytes, np.ndarray]:
+        found: Dict[bytes, np.ndarray] = {}
+        with self._lock:
+            missing = []
+            for k in keys:
+                v = self._mem.get(k)
+                if v is None:
+                    missing.append(k)
+                else:
+                    self._mem.move_to_end(k)
+                    found[k] = v
+            if missing and self.path:
+                if any(k not in self._index for k in missing):
+                    self._refresh()
+                for k in missing:
+                    row = self._index.get(k)
+                    if row is not None:
+                        v = np.array(self._mm["vec"][row])
+                        self._remember(k, v)
+                        found[k] = v
+        return found
+
+    def put_many(self, items: Dict[bytes, np.ndarray]) -> None:
+        if not items:
+            return
+        with self._lock:
+            for k, v in items.items():
+                self._remember(k, v)
+            if self.path:
+                new = {k: v for k, v in items.items() if k not in self._index}
+                if new:
+                    self._append(new)
+                    self._refresh()
+
+    def record(self, hits: int, misses: int) -> None:
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+                "bytes_saved": self.hits * self.vector_bytes,
+                "memory_entries": len(self._mem), "disk_entries": self._rows}
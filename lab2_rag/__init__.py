@@ -0,0 +1,18 @@
+"""Import alias for lab2-rag/.
+
+The lab directories are not valid module names, so tests, benchmarks and
+`uvicorn lab2_rag.api.asgi:app` (run from the repo root) import them as
+lab2_rag.api, lab2_rag.text_embedder and lab2_rag.kb_service.
+"""
+import os, sys, types
+
+ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lab2-rag")
+__path__ = [ROOT]
+
+for _name in os.listdir(ROOT):
+    _dir = os.path.join(ROOT, _name)
+    if "-" in _name and os.path.isdir(_dir):
+        _mod = types.ModuleType(f"{__name__}.{_name.replace('-', '_')}")
+        _mod.__path__, _mod.__package__ = [_dir], _mod.__name__
+        sys.modules[_mod.__name__] = _mod
+        setattr(sys.modules[__name__], _name.replace("-", "_"), _mod)
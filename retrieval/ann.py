@@ -0,0 +1,222 @@
+from __future__ import annotations
+import fcntl, json, os, shutil, threading
+from contextlib import contextmanager
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+
+# Local vector index: a KB snapshot laid out as
+#   <root>/<version>/vectors.f32   float32 (n, dim), rows grouped by IVF list
+#   <root>/<version>/ivf.npz       centroids (nlist, dim) + list offsets into vectors.f32
+#   <root>/<version>/docs.json     ids / documents / metadatas in row order
+#   <root>/CURRENT                 name of the live snapshot (replaced atomically)
+# vectors.f32 is memory-mapped read-only, so every worker process on a host
+# shares the same page-cache copy of the matrix.
+
+CURRENT = "CURRENT"
+_SPACES = ("l2", "cosine", "ip")
+
+def _kmeans(x: np.ndarray, k: int, iters: int = 12, seed: int = 0) -> np.ndarray:
+    rnd = np.random.default_rng(seed)
+    c = x[rnd.choice(len(x), size=k, replace=False)].copy()
+    for _ in range(iters):
+        assign = _nearest(x, c)
+        for j in range(k):
+            members = x[assign == j]
+            if len(members):
+                c[j] = members.mean(axis=0)
+            else:  # re-seed empty lists on a random point
+                c[j] = x[rnd.integers(len(x))]
+    return c
+
+def _nearest(x: np.ndarray, c: np.ndarray) -> np.ndarray:
+    # argmin |x-c|^2 == argmax (x.c - |c|^2/2)
+    return np.argmax(x @ c.T - 0.5 * (c * c).sum(axis=1), axis=1)
+
+def build_snapshot(root: str, version: str, ids: Sequence[str], embeddings, documents: Sequence[str],
+                   metadatas: Optional[Sequence[Optional[dict]]] = None, space: str = "l2",
+                   nlist: Optional[int] = None) -> str:
+    """Write a snapshot for `version` and point CURRENT at it. Returns the snapshot directory."""
+    if space not in _SPACES:
+        raise ValueError(f"unsupported space {space!r}")
+    n = len(ids)
+    x = np.asarray(embeddings, dtype=np.float32).reshape(n, -1) if n else np.zeros((0, 0), np.float32)
+    if nlist is None:
+        nlist = max(1, min(int(4 * np.sqrt(n)), n // 8))
+    nlist = max(1, min(nlist, n)) if n else 1
+    if n and nlist > 1:
+        train = x / np.maximum(np.linalg.norm(x, axis=1, keepdims=True), 1e-12) if space == "cosine" else x
+        centroids = _kmeans(train, nlist)
+        assign = _nearest(train, centroids)
+    else:
+        centroids = x.mean(axis=0, keepdims=True) if n else np.zeros((1, 0), np.float32)
+        assign = np.zeros(n, dtype=np.int64)
+    order = np.argsort(assign, kind="stable")
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=nlist))]).astype(np.int64)
+
+    os.makedirs(root, exist_ok=True)
+    final = os.path.join(root, version)
+    tmp = f"{final}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    x[order].tofile(os.path.join(tmp, "vectors.f32"))
+    np.savez(os.path.join(tmp, "ivf.npz"), centroids=centroids.astype(np.float32), offsets=offsets)
+    metas = list(metadatas) if metadatas is not None else [None] * n
+    with open(os.path.join(tmp, "docs.json"), "w", encoding="utf-8") as f:
+        json.dump({"version": version, "space": space, "dim": int(x.shape[1]) if n else 0, "nlist": int(nlist),
+                   "ids": [ids[i] for i in order], "documents": [documents[i] for i in order],
+                   "metadatas": [metas[i] for i in order]}, f, ensure_ascii=False)
+    if os.path.exists(final):
+        shutil.rmtree(final)
+    os.replace(tmp, final)
+    _write_current(root, version)
+    return final
+
+def _write_current(root: str, version: str) -> None:
+    tmp = os.path.join(root, f".{CURRENT}.{os.getpid()}")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp, os.path.join(root, CURRENT))
+
+def read_current(root: str) -> Optional[str]:
+    try:
+        with open(os.path.join(root, CURRENT), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+class Snapshot:
+    """One loaded (read-only) snapshot; searching never mutates it."""
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, "docs.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        self.version, self.space, self.dim = meta["version"], meta["space"], meta["dim"]
+        self.ids, self.documents, self.metadatas = meta["ids"], meta["documents"], meta["metadatas"]
+        ivf = np.load(os.path.join(path, "ivf.npz"))
+        self.centroids, self.offsets = ivf["centroids"], ivf["offsets"]
+        n = len(self.ids)
+        self.vectors = np.memmap(os.path.join(path, "vectors.f32"), dtype=np.float32, mode="r",
+                                 shape=(n, self.dim)) if n else np.zeros((0, self.dim), np.float32)
+        self.norms2 = np.einsum("ij,ij->i", self.vectors, self.vectors) if n else np.zeros(0, np.float32)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _distances(self, q: np.ndarray, rows: slice) -> np.ndarray:
+        dots = self.vectors[rows] @ q
+        if self.space == "ip":
+            return 1.0 - dots
+        if self.space == "cosine":
+            return 1.0 - dots / np.maximum(np.sqrt(self.norms2[rows] * float(q @ q)), 1e-12)
+        return self.norms2[rows] + float(q @ q) - 2.0 * dots  # squared L2, as Chroma reports it
+
+    def search(self, q, k: int, nprobe: int = 8):
+        """(row indices, distances) of the k nearest rows, closest first; exact when nprobe >= nlist."""
+        q = np.asarray(q, dtype=np.float32).reshape(-1)
+        nlist = len(self.offsets) - 1
+        if nlist <= nprobe:
+            lists = range(nlist)
+        else:
+            cq = q / max(float(np.linalg.norm(q)), 1e-12) if self.space == "cosine" else q
+            lists = np.argsort(-(self.centroids @ cq - 0.5 * (self.centroids * self.centroids).sum(axis=1)))[:nprobe]
+        rows, dists = [], []
+        for j in lists:
+            a, b = int(self.offsets[j]), int(self.offsets[j + 1])
+            if b > a:
+                rows.append(np.arange(a, b))
+                dists.append(self._distances(q, slice(a, b)))
+        if not rows:
+            return np.zeros(0, np.int64), np.zeros(0, np.float32)
+        rows, dists = np.concatenate(rows), np.concatenate(dists)
+        if len(rows) > k:
+            part = np.argpartition(dists, k)[:k]
+            rows, dists = rows[part], dists[part]
+        order = np.argsort(dists, kind="stable")
+        return rows[order], dists[order]
+
+    def query(self, query_embeddings, n_results: int, nprobe: int = 8) -> dict:
+        """Chroma-shaped result (ids / documents / metadatas / distances, one row per query)."""
+        out = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for q in query_embeddings:
+            rows, dists = self.search(q, n_results, nprobe)
+            out["ids"].append([self.ids[i] for i in rows])
+            out["documents"].append([self.documents[i] for i in rows])
+            out["metadatas"].append([self.metadatas[i] for i in rows])
+            out["distances"].append([float(d) for d in dists])
+        return out
+
+class LocalIndex:
+    """Process-local handle on the snapshot named by <root>/CURRENT.
+
+    `refresh(version, fetch)` makes the snapshot for `version` live: if another
+    process already built it, it is just memory-mapped; otherwise this process
+    builds it under an exclusive file lock (`fetch()` returns ids, embeddings,
+    documents, metadatas, space). Readers keep using the previous snapshot until
+    the new one is swapped in with a single reference assignment.
+    """
+
+    def __init__(self, root: str, nprobe: int = 8, nlist: Optional[int] = None, keep: int = 2):
+        self.root, self.nprobe, self.nlist, self.keep = root, nprobe, nlist, keep
+        self.snapshot: Optional[Snapshot] = None
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> Optional[str]:
+        snap = self.snapshot
+        return snap.version if snap is not None else None
+
+    @contextmanager
+    def _build_lock(self):
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, ".lock"), "w") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def refresh(self, version: str, fetch: Callable[[], tuple]) -> bool:
+        """True when `version` is live after the call (built or loaded)."""
+        if self.version == version:
+            return True
+        with self._lock:
+            if self.version == version:
+                return True
+            path = os.path.join(self.root, version)
+            if not os.path.exists(os.path.join(path, "docs.json")):
+                with self._build_lock():
+                    if not os.path.exists(os.path.join(path, "docs.json")):
+                        ids, embeddings, documents, metadatas, space = fetch()
+                        build_snapshot(self.root, version, ids, embeddings, documents, metadatas,
+                                       space=space, nlist=self.nlist)
+                    elif read_current(self.root) != version:
+                        _write_current(self.root, version)
+                    self._gc(version)
+            self.snapshot = Snapshot(path)
+            return True
+
+    def _gc(self, live: str) -> None:
+        snaps = sorted((d for d in os.listdir(self.root)
+                        if os.path.isdir(os.path.join(self.root, d)) and ".tmp-" not in d and d != live),
+                       key=lambda d: os.path.getmtime(os.path.join(self.root, d)))
+        for d in snaps[:max(0, len(snaps) - (self.keep - 1))]:
+            shutil.rmtree(os.path.join(self.root, d), ignore_errors=True)  # open memmaps stay valid
+
+    def load_current(self) -> bool:
+        """Map whatever CURRENT points at (e.g. after another worker rebuilt)."""
+        version = read_current(self.root)
+        if version is None or version == self.version:
+            return version is not None
+        try:
+            snap = Snapshot(os.path.join(self.root, version))
+        except (OSError, ValueError, KeyError):
+            return False
+        self.snapshot = snap
+        return True
+
+    def query(self, query_embeddings: List[List[float]], n_results: int) -> dict:
+        snap = self.snapshot
+        if snap is None:
+            raise RuntimeError("local index not loaded")
+        return snap.query(query_embeddings, n_results, self.nprobe)
@@ -0,0 +1,160 @@
+from __future__ import annotations
+import collections, hashlib, os, re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Heading-aware, token-windowed markdown chunking for the KB ingesters.
+#
+# A file is split into sections at ATX headings (`#`..`######`, ignored inside
+# fenced code). A section that fits the window is one chunk; a longer one is cut
+# into `window`-token slices overlapping by `overlap` tokens, each cut pulled back
+# to a paragraph (or line) break when one lies in the second half of the window.
+# Chunks are exact slices of the source, so `start`/`end` are character offsets.
+# Ids are `<source>:<content hash>`, so a chunk keeps its id when other parts of
+# the file change (repeats within a file get a `~n` suffix).
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+_HEADING_RE = re.compile(r"^(#{1,6})[ \t]+(.*?)[ \t#]*$")
+_FENCE_RE = re.compile(r"^\s*(```|~~~)")
+
+class RegexTokenizer:
+    """Words and punctuation marks; close to (a bit under) WordPiece/BPE counts for English."""
+    name = "regex"
+
+    def spans(self, text: str) -> List[Tuple[int, int]]:
+        return [m.span() for m in _WORD_RE.finditer(text)]
+
+class HFTokenizer:
+    """The embedding model's own tokenizer (`tokenizers` package), used for its character offsets."""
+
+    def __init__(self, name: str):
+        from tokenizers import Tokenizer
+        self.name = name
+        self._tok = Tokenizer.from_pretrained(name)
+        self._tok.no_truncation()
+        self._tok.no_padding()
+
+    def spans(self, text: str) -> List[Tuple[int, int]]:
+        return [o for o in self._tok.encode(text, add_special_tokens=False).offsets if o[1] > o[0]]
+
+_tokenizers: Dict[str, object] = {}
+
+def get_tokenizer(name: Optional[str] = None):
+    """Cached per process. "" / "regex" -> RegexTokenizer; a model name that can't be loaded
+    (no `tokenizers`, no network) falls back to RegexTokenizer as well."""
+    name = name or "regex"
+    tok = _tokenizers.get(name)
+    if tok is None:
+        if name == "regex":
+            tok = RegexTokenizer()
+        else:
+            try:
+                tok = HFTokenizer(name)
+            except Exception as e:
+                print(f"[chunking] tokenizer {name!r} unavailable ({e}); using regex token counts")
+                tok = _tokenizers.get("regex") or RegexTokenizer()
+        _tokenizers[name] = tok
+    return tok
+
+def count_tokens(text: str, tokenizer: Optional[str] = None) -> int:
+    return len(get_tokenizer(tokenizer).spans(text or ""))
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def sections(text: str) -> List[Tuple[Tuple[str, ...], int, int]]:
+    """[(heading path, start, end)] covering `text`; each section starts at its heading line."""
+    out, stack, start, path, in_fence, pos = [], [], 0, (), False, 0
+    for line in text.splitlines(keepends=True):
+        if _FENCE_RE.match(line):
+            in_fence = not in_fence
+        m = None if in_fence else _HEADING_RE.match(line.rstrip("\r\n"))
+        if m:
+            if pos > start:
+                out.append((path, start, pos))
+            level = len(m.group(1))
+            while stack and stack[-1][0] >= level:
+                stack.pop()
+            stack.append((level, m.group(2).strip()))
+            path, start = tuple(t for _, t in stack), pos
+        pos += len(line)
+    if pos > start:
+        out.append((path, start, pos))
+    return out
+
+def _cut(text: str, spans: List[Tuple[int, int]], i: int, j: int, window: int) -> int:
+    """End token (exclusive) for a window starting at i: j, or an earlier paragraph/line break."""
+    lo = i + max(1, window // 2)
+    for sep in ("\n\n", "\n"):
+        for k in range(j - 1, lo - 1, -1):
+            if sep in text[spans[k - 1][1]:spans[k][0]]:
+                return k
+    return j
+
+def chunk_text(text: str, source: str, window: int = 256, overlap: int = 32,
+               tokenizer: Optional[str] = None) -> List[dict]:
+    if overlap >= window:
+        raise ValueError("overlap must be smaller than window")
+    tok = get_tokenizer(tokenizer)
+    chunks, seen = [], collections.Counter()
+
+    def emit(path, s, e, n_tokens):
+        body = text[s:e]
+        h = content_hash(body)
+        seen[h] += 1
+        cid = f"{source}:{h[:16]}" + (f"~{seen[h] - 1}" if seen[h] > 1 else "")
+        chunks.append({"id": cid, "text": body, "metadata": {
+            "source": source, "heading_path": " > ".join(path), "chunk_index": len(chunks),
+            "start": s, "end": e, "tokens": n_tokens, "content_hash": h}})
+
+    for path, s, e in sections(text):
+        body = text[s:e]
+        spans = [(a + s, b + s) for a, b in tok.spans(body)]
+        if not spans or (path and not body.partition("\n")[2].strip()):
+            continue  # empty, or a heading with nothing under it (it lives on in its children's paths)
+        i, n = 0, len(spans)
+        while i < n:
+            j = min(i + window, n)
+            if j < n:
+                j = _cut(text, spans, i, j, window)
+            emit(path, spans[i][0], spans[j - 1][1], j - i)
+            if j == n:
+                break
+            i = max(j - overlap, i + 1)
+    return chunks
+
+def chunk_file(path: str, source: Optional[str] = None, window: int = 256, overlap: int = 32,
+               tokenizer: Optional[str] = None) -> List[dict]:
+    try:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            text = f.read()
+    except OSError:
+        return []
+    return chunk_text(text, source or os.path.basename(path), window, overlap, tokenizer)
+
+def _chunk_file_args(args):
+    return chunk_file(*args)
+
+def pool_map(fn, jobs: Iterable[tuple], processes: int = 0) -> Iterator:
+    """fn(job) for every job, in order. With processes > 1 jobs run in a process pool with at most
+    4 x processes in flight, so a large corpus streams through instead of piling up in memory."""
+    if processes <= 1:
+        for job in jobs:
+            yield fn(job)
+        return
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        pending = collections.deque()
+        for job in jobs:
+            pending.append(pool.submit(fn, job))
+            if len(pending) >= 4 * processes:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def iter_chunks(files: Iterable[Tuple[str, str]], window: int = 256, overlap: int = 32,
+                tokenizer: Optional[str] = None, processes: int = 0) -> Iterator[dict]:
+    """Chunks of every (path, source) in order; with processes > 1 the files are read and
+    chunked in worker processes (see pool_map)."""
+    jobs = ((p, src, window, overlap, tokenizer) for p, src in files)
+    for chunks in pool_map(_chunk_file_args, jobs, processes):
+        yield from chunks
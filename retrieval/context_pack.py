@@ -0,0 +1,101 @@
+from __future__ import annotations
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Sequence, Union
+
+from retrieval.chunking import _cut, content_hash, get_tokenizer
+
+# Token-budgeted context packing for RAG prompts.
+#
+# Retrieved chunks arrive best-first. They are added in that order while they
+# fit `budget_tokens` (separators included). The first chunk that does not fit
+# is trimmed to the remaining budget, at a paragraph/line break when one lies
+# in the second half of what is left; if fewer than `min_trim_tokens` remain it
+# is dropped instead. Every chunk after it is dropped. The prompt's context
+# part therefore never exceeds the budget, whatever the chunk sizes.
+#
+# Token counts come from the model's tokenizer (retrieval.chunking.get_tokenizer)
+# and are cached per (tokenizer, chunk content hash). The same chunks come back
+# for many queries, so steady-state packing only tokenizes the trimmed chunk.
+
+TokenizerSpec = Union[None, str, object, Callable[[], object]]
+
+@dataclass
+class Packed:
+    text: str
+    tokens: int
+    kept: List[int] = field(default_factory=list)    # indices into the input, rank order
+    texts: List[str] = field(default_factory=list)   # their (possibly trimmed) texts
+    dropped: int = 0
+    trimmed: int = 0
+
+class ContextPacker:
+    """`pack(texts)` -> Packed. `tokenizer` is a name for get_tokenizer, a tokenizer, or a
+    zero-arg callable returning one (e.g. "the warm model tokenizer, else regex").
+    budget_tokens <= 0 packs everything (no limit)."""
+
+    def __init__(self, budget_tokens: int, tokenizer: TokenizerSpec = None, separator: str = "\n\n",
+                 min_trim_tokens: int = 48, cache_size: int = 65536):
+        self.budget_tokens, self.separator, self.min_trim_tokens = budget_tokens, separator, min_trim_tokens
+        self._tokenizer, self.cache_size = tokenizer, cache_size
+        self._counts: "OrderedDict[tuple, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def tokenizer(self):
+        t = self._tokenizer
+        if t is None or isinstance(t, str):
+            return get_tokenizer(t)
+        return t if hasattr(t, "spans") else t()
+
+    def count(self, text: str, digest: Optional[str] = None, tok=None) -> int:
+        """Token count of `text`, cached under its content hash (`digest`, if the caller has it)."""
+        tok = tok or self.tokenizer()
+        key = (tok.name, digest or content_hash(text))
+        with self._lock:
+            n = self._counts.get(key)
+            if n is not None:
+                self._counts.move_to_end(key)
+                self.hits += 1
+                return n
+        n = len(tok.spans(text))
+        with self._lock:
+            self.misses += 1
+            self._counts[key] = n
+            if len(self._counts) > self.cache_size:
+                self._counts.popitem(last=False)
+        return n
+
+    def trim(self, text: str, max_tokens: int, tok=None) -> str:
+        spans = (tok or self.tokenizer()).spans(text)
+        if len(spans) <= max_tokens:
+            return text
+        end = _cut(text, spans, 0, max_tokens, max_tokens)
+        return text[:spans[end - 1][1]]
+
+    def pack(self, texts: Sequence[str], digests: Optional[Sequence[Optional[str]]] = None) -> Packed:
+        tok = self.tokenizer()
+        digests = digests or [None] * len(texts)
+        sep = self.count(self.separator, tok=tok) if self.separator else 0
+        out = Packed(text="", tokens=0)
+        for i, (text, digest) in enumerate(zip(texts, digests)):
+            if not text:
+                continue
+            cost = self.count(text, digest, tok) + (sep if out.texts else 0)
+            if self.budget_tokens > 0 and out.tokens + cost > self.budget_tokens:
+                room = self.budget_tokens - out.tokens - (sep if out.texts else 0)
+                if room < self.min_trim_tokens:
+                    out.dropped = sum(1 for t in texts[i:] if t)
+                    break
+                text = self.trim(text, room, tok)
+                cost = len(tok.spans(text)) + (sep if out.texts else 0)
+                out.trimmed += 1
+            out.kept.append(i)
+            out.texts.append(text)
+            out.tokens += cost
+            if out.trimmed:
+                out.dropped = sum(1 for t in texts[i + 1:] if t)
+                break
+        out.text = self.separator.join(out.texts)
+        return out
@@ -0,0 +1,67 @@
+from __future__ import annotations
+import struct
+from typing import Optional, Tuple
+
+import numpy as np
+
+# Binary /embed payload (little-endian):
+#   0   4s  magic b"EMB1"
+#   4   B   dtype code (1=float32, 2=float16, 3=int8)
+#   5   3x  reserved
+#   8   I   rows
+#   12  I   dim
+#   16  ... int8 only: rows x float32 per-row scales, then the rows x dim matrix
+# int8 is symmetric per-row quantization: value = q * scale, scale = max|row| / 127.
+
+MEDIA_TYPE = "application/x-embeddings"
+_MAGIC = b"EMB1"
+_HEAD = struct.Struct("<4sB3xII")
+_CODES = {"float32": 1, "float16": 2, "int8": 3}
+_DTYPES = {1: np.dtype("<f4"), 2: np.dtype("<f2"), 3: np.dtype("i1")}
+
+def content_type(dtype: str) -> str:
+    return f"{MEDIA_TYPE}; dtype={dtype}"
+
+def negotiate(accept: Optional[str]) -> Optional[str]:
+    """dtype requested by an Accept header, or None for JSON.
+    `application/x-embeddings; dtype=float16` -> float16; bare x-embeddings or octet-stream -> float32."""
+    for part in (accept or "").split(","):
+        fields = [f.strip() for f in part.split(";")]
+        media = fields[0].lower()
+        if media not in (MEDIA_TYPE, "application/octet-stream"):
+            continue
+        params = dict(f.split("=", 1) for f in fields[1:] if "=" in f)
+        dtype = params.get("dtype", "float32").strip().lower()
+        if dtype in _CODES:
+            return dtype
+    return None
+
+def encode(vectors, dtype: str = "float32") -> bytes:
+    x = np.asarray(vectors, dtype=np.float32)
+    if x.ndim != 2:
+        x = x.reshape(len(x), -1)
+    rows, dim = x.shape
+    head = _HEAD.pack(_MAGIC, _CODES[dtype], rows, dim)
+    if dtype == "int8":
+        scale = np.abs(x).max(axis=1) / 127.0
+        scale[scale == 0] = 1.0
+        q = np.clip(np.rint(x / scale[:, None]), -127, 127).astype("i1")
+        return head + scale.astype("<f4").tobytes() + q.tobytes()
+    return head + x.astype(_DTYPES[_CODES[dtype]], copy=False).tobytes()
+
+def decode(buf, dequantize: bool = True) -> np.ndarray:
+    """(rows, dim) array over `buf`; float32/float16 payloads are a zero-copy view. int8 is
+    dequantized to float32 unless `dequantize=False` (raw codes; scales via decode_int8)."""
+    magic, code, rows, dim = _HEAD.unpack_from(buf, 0)
+    if magic != _MAGIC or code not in _DTYPES:
+        raise ValueError("not an embeddings payload")
+    if code == 3:
+        scale, q = decode_int8(buf)
+        return q.astype(np.float32) * scale[:, None] if dequantize else q
+    return np.frombuffer(buf, dtype=_DTYPES[code], count=rows * dim, offset=_HEAD.size).reshape(rows, dim)
+
+def decode_int8(buf) -> Tuple[np.ndarray, np.ndarray]:
+    _, _, rows, dim = _HEAD.unpack_from(buf, 0)
+    scale = np.frombuffer(buf, dtype="<f4", count=rows, offset=_HEAD.size)
+    q = np.frombuffer(buf, dtype="i1", count=rows * dim, offset=_HEAD.size + 4 * rows).reshape(rows, dim)
+    return scale, q
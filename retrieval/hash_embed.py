@@ -0,0 +1,115 @@
+from __future__ import annotations
+import re
+from typing import Sequence, Tuple
+
+import numpy as np
+
+# Feature-hashing embedder: a fast, deterministic, dependency-free stand-in for a
+# sentence encoder. Texts are lowercased and reduced to their words; the features
+# are word n-grams and character n-grams (over " word word ", so they also see
+# word boundaries), each hashed to a signed bucket in `dim`, then L2-normalized.
+# Texts sharing words or spellings get nearby vectors, so retrieval can be
+# exercised offline.
+#
+# The whole batch is hashed at once. Normalized texts are concatenated into one
+# byte array, and the polynomial hash of any span [s, e) is read off prefix sums:
+#   H(s, e) = P^(e-1) * (S[e] - S[s]),  S[i] = sum_{k<i} b[k] * P^-k   (mod 2^64)
+# So every n-gram hash is a few vector ops, uint64 arithmetic wraps mod 2^64, and
+# the signed counts are scattered with one bincount. Only the per-text
+# normalization (one regex) runs in Python.
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_P = np.uint64(0x100000001B3)  # odd, so invertible mod 2^64
+_P_INV = np.uint64(pow(int(_P), -1, 1 << 64))
+_Q = np.uint64(0x9E3779B97F4A7C15)  # combines consecutive word hashes into word n-grams
+_MIX = np.uint64(0xBF58476D1CE4E5B9)
+_SALT_WORD = np.uint64(0x5851F42D4C957F2D)
+_SALT_CHAR = np.uint64(0x14057B7EF767814F)
+_SPACE = ord(" ")
+
+_pow_cache = (np.ones(1, dtype=np.uint64), np.ones(1, dtype=np.uint64))
+
+def _powers(n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """(P^i, P^-i) for i < n, from a table that grows by doubling (shared by all instances)."""
+    global _pow_cache
+    pw, pinv = _pow_cache
+    if len(pw) < n:
+        size = max(n, 2 * len(pw), 4096)
+        with np.errstate(over="ignore"):
+            pw = np.concatenate(([np.uint64(1)], np.cumprod(np.full(size - 1, _P, dtype=np.uint64))))
+            pinv = np.concatenate(([np.uint64(1)], np.cumprod(np.full(size - 1, _P_INV, dtype=np.uint64))))
+        _pow_cache = (pw, pinv)
+    return pw, pinv
+
+def _mix(h: np.ndarray) -> np.ndarray:
+    h = h ^ (h >> np.uint64(31))
+    h = h * _MIX
+    return h ^ (h >> np.uint64(29))
+
+class HashingEmbedder:
+    def __init__(self, dim: int = 256, word_ngrams: Tuple[int, int] = (1, 2), char_ngrams: Tuple[int, int] = (3, 5),
+                 char_weight: float = 0.5):
+        self.dim, self.word_ngrams, self.char_ngrams, self.char_weight = dim, word_ngrams, char_ngrams, char_weight
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return " " + " ".join(_WORD_RE.findall((text or "").lower())) + " "
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        """(len(texts), dim) float32, rows L2-normalized (all-zero for texts without words)."""
+        rows = len(texts)
+        if rows == 0:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        norm = [self.normalize(t).encode("utf-8") for t in texts]
+        lens = np.fromiter((len(b) for b in norm), dtype=np.int64, count=rows)
+        b = np.frombuffer(b"".join(norm), dtype=np.uint8).astype(np.uint64)
+        n = len(b)
+        row = np.repeat(np.arange(rows), lens)
+        pw, pinv = _powers(n)
+        with np.errstate(over="ignore"):
+            S = np.concatenate(([np.uint64(0)], np.cumsum(b * pinv[:n], dtype=np.uint64)))
+
+            def span_hash(s, e):
+                return pw[e - 1] * (S[e] - S[s])
+
+            idx, wts = [], []
+
+            def add(h, r, weight, salt):
+                h = _mix(h ^ salt)
+                # bucket from the high 32 bits (multiply-shift range reduction), sign from bit 0
+                bucket = ((h >> np.uint64(32)) * np.uint64(self.dim)) >> np.uint64(32)
+                idx.append(r * self.dim + bucket.astype(np.int64))
+                wts.append((1.0 - 2.0 * (h & np.uint64(1)).astype(np.float64)) * weight)
+
+            # character n-grams that stay inside one text
+            lo, hi = self.char_ngrams
+            for k in range(lo, hi + 1):
+                if n < k:
+                    break
+                s = np.arange(n - k + 1)
+                s = s[row[s] == row[s + k - 1]]
+                add(span_hash(s, s + k) + np.uint64(k), row[s], self.char_weight, _SALT_CHAR)
+
+            # words: maximal runs of non-space bytes
+            is_word = b != _SPACE
+            edges = np.diff(np.concatenate(([False], is_word, [False])).astype(np.int8))
+            ws, we = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+            if len(ws):
+                wh, wr = span_hash(ws, we), row[ws]
+                lo, hi = self.word_ngrams
+                for k in range(lo, hi + 1):
+                    if len(ws) < k:
+                        break
+                    h = wh[:len(ws) - k + 1].copy()
+                    for j in range(1, k):
+                        h = h * _Q + wh[j:len(ws) - k + 1 + j]
+                    ok = wr[:len(ws) - k + 1] == wr[k - 1:]
+                    add(h[ok] + np.uint64(k), wr[:len(ws) - k + 1][ok], 1.0, _SALT_WORD)
+
+        if not idx:
+            return np.zeros((rows, self.dim), dtype=np.float32)
+        out = np.bincount(np.concatenate(idx), weights=np.concatenate(wts), minlength=rows * self.dim)
+        out = out.reshape(rows, self.dim).astype(np.float32)
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        np.divide(out, norms, out=out, where=norms > 0)
+        return out
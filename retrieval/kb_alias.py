@@ -0,0 +1,53 @@
+from __future__ import annotations
+import json, os, threading, time
+from typing import Optional
+
+# Chroma has no collection aliases, so the live KB collection is named by a small
+# JSON file next to the Chroma data ({"alias", "target", "switched_at"}). Writers
+# switch it with write-temp + fsync + rename, which is atomic; readers re-read it
+# only when its mtime changes. With no file the alias points at a collection of
+# its own name (the layout from before blue/green rebuilds).
+
+class CollectionAlias:
+    def __init__(self, path: str, name: str = "kb"):
+        self.path, self.name = path, name
+        self._mtime = None
+        self._target = name
+        self._handle = None
+        self._lock = threading.Lock()
+
+    def target(self) -> str:
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return self._target
+        if mtime != self._mtime:
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    self._target = json.load(f).get("target") or self.name
+                self._mtime = mtime
+            except (OSError, ValueError):
+                pass  # keep the last good target
+        return self._target
+
+    def switch(self, target: str) -> Optional[str]:
+        """Point the alias at `target`; returns the previous target."""
+        with self._lock:
+            previous = self.target()
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"alias": self.name, "target": target, "switched_at": time.time()}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            self._target, self._mtime = target, None
+            return previous
+
+    def collection(self, client):
+        """Handle to the current target, re-fetched from `client` only after a switch."""
+        target = self.target()
+        handle = self._handle
+        if handle is None or handle.name != target:
+            handle = self._handle = client.get_or_create_collection(target)
+        return handle
@@ -0,0 +1,144 @@
+from __future__ import annotations
+import hashlib, json, os
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from retrieval.chunking import chunk_text, pool_map
+
+# Incremental KB sync. The manifest records, per source, the file's path, mtime,
+# size, content hash and chunk ids from the last successful sync. A run then:
+#   - skips files whose mtime and size match (no read at all),
+#   - re-hashes the rest and skips those whose content is unchanged (touched),
+#   - re-chunks changed/new files and yields only chunk ids it has not seen
+#     (chunk ids are content hashes, so untouched sections keep theirs),
+#   - deletes the chunk ids of removed files and the ids a changed file lost.
+# Counts are per chunk. In a changed file a new id paired with a lost one is an
+# update; unpaired new ids are additions and unpaired lost ids are deletions.
+
+def file_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+class Manifest:
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.params: dict = {}
+        self.files: Dict[str, dict] = {}
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            self.params, self.files = data.get("params", {}), data.get("files", {})
+
+    def chunk_count(self) -> int:
+        return sum(len(e["chunks"]) for e in self.files.values())
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"params": self.params, "files": self.files}, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def clear(self) -> None:
+        self.params, self.files = {}, {}
+
+def _scan_file(args) -> Tuple[Optional[str], Optional[List[dict]]]:
+    """(hash, chunks) for one file; chunks is None when the hash equals `known_hash`."""
+    path, source, window, overlap, tokenizer, known_hash = args
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None, []
+    h = file_hash(data)
+    if h == known_hash:
+        return h, None
+    return h, chunk_text(data.decode("utf-8", errors="ignore"), source, window, overlap, tokenizer)
+
+class SyncPlan:
+    """Consume `changes()` (the chunks to embed and upsert), then apply `refresh` (kept chunks whose
+    metadata moved) and `deletes`, then `commit()` the manifest. Nothing is committed if the caller
+    fails before that, so the next run redoes the same work."""
+
+    def __init__(self, manifest: Manifest, files: Iterable[Tuple[str, str]], window: int, overlap: int,
+                 tokenizer: Optional[str] = None, processes: int = 0, force: bool = False,
+                 exists: Optional[Callable[[Sequence[str]], Iterable[str]]] = None):
+        self.manifest, self.files = manifest, files
+        self.params = {"window": window, "overlap": overlap, "tokenizer": tokenizer or "regex"}
+        self.processes = processes
+        # params changed -> every chunk boundary may have moved, so nothing can be skipped by stat/hash
+        self.force = force or (bool(manifest.files) and manifest.params != self.params)
+        self.exists = exists
+        self.entries: Dict[str, dict] = {}
+        self.deletes: List[str] = []
+        self.refresh: List[dict] = []
+        self.counts = {"added": 0, "updated": 0, "deleted": 0, "skipped": 0,
+                       "files_read": 0, "files_removed": 0}
+
+    @property
+    def changed(self) -> bool:
+        c = self.counts
+        return bool(c["added"] or c["updated"] or c["deleted"] or self.refresh)
+
+    def changes(self) -> Iterator[dict]:
+        old_files = self.manifest.files
+        todo, seen = [], set()
+        for path, source in self.files:
+            seen.add(source)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue  # vanished since listing: treated as removed below
+            old = old_files.get(source)
+            if old and not self.force and old["mtime"] == st.st_mtime and old["size"] == st.st_size:
+                self.entries[source] = old
+                self.counts["skipped"] += len(old["chunks"])
+                continue
+            todo.append((path, source, st, old))
+        pending = {t[1] for t in todo}
+        for source, old in old_files.items():
+            if source not in self.entries and source not in pending:
+                self.deletes.extend(old["chunks"])
+                self.counts["deleted"] += len(old["chunks"])
+                self.counts["files_removed"] += 1
+
+        p = self.params
+        jobs = ((path, source, p["window"], p["overlap"], p["tokenizer"],
+                 None if self.force or not old else old["hash"]) for path, source, _, old in todo)
+        for (path, source, st, old), (h, chunks) in zip(todo, pool_map(_scan_file, jobs, self.processes)):
+            self.counts["files_read"] += 1
+            entry = {"path": path, "mtime": st.st_mtime, "size": st.st_size, "hash": h}
+            if chunks is None:  # touched, content unchanged
+                entry["chunks"] = old["chunks"]
+                self.entries[source] = entry
+                self.counts["skipped"] += len(old["chunks"])
+                continue
+            entry["chunks"] = [c["id"] for c in chunks]
+            self.entries[source] = entry
+            yield from self._diff(old, chunks)
+
+    def _diff(self, old: Optional[dict], chunks: List[dict]) -> List[dict]:
+        old_ids = set(old["chunks"]) if old else set()
+        if self.force:
+            fresh, kept = chunks, []
+        else:
+            fresh = [c for c in chunks if c["id"] not in old_ids]
+            kept = [c for c in chunks if c["id"] in old_ids]
+            if fresh and self.exists:  # e.g. first sync over a collection filled by a full ingest
+                present = set(self.exists([c["id"] for c in fresh]))
+                kept += [c for c in fresh if c["id"] in present]
+                fresh = [c for c in fresh if c["id"] not in present]
+        gone = old_ids - {c["id"] for c in chunks}
+        redone = sum(1 for c in fresh if c["id"] in old_ids)
+        paired = min(len(fresh) - redone, len(gone))
+        self.counts["updated"] += redone + paired
+        self.counts["added"] += len(fresh) - redone - paired
+        self.counts["deleted"] += len(gone) - paired
+        self.counts["skipped"] += len(kept)
+        self.refresh.extend(kept)
+        self.deletes.extend(sorted(gone))
+        return fresh
+
+    def commit(self) -> None:
+        self.manifest.params, self.manifest.files = dict(self.params), self.entries
+        self.manifest.save()
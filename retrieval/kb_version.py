@@ -0,0 +1,53 @@
+from __future__ import annotations
+import time, threading, uuid
+from typing import Callable, Optional
+
+# Stamp written into the Chroma collection metadata by the KB ingesters so that
+# downstream caches (retrieval results, answers, BM25) know when to invalidate.
+KB_VERSION_KEY = "kb_version"
+KB_INGESTED_AT_KEY = "kb_ingested_at"
+# hnsw:* keys can't be passed back to modify(), so the distance space is kept under its own key
+KB_SPACE_KEY = "kb_space"
+
+def bump_kb_version(collection) -> str:
+    version = f"{int(time.time())}-{uuid.uuid4().hex[:8]}"
+    old = collection.metadata or {}
+    meta = {k: v for k, v in old.items() if not k.startswith("hnsw:")}
+    meta.update({KB_VERSION_KEY: version, KB_INGESTED_AT_KEY: time.time(), KB_SPACE_KEY: read_space(collection)})
+    collection.modify(metadata=meta)
+    return version
+
+def read_space(collection) -> str:
+    """Distance space of the collection (l2 | cosine | ip), also after bump_kb_version dropped hnsw:space."""
+    meta = collection.metadata or {}
+    return str(meta.get("hnsw:space") or meta.get(KB_SPACE_KEY) or "l2")
+
+def read_kb_version(collection) -> str:
+    return str((collection.metadata or {}).get(KB_VERSION_KEY, "0"))
+
+class VersionWatcher:
+    """Polls `fetch()` at most every `interval_s` seconds and calls `on_change(old, new)` when it moves."""
+
+    def __init__(self, fetch: Callable[[], str], interval_s: float = 5.0,
+                 on_change: Optional[Callable[[Optional[str], str], None]] = None):
+        self.fetch, self.interval_s, self.on_change = fetch, interval_s, on_change
+        self.version: Optional[str] = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def current(self) -> str:
+        now = time.monotonic()
+        if self.version is not None and now - self._checked < self.interval_s:
+            return self.version
+        with self._lock:
+            if self.version is not None and now - self._checked < self.interval_s:
+                return self.version
+            try:
+                new = self.fetch()
+            except Exception:
+                new = self.version or "0"
+            self._checked = now
+            old, self.version = self.version, new
+        if old is not None and old != new and self.on_change:
+            self.on_change(old, new)
+        return new
@@ -0,0 +1,84 @@
+# Dense prefetch latency and recall@k: Chroma HTTP query vs the local mmap IVF snapshot (retrieval/ann.py).
+# Ground truth is exact brute force over the same vectors. Without --chroma-url a synthetic corpus is
+# used and only the local index is measured; with it, the collection is pulled from Chroma, snapshotted
+# locally and both backends answer the same queries (stored vectors plus noise).
+# Run from the repo root (retrieval/ is imported from there): python -m scripts.bench_ann
+import json, argparse, statistics, tempfile, time
+
+import numpy as np
+
+from retrieval.ann import Snapshot, build_snapshot
+from retrieval.kb_version import read_space
+
+def exact_topk(x, q, k, space):
+    if space == "l2":
+        d = ((x - q) ** 2).sum(axis=1)
+    elif space == "cosine":
+        d = 1 - (x @ q) / (np.linalg.norm(x, axis=1) * np.linalg.norm(q) + 1e-12)
+    else:
+        d = 1 - x @ q
+    return np.argsort(d)[:k]
+
+def summarize(lat, hits, k):
+    lat = sorted(lat)
+    return {"p50_ms": round(statistics.median(lat) * 1000, 3),
+            "p99_ms": round(lat[max(0, int(len(lat) * 0.99) - 1)] * 1000, 3),
+            f"recall@{k}": round(sum(hits) / (len(hits) * k), 4)}
+
+def run(args):
+    rnd = np.random.default_rng(args.seed)
+    col = None
+    if args.chroma_url:
+        from chromadb import HttpClient
+        host, port = args.chroma_url.split("://")[1].split(":")
+        col = HttpClient(host=host, port=int(port)).get_collection(args.index)
+        got = col.get(include=["embeddings", "documents", "metadatas"])
+        ids, x, docs = got["ids"], np.asarray(got["embeddings"], np.float32), got["documents"]
+        space = read_space(col)
+    else:
+        # clustered like real embeddings (topics), not uniform noise with meaningless neighbours
+        centers = rnd.normal(size=(args.topics, args.dim))
+        x = (centers[rnd.integers(args.topics, size=args.docs)]
+             + rnd.normal(scale=args.spread, size=(args.docs, args.dim))).astype(np.float32)
+        x /= np.linalg.norm(x, axis=1, keepdims=True)
+        ids, docs, space = [f"doc-{i}" for i in range(len(x))], [""] * len(x), "l2"
+
+    with tempfile.TemporaryDirectory() as root:
+        t0 = time.perf_counter()
+        snap = Snapshot(build_snapshot(root, "bench", ids, x, docs, space=space, nlist=args.nlist or None))
+        build_s = time.perf_counter() - t0
+        row_of = {doc_id: i for i, doc_id in enumerate(ids)}
+        picks = rnd.integers(len(x), size=args.queries)
+        queries = x[picks] + rnd.normal(scale=args.noise, size=(args.queries, x.shape[1])).astype(np.float32)
+
+        report = {"docs": len(x), "dim": int(x.shape[1]), "space": space, "k": args.k, "queries": args.queries,
+                  "nlist": len(snap.offsets) - 1, "nprobe": args.nprobe, "build_s": round(build_s, 3)}
+        backends = {"local": lambda q: snap.query([q.tolist()], args.k, args.nprobe)["ids"][0]}
+        if col is not None:
+            backends["chroma"] = lambda q: col.query(query_embeddings=[q.tolist()], n_results=args.k)["ids"][0]
+        for name, fn in backends.items():
+            lat, hits = [], []
+            for q in queries:
+                truth = set(exact_topk(x, q, args.k, space).tolist())
+                t0 = time.perf_counter()
+                got = fn(q)
+                lat.append(time.perf_counter() - t0)
+                hits.append(len(truth & {row_of[i] for i in got}))
+            report[name] = summarize(lat, hits, args.k)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--chroma-url", help="e.g. http://localhost:8000 (omit for a synthetic local-only run)")
+    ap.add_argument("--index", default="kb_demo")
+    ap.add_argument("--docs", type=int, default=20000, help="synthetic corpus size")
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--topics", type=int, default=200, help="synthetic cluster count")
+    ap.add_argument("--spread", type=float, default=1.0, help="synthetic within-topic noise")
+    ap.add_argument("--queries", type=int, default=500)
+    ap.add_argument("--k", type=int, default=16, help="prefetch size (2*TOP_K)")
+    ap.add_argument("--nlist", type=int, default=0)
+    ap.add_argument("--nprobe", type=int, default=16)
+    ap.add_argument("--noise", type=float, default=0.05)
+    ap.add_argument("--seed", type=int, default=0)
+    run(ap.parse_args())
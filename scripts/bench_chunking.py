@@ -0,0 +1,106 @@
+# Whole-file KB documents vs heading-aware token chunks (retrieval/chunking.py).
+# Offline (default): a synthetic markdown corpus (long files, nested headings, one "fact" sentence per
+# section) indexed with BM25 both ways; for questions about a fact, report the prompt context tokens of the
+# top-k results, whether the fact made it into them, and chunking throughput inline vs in a process pool.
+# With --api URL: send --kb questions to the running /ask (explain mode, so the answer cache is bypassed and
+# contexts are returned) and report latency and context tokens; run once before and once after re-ingesting
+# with chunking (--label before / --label after).
+# Run from the repo root (retrieval/ is imported from there): python -m scripts.bench_chunking
+import json, argparse, glob, os, random, statistics, tempfile, time
+
+from retrieval.bm25 import BM25Index
+from retrieval.chunking import count_tokens, iter_chunks
+
+WORDS = ("trace span metric agent collector exporter pipeline sampler latency budget cache index "
+         "vector embedding prompt token model service queue batch retry window shard replica").split()
+
+def make_corpus(root, files, sections, paras, seed):
+    rnd = random.Random(seed)
+    facts = []
+    for f in range(files):
+        lines = [f"# Handbook {f}"]
+        for s in range(sections):
+            lines.append(f"\n## Topic {f}.{s}\n")
+            fact_at = rnd.randrange(paras)
+            for p in range(paras):
+                body = " ".join(rnd.choices(WORDS, k=rnd.randint(40, 90))) + "."
+                if p == fact_at:
+                    code = f"K{f}x{s}q{rnd.randint(1000, 9999)}"
+                    facts.append((f"What is the setting code for topic {f}.{s}?", code))
+                    body += f" The setting code for topic {f}.{s} is {code}."
+                lines.append(body + "\n")
+        with open(os.path.join(root, f"{f:03d}.md"), "w", encoding="utf-8") as fh:
+            fh.write("\n".join(lines))
+    return facts
+
+def evaluate(index, texts, facts, top_k, tokenizer):
+    ctx_tokens, hits = [], 0
+    for q, code in facts:
+        top = [texts[d] for d, _ in index.search(q, top_k)]
+        ctx_tokens.append(sum(count_tokens(t, tokenizer) for t in top))
+        hits += any(code in t for t in top)
+    return {"docs": len(texts), "context_tokens_mean": round(statistics.mean(ctx_tokens), 1),
+            "context_tokens_max": max(ctx_tokens), "fact_in_context": round(hits / len(facts), 3)}
+
+def offline(args):
+    with tempfile.TemporaryDirectory() as root:
+        facts = make_corpus(root, args.files, args.sections, args.paras, args.seed)
+        files = [(p, os.path.basename(p)) for p in sorted(glob.glob(os.path.join(root, "*.md")))]
+        report = {"files": len(files), "questions": len(facts), "top_k": args.top_k,
+                  "window": args.window, "overlap": args.overlap, "tokenizer": args.tokenizer}
+
+        whole = {}
+        for p, src in files:
+            with open(p, encoding="utf-8") as fh:
+                whole[src] = fh.read()
+        idx = BM25Index()
+        idx.upsert_many((d, t, None) for d, t in whole.items())
+        report["whole_file"] = evaluate(idx, whole, facts, args.top_k, args.tokenizer)
+
+        for procs in (1, args.processes):
+            t0 = time.perf_counter()
+            chunks = list(iter_chunks(files, args.window, args.overlap, args.tokenizer, processes=procs))
+            report[f"chunking_s_processes_{procs}"] = round(time.perf_counter() - t0, 3)
+        texts = {c["id"]: c["text"] for c in chunks}
+        idx = BM25Index()
+        idx.upsert_many((c["id"], c["text"], c["metadata"]) for c in chunks)
+        report["chunked"] = evaluate(idx, texts, facts, args.top_k, args.tokenizer)
+    print(json.dumps(report, indent=2))
+
+def online(args):
+    import requests
+    questions = [l.strip() for l in open(args.questions, encoding="utf-8") if l.strip()] if args.questions else \
+        ["What services make up the architecture?", "How do requests flow through the system?",
+         "What is the vector store?", "What does the text-embedder do?"]
+    lat, ctx_tokens = [], []
+    with requests.Session() as s:
+        for _ in range(args.rounds):
+            for q in questions:
+                t0 = time.perf_counter()
+                r = s.post(f"{args.api}/ask", json={"question": q, "top_k": args.top_k, "explain": True}, timeout=300)
+                lat.append(time.perf_counter() - t0)
+                r.raise_for_status()
+                ctx_tokens.append(sum(count_tokens(c, args.tokenizer) for c in r.json().get("contexts") or []))
+    lat.sort()
+    print(json.dumps({"label": args.label, "requests": len(lat), "top_k": args.top_k,
+                      "context_tokens_mean": round(statistics.mean(ctx_tokens), 1),
+                      "p50_ms": round(statistics.median(lat) * 1000, 1),
+                      "p95_ms": round(lat[max(0, int(len(lat) * 0.95) - 1)] * 1000, 1)}, indent=2))
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--api", help="e.g. http://localhost:8000 (omit for the offline benchmark)")
+    ap.add_argument("--label", default="")
+    ap.add_argument("--questions", help="file with one question per line (online mode)")
+    ap.add_argument("--rounds", type=int, default=3)
+    ap.add_argument("--files", type=int, default=40)
+    ap.add_argument("--sections", type=int, default=8)
+    ap.add_argument("--paras", type=int, default=6)
+    ap.add_argument("--top-k", type=int, default=4)
+    ap.add_argument("--window", type=int, default=200)
+    ap.add_argument("--overlap", type=int, default=32)
+    ap.add_argument("--tokenizer", default="regex")
+    ap.add_argument("--processes", type=int, default=4)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    online(args) if args.api else offline(args)
@@ -0,0 +1,87 @@
+# Text-embedder throughput under concurrency: one encode() per request vs the EncodeQueue dynamic batcher.
+# Without --model the encoder is simulated as a fixed per-call overhead plus a per-token cost on the padded
+# batch (batch size x longest text), with one forward pass at a time; --model loads a real SentenceTransformer.
+# Workload: --query-ratio of requests are single short queries, the rest are ingest-style chunk batches.
+# Run from the repo root (lab2-rag is imported through the lab2_rag alias): python -m scripts.bench_embed_batch
+import json, argparse, random, statistics, threading, time
+
+import numpy as np
+
+from lab2_rag.text_embedder.batcher import EncodeQueue
+
+def simulated_encoder(overhead_ms, per_token_us, dim=384):
+    lock = threading.Lock()  # one model instance -> one forward pass at a time
+    def encode(texts):
+        padded = len(texts) * max(len(t) for t in texts) / 4  # ~4 chars per token
+        with lock:
+            time.sleep((overhead_ms * 1000 + per_token_us * padded) / 1e6)
+        return np.zeros((len(texts), dim), dtype=np.float32)
+    return encode
+
+def make_requests(n, query_ratio, seed):
+    rnd = random.Random(seed)
+    reqs = []
+    for _ in range(n):
+        if rnd.random() < query_ratio:
+            reqs.append(["how does the collector export traces " + "x" * rnd.randint(0, 40)])
+        else:
+            reqs.append(["chunk " + "y" * rnd.randint(400, 1200) for _ in range(rnd.randint(4, 12))])
+    return reqs
+
+def load(encode, requests, concurrency):
+    lat, lock, it = [], threading.Lock(), iter(requests)
+    def worker():
+        while True:
+            with lock:
+                texts = next(it, None)
+            if texts is None:
+                return
+            t0 = time.perf_counter()
+            encode(texts)
+            with lock:
+                lat.append(time.perf_counter() - t0)
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    t0 = time.perf_counter()
+    for t in threads: t.start()
+    for t in threads: t.join()
+    wall = time.perf_counter() - t0
+    lat.sort()
+    return {"requests_per_s": round(len(lat) / wall, 1),
+            "texts_per_s": round(sum(len(r) for r in requests) / wall, 1),
+            "p50_ms": round(statistics.median(lat) * 1000, 1),
+            "p99_ms": round(lat[max(0, int(len(lat) * 0.99) - 1)] * 1000, 1)}
+
+def run(args):
+    if args.model:
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(args.model)
+        encode = lambda texts: model.encode(texts, batch_size=max(len(texts), 1), normalize_embeddings=True)
+    else:
+        encode = simulated_encoder(args.overhead_ms, args.per_token_us)
+    requests = make_requests(args.requests, args.query_ratio, args.seed)
+
+    report = {"concurrency": args.concurrency, "requests": args.requests, "query_ratio": args.query_ratio,
+              "model": args.model or f"simulated({args.overhead_ms}ms + {args.per_token_us}us/padded token)"}
+    report["direct"] = load(encode, requests, args.concurrency)
+    sizes = []
+    q = EncodeQueue(encode, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms,
+                    buckets=[int(b) for b in args.buckets.split(",")],
+                    on_batch=lambda bucket, n, s: sizes.append(n))
+    report["batched"] = load(q.encode, requests, args.concurrency)
+    report["batched"]["mean_batch_size"] = round(statistics.mean(sizes), 1) if sizes else 0.0
+    q.close()
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model", help="real model, e.g. sentence-transformers/all-MiniLM-L6-v2")
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--requests", type=int, default=400)
+    ap.add_argument("--query-ratio", type=float, default=0.8)
+    ap.add_argument("--max-batch", type=int, default=64)
+    ap.add_argument("--max-wait-ms", type=float, default=5)
+    ap.add_argument("--buckets", default="64,256,1024")
+    ap.add_argument("--overhead-ms", type=float, default=8)
+    ap.add_argument("--per-token-us", type=float, default=20)
+    ap.add_argument("--seed", type=int, default=0)
+    run(ap.parse_args())
@@ -0,0 +1,68 @@
+# /embed wire formats: JSON float lists vs the binary float32 / float16 / int8 payloads (retrieval/embed_wire.py).
+# Offline (default): encode + decode a synthetic batch and report payload size, server encode time, client
+# decode time and int8/float16 error. With --embedder URL: embed the KB chunks through the running service in
+# --batch sized requests once per format and report bytes on the wire and end-to-end time.
+# Run from the repo root (retrieval/ is imported from there): python -m scripts.bench_embed_wire
+import json, argparse, glob, os, statistics, time
+
+import numpy as np
+
+from retrieval import embed_wire
+
+FORMATS = ["json", "float32", "float16", "int8"]
+
+def offline(args):
+    rnd = np.random.default_rng(0)
+    x = rnd.normal(size=(args.rows, args.dim)).astype(np.float32)
+    x /= np.linalg.norm(x, axis=1, keepdims=True)
+    report = {"rows": args.rows, "dim": args.dim}
+    for fmt in FORMATS:
+        enc, dec = [], []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            body = json.dumps({"embeddings": x.tolist()}).encode() if fmt == "json" else embed_wire.encode(x, fmt)
+            t1 = time.perf_counter()
+            got = np.asarray(json.loads(body)["embeddings"], dtype=np.float32) if fmt == "json" else embed_wire.decode(body)
+            t2 = time.perf_counter()
+            enc.append(t1 - t0)
+            dec.append(t2 - t1)
+        report[fmt] = {"bytes": len(body), "bytes_per_vector": round(len(body) / args.rows, 1),
+                       "encode_ms": round(statistics.median(enc) * 1000, 3),
+                       "decode_ms": round(statistics.median(dec) * 1000, 3),
+                       "max_abs_error": float(np.abs(got.astype(np.float32) - x).max())}
+    print(json.dumps(report, indent=2))
+
+def online(args):
+    import requests
+    texts = []
+    for path in sorted(glob.glob(os.path.join(args.kb, "*.md"))):
+        with open(path, encoding="utf-8") as f:
+            body = f.read()
+        texts += [body[i:i + 800] for i in range(0, len(body), 800)]
+    texts = (texts * (args.rows // max(len(texts), 1) + 1))[:args.rows]
+    report = {"texts": len(texts), "batch": args.batch, "embedder": args.embedder}
+    with requests.Session() as s:
+        for fmt in FORMATS:
+            headers = {} if fmt == "json" else {"Accept": embed_wire.content_type(fmt)}
+            wire, t0 = 0, time.perf_counter()
+            for i in range(0, len(texts), args.batch):
+                r = s.post(f"{args.embedder}/embed", json={"texts": texts[i:i + args.batch]}, headers=headers, timeout=120)
+                r.raise_for_status()
+                wire += len(r.content)
+                if r.headers.get("Content-Type", "").startswith(embed_wire.MEDIA_TYPE):
+                    embed_wire.decode(r.content)
+                else:
+                    np.asarray(r.json()["embeddings"], dtype=np.float32)
+            report[fmt] = {"response_bytes": wire, "ingest_s": round(time.perf_counter() - t0, 3)}
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--embedder", help="e.g. http://localhost:5001 (omit for the offline codec benchmark)")
+    ap.add_argument("--kb", default="./kb_data/docs")
+    ap.add_argument("--rows", type=int, default=2000)
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--batch", type=int, default=64)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+    online(args) if args.embedder else offline(args)
@@ -0,0 +1,81 @@
+# services/text-embedder: the old per-call SHA-256 loop (to_vec) vs the vectorized HashingEmbedder.
+# Throughput: one text per call (/embed) and --batch texts per call (/embed_batch), plus the same word/char
+# n-gram features hashed in a plain Python loop (what the vectorization saves). Quality: a synthetic
+# corpus; each query is a 6-word run from one document with one word swapped for a random one, and recall@k
+# is how often that document ranks in the top k by cosine (a SHA-256 vector carries no lexical signal).
+# Run from the repo root (retrieval/ is imported from there): python -m scripts.bench_hash_embed
+import json, argparse, hashlib, math, random, time, zlib
+
+import numpy as np
+
+from retrieval.hash_embed import HashingEmbedder
+
+def to_vec(s, dim=128):  # services/text-embedder before the hashing embedder
+    h = hashlib.sha256(s.encode()).digest()
+    vals = [h[i % len(h)] / 255.0 for i in range(dim)]
+    n = math.sqrt(sum(v * v for v in vals)) or 1.0
+    return [v / n for v in vals]
+
+def ngram_loop(texts, dim, char_weight=0.5):  # same features as HashingEmbedder, one feature at a time
+    out = []
+    for t in texts:
+        v = [0.0] * dim
+        norm = HashingEmbedder.normalize(t)
+        feats = [(norm[i:i + k], char_weight) for k in range(3, 6) for i in range(len(norm) - k + 1)]
+        words = norm.split()
+        feats += [(w, 1.0) for w in words] + [(a + " " + b, 1.0) for a, b in zip(words, words[1:])]
+        for f, w in feats:
+            h = zlib.crc32(f.encode())
+            v[h % dim] += -w if h & 0x80000000 else w
+        n = math.sqrt(sum(x * x for x in v)) or 1.0
+        out.append([x / n for x in v])
+    return np.asarray(out, dtype=np.float32)
+
+def corpus(n_docs, vocab, seed):
+    rnd = random.Random(seed)
+    words = ["".join(rnd.choices("abcdefghijklmnopqrstuvwxyz", k=rnd.randint(3, 9))) for _ in range(vocab)]
+    docs = [" ".join(rnd.choices(words, k=rnd.randint(40, 120))) for _ in range(n_docs)]
+    queries = []
+    for i in rnd.sample(range(n_docs), min(200, n_docs)):
+        w = docs[i].split()
+        s = rnd.randrange(len(w) - 6)
+        q = w[s:s + 6]
+        q[rnd.randrange(6)] = rnd.choice(words)
+        queries.append((i, " ".join(q)))
+    return docs, queries
+
+def throughput(fn, texts, per_call):
+    t0 = time.perf_counter()
+    for i in range(0, len(texts), per_call):
+        fn(texts[i:i + per_call])
+    return round(len(texts) / (time.perf_counter() - t0), 1)
+
+def recall(doc_vecs, query_vecs, targets, k):
+    sims = query_vecs @ doc_vecs.T
+    top = np.argsort(-sims, axis=1)[:, :k]
+    return round(float(np.mean([t in row for t, row in zip(targets, top)])), 3)
+
+def run(args):
+    docs, queries = corpus(args.docs, args.vocab, args.seed)
+    emb = HashingEmbedder(dim=args.dim)
+    legacy = lambda texts: np.asarray([to_vec(t, args.dim) for t in texts], dtype=np.float32)
+    report = {"docs": len(docs), "dim": args.dim, "batch": args.batch, "texts_per_s": {
+        "sha256_loop": throughput(legacy, docs, 1),
+        "ngram_python_loop": throughput(lambda t: ngram_loop(t, args.dim), docs, 1),
+        "hashing_single": throughput(emb.encode, docs, 1),
+        "hashing_batch": throughput(emb.encode, docs, args.batch)}}
+    targets = [i for i, _ in queries]
+    qtexts = [q for _, q in queries]
+    report[f"recall@{args.k}"] = {"sha256_loop": recall(legacy(docs), legacy(qtexts), targets, args.k),
+                                  "hashing": recall(emb.encode(docs), emb.encode(qtexts), targets, args.k)}
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--docs", type=int, default=2000)
+    ap.add_argument("--vocab", type=int, default=5000)
+    ap.add_argument("--dim", type=int, default=256)
+    ap.add_argument("--batch", type=int, default=256)
+    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--seed", type=int, default=0)
+    run(ap.parse_args())
@@ -0,0 +1,89 @@
+# workshop_app.llm_client: a new OpenAI(...) client per call (the old chat() path) vs the pooled
+# get_client() registry. A local stand-in OpenAI-compatible server answers /chat/completions with a
+# canned body after --server-ms and counts the TCP connections it accepts. Each mode makes --calls
+# requests from --concurrency threads. Per-call latency is client-side wall time including getting the
+# client, so the difference is client construction (SSL context, httpx pool) + connection setup; the
+# server is plain HTTP, a TLS endpoint adds its handshake on top.
+# Run from the repo root (workshop_app/ is imported from there): python -m scripts.bench_llm_client
+import json, argparse, statistics, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from openai import OpenAI
+
+from workshop_app.llm_client import PoolConfig, close_clients, get_client
+
+BODY = json.dumps({
+    "id": "chatcmpl-bench", "object": "chat.completion", "created": 0, "model": "bench",
+    "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "ok"}}],
+    "usage": {"prompt_tokens": 12, "completion_tokens": 1, "total_tokens": 13},
+}).encode()
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True  # headers and body go out in two writes
+    server_ms = 0.0
+    connections = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with Handler.lock:
+            Handler.connections += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.server_ms:
+            time.sleep(self.server_ms / 1000)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *_):
+        pass
+
+def call(make_client):
+    t = time.perf_counter()
+    make_client().chat.completions.create(model="bench", messages=[{"role": "user", "content": "ping"}],
+                                          temperature=0.2)
+    return (time.perf_counter() - t) * 1000
+
+def run_mode(name, make_client, calls, concurrency):
+    Handler.connections = 0
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        lat = list(pool.map(lambda _: call(make_client), range(calls)))
+    wall = time.perf_counter() - t0
+    lat.sort()
+    return {"mode": name, "calls": calls, "concurrency": concurrency,
+            "mean_ms": round(statistics.fmean(lat), 3), "p50_ms": round(lat[len(lat) // 2], 3),
+            "p95_ms": round(lat[int(len(lat) * 0.95) - 1], 3), "calls_per_s": round(calls / wall, 1),
+            "connections_opened": Handler.connections}
+
+def run(args):
+    Handler.server_ms = args.server_ms
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{srv.server_address[1]}/v1"
+    cfg = PoolConfig(max_connections=max(args.concurrency, 1), max_keepalive=max(args.concurrency, 1))
+    modes = {
+        "client_per_call": lambda: OpenAI(api_key="bench", base_url=base),
+        "pooled": lambda: get_client(base, "bench", cfg),
+    }
+    call(modes["pooled"])  # imports / first connection out of the way for both modes
+    report = [run_mode(name, make, args.calls, c) for c in sorted({1, args.concurrency}) for name, make in modes.items()]
+    close_clients()
+    srv.shutdown()
+    mean = {(r["mode"], r["concurrency"]): r["mean_ms"] for r in report}
+    saved = {str(c): round(mean["client_per_call", c] - mean["pooled", c], 3) for c in sorted({1, args.concurrency})}
+    print(json.dumps({"server_ms": args.server_ms, "results": report, "saved_ms_per_call": saved}, indent=2))
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--calls", type=int, default=500)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--server-ms", type=float, default=0.0)
+    run(ap.parse_args())
@@ -0,0 +1,131 @@
+# Time-to-first-token of two prompt layouts (default: v1, context before the rules, vs v3, every fixed
+# instruction in the system message and context + question last) against an OpenAI-compatible server.
+# Each request packs --k passages as context with a question about one of them. The workshop KB is
+# only a few chunks, so passages are --passage-words words drawn at random from its vocabulary: every
+# request's context differs, as retrieved context does across real queries, and only the static part
+# of a prompt can be served from the server's KV prefix cache. Per layout,
+# one warm-up request is followed by --requests measured ones, streamed; TTFT is the time to the first
+# content delta. Layouts run one after the other so one layout's cache entries don't evict the other's.
+#
+# --base-url points at a real server (Ollama: http://localhost:11434/v1, vLLM with
+# --enable-prefix-caching). --simulate starts a local stand-in instead: prefill costs --prefill-ms per
+# token that misses a 16-token-block prefix cache (vLLM-style), so the layout effect can be checked
+# without a GPU. Simulated numbers show the mechanism, not any particular server's speed.
+# Run from the repo root (lab2-rag is imported through the lab2_rag alias): python -m scripts.bench_prompt_prefix
+import json, argparse, glob, hashlib, os, random, re, statistics, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from openai import OpenAI
+
+from retrieval.chunking import iter_chunks
+from retrieval.context_pack import ContextPacker
+from lab2_rag.api.prompts import check_prefix, get_prompt, get_system
+
+SYSTEM_PROMPT = "Answer using only the provided CONTEXT."  # lab2 app.SYSTEM_PROMPT (for v1 / v2)
+BLOCK = 16
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]|\s+")
+
+class StandIn(BaseHTTPRequestHandler):
+    """Streaming /chat/completions with a block-level prefix cache and per-token prefill cost."""
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    prefill_ms = 0.2
+    blocks = set()
+    lock = threading.Lock()
+    cached_tokens = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        text = "".join(f"<|{m['role']}|>{m['content']}" for m in body["messages"])
+        toks = _TOKEN_RE.findall(text)
+        h, hit, chain = hashlib.sha256(), 0, True
+        with StandIn.lock:
+            for end in range(BLOCK, len(toks) + 1, BLOCK):
+                h.update("\x00".join(toks[end - BLOCK:end]).encode())
+                key = h.hexdigest()
+                if chain and key in StandIn.blocks:
+                    hit = end
+                else:
+                    chain = False
+                    StandIn.blocks.add(key)
+            StandIn.cached_tokens.append(hit)
+        time.sleep((len(toks) - hit) * StandIn.prefill_ms / 1000)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for t in ("I'm", " not", " sure", "."):
+            chunk = {"id": "x", "object": "chat.completion.chunk", "created": 0, "model": body["model"],
+                     "choices": [{"index": 0, "delta": {"content": t}, "finish_reason": None}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+    def log_message(self, *_):
+        pass
+
+def requests_for(chunks, n, k, words, budget, seed):
+    rnd, packer = random.Random(seed), ContextPacker(budget)
+    vocab = sorted({w for c in chunks for w in re.findall(r"[A-Za-z][\w-]+", c["text"])})
+    out = []
+    for _ in range(n):
+        passages = [" ".join(rnd.choices(vocab, k=words)) + "." for _ in range(k)]
+        topic = " ".join(rnd.sample(vocab, 2))
+        out.append((f"What does the context say about {topic}?", packer.pack(passages).text))
+    return out
+
+def ttft(client, model, pv, q, ctx):
+    messages = [{"role": "system", "content": get_system(pv, SYSTEM_PROMPT)},
+                {"role": "user", "content": get_prompt(pv, q, ctx)}]
+    t = time.perf_counter()
+    for chunk in client.chat.completions.create(model=model, messages=messages, temperature=0, stream=True,
+                                                max_tokens=8):
+        if chunk.choices and chunk.choices[0].delta.content:
+            first = time.perf_counter() - t
+            break
+    else:
+        first = time.perf_counter() - t
+    return first * 1000
+
+def run(args):
+    files = [(p, os.path.relpath(p, args.kb)) for p in sorted(glob.glob(os.path.join(args.kb, "**", "*.md"), recursive=True))]
+    chunks = list(iter_chunks(files))
+    base = args.base_url
+    if args.simulate:
+        StandIn.prefill_ms = args.prefill_ms
+        srv = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+        srv.daemon_threads = True
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+        base = f"http://127.0.0.1:{srv.server_address[1]}/v1"
+    client = OpenAI(base_url=base, api_key=os.getenv("OPENAI_API_KEY") or "bench", max_retries=0)
+    report = {"server": "simulated" if args.simulate else base, "model": args.model, "kb_chunks": len(chunks),
+              "context_budget_tokens": args.budget, "layouts": []}
+    for i, pv in enumerate((args.old, args.new)):
+        reqs = requests_for(chunks, args.requests + 1, args.k, args.passage_words, args.budget, args.seed + i)
+        StandIn.cached_tokens = []
+        lat = [ttft(client, args.model, pv, q, ctx) for q, ctx in reqs][1:]  # first request warms the prefix
+        row = {**check_prefix(pv, SYSTEM_PROMPT), "ttft_mean_ms": round(statistics.fmean(lat), 2),
+               "ttft_p50_ms": round(statistics.median(lat), 2), "ttft_p95_ms": round(sorted(lat)[int(len(lat) * 0.95) - 1], 2)}
+        if args.simulate:
+            row["cached_prefix_tokens_mean"] = round(statistics.fmean(StandIn.cached_tokens[1:]), 1)
+        report["layouts"].append(row)
+    old, new = report["layouts"]
+    report["ttft_saved_ms_mean"] = round(old["ttft_mean_ms"] - new["ttft_mean_ms"], 2)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--base-url", default=os.getenv("OPENAI_BASE_URL", "http://localhost:11434/v1"))
+    ap.add_argument("--model", default=os.getenv("MODEL_NAME", "llama3.1"))
+    ap.add_argument("--old", default="v1")
+    ap.add_argument("--new", default="v3")
+    ap.add_argument("--kb", default="kb_data")
+    ap.add_argument("--requests", type=int, default=30)
+    ap.add_argument("--k", type=int, default=4)
+    ap.add_argument("--budget", type=int, default=1536)
+    ap.add_argument("--passage-words", type=int, default=120)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--simulate", action="store_true")
+    ap.add_argument("--prefill-ms", type=float, default=0.2)
+    run(ap.parse_args())
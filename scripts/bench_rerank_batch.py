@@ -0,0 +1,67 @@
+# Rerank throughput under concurrency: per-request compute_score vs the cross-request RerankBatcher.
+# Without --model the cross-encoder is simulated as a fixed per-call overhead plus a per-pair cost
+# (sleep releases the GIL the way a real forward pass does); --model loads a real FlagReranker.
+# Run from the repo root (lab2-rag is imported through the lab2_rag alias): python -m scripts.bench_rerank_batch
+import json, argparse, statistics, threading, time
+
+from lab2_rag.api.rerank_batcher import RerankBatcher, as_score_list
+
+def simulated_scorer(overhead_ms, per_pair_ms):
+    lock = threading.Lock()  # one model instance -> one forward pass at a time
+    def score(pairs, batch_size=None):
+        with lock:
+            time.sleep((overhead_ms + per_pair_ms * len(pairs)) / 1000.0)
+        return [float(len(p[1]) % 7) for p in pairs]
+    return score
+
+def load(score_fn, concurrency, requests_per_worker, pairs_per_request):
+    pairs = [("what does the collector export?", f"passage {i} about tempo and loki") for i in range(pairs_per_request)]
+    lat = []
+    lat_lock = threading.Lock()
+    def worker():
+        for _ in range(requests_per_worker):
+            t0 = time.perf_counter()
+            score_fn(pairs)
+            with lat_lock:
+                lat.append(time.perf_counter() - t0)
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    t0 = time.perf_counter()
+    for t in threads: t.start()
+    for t in threads: t.join()
+    wall = time.perf_counter() - t0
+    lat.sort()
+    return {"requests_per_s": round(len(lat) / wall, 1),
+            "p50_ms": round(statistics.median(lat) * 1000, 1),
+            "p99_ms": round(lat[int(len(lat) * 0.99) - 1] * 1000, 1)}
+
+def run(args):
+    if args.model:
+        from FlagEmbedding import FlagReranker
+        model = FlagReranker(args.model, use_fp16=True)
+        raw = model.compute_score
+    else:
+        raw = simulated_scorer(args.overhead_ms, args.per_pair_ms)
+
+    report = {"concurrency": args.concurrency, "pairs_per_request": args.pairs,
+              "model": args.model or f"simulated({args.overhead_ms}ms + {args.per_pair_ms}ms/pair)"}
+    report["direct"] = load(lambda p: as_score_list(raw(p, batch_size=args.pairs)),
+                            args.concurrency, args.requests, args.pairs)
+    fills = []
+    batcher = RerankBatcher(lambda p: raw(p, batch_size=args.max_batch), max_batch=args.max_batch,
+                            max_wait_ms=args.max_wait_ms, on_batch=lambda n, fill, waits: fills.append(fill))
+    report["batched"] = load(batcher.score, args.concurrency, args.requests, args.pairs)
+    report["batched"]["mean_fill_ratio"] = round(statistics.mean(fills), 3) if fills else 0.0
+    batcher.close()
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model", help="real FlagReranker model, e.g. BAAI/bge-reranker-large")
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--requests", type=int, default=20, help="requests per worker")
+    ap.add_argument("--pairs", type=int, default=8, help="pairs per request (top_k)")
+    ap.add_argument("--max-batch", type=int, default=64)
+    ap.add_argument("--max-wait-ms", type=float, default=5)
+    ap.add_argument("--overhead-ms", type=float, default=20)
+    ap.add_argument("--per-pair-ms", type=float, default=1.5)
+    run(ap.parse_args())
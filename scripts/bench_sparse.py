@@ -0,0 +1,90 @@
+# Sparse retrieval benchmark: partial_ratio rescoring of the dense prefetch vs BM25 inverted index + RRF.
+# Synthetic corpus; the "dense" retriever is simulated as a window that contains the target doc
+# only with probability --dense-hit (keyword-only matches fall outside it otherwise).
+# Run from the repo root (retrieval/ is imported from there): python -m scripts.bench_sparse
+import json, argparse, random, statistics, string, time
+
+from retrieval.bm25 import BM25Index, rrf_fuse
+
+try:
+    from rapidfuzz import fuzz
+except Exception:
+    fuzz = None
+
+def make_corpus(n_docs, vocab_size, doc_len, seed):
+    rnd = random.Random(seed)
+    vocab = ["".join(rnd.choices(string.ascii_lowercase, k=rnd.randint(4, 9))) for _ in range(vocab_size)]
+    docs = {f"doc-{i}": " ".join(rnd.choices(vocab, k=doc_len)) for i in range(n_docs)}
+    return docs, vocab
+
+def make_queries(docs, n_queries, terms, seed):
+    rnd = random.Random(seed + 1)
+    ids = list(docs)
+    out = []
+    for _ in range(n_queries):
+        target = rnd.choice(ids)
+        words = docs[target].split()
+        out.append((target, " ".join(rnd.sample(words, k=min(terms, len(words))))))
+    return out
+
+def dense_window(rnd, ids, target, prefetch, hit_rate):
+    window = rnd.sample(ids, k=prefetch)
+    if target in window: window.remove(target)
+    if rnd.random() < hit_rate:
+        window.insert(rnd.randrange(len(window) + 1), target)
+    return window[:prefetch]
+
+def p(values, q):
+    return statistics.quantiles(values, n=100)[q - 1] if len(values) >= 2 else (values[0] if values else 0.0)
+
+def run(args):
+    docs, _ = make_corpus(args.docs, args.vocab, args.doc_len, args.seed)
+    queries = make_queries(docs, args.queries, args.terms, args.seed)
+    ids = list(docs)
+    prefetch = max(args.top_k * 2, args.top_k + 2)
+
+    t0 = time.perf_counter()
+    idx = BM25Index()
+    idx.upsert_many((i, t, None) for i, t in docs.items())
+    build_s = time.perf_counter() - t0
+
+    rnd = random.Random(args.seed + 2)
+    windows = [dense_window(rnd, ids, target, prefetch, args.dense_hit) for target, _ in queries]
+    report = {"docs": args.docs, "queries": args.queries, "top_k": args.top_k, "prefetch": prefetch,
+              "dense_hit_rate": args.dense_hit, "bm25_build_s": round(build_s, 3)}
+
+    if fuzz:
+        lat, hits = [], 0
+        for (target, q), window in zip(queries, windows):
+            t1 = time.perf_counter()
+            scored = sorted(window, key=lambda i: fuzz.partial_ratio(q.lower(), docs[i].lower()), reverse=True)
+            lat.append(time.perf_counter() - t1)
+            hits += target in scored[:args.top_k]
+        report["partial_ratio"] = {"recall@k": round(hits / len(queries), 3),
+                                   "p50_ms": round(p(lat, 50) * 1000, 3), "p99_ms": round(p(lat, 99) * 1000, 3)}
+    else:
+        report["partial_ratio"] = "skipped (rapidfuzz not installed)"
+
+    lat, hits = [], 0
+    for (target, q), window in zip(queries, windows):
+        t1 = time.perf_counter()
+        sparse = [i for i, _ in idx.search(q, prefetch)]
+        fused = [i for i, _ in rrf_fuse(window, sparse, k=args.rrf_k)]
+        lat.append(time.perf_counter() - t1)
+        hits += target in fused[:args.top_k]
+    report["bm25_rrf"] = {"recall@k": round(hits / len(queries), 3),
+                          "p50_ms": round(p(lat, 50) * 1000, 3), "p99_ms": round(p(lat, 99) * 1000, 3)}
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--docs", type=int, default=5000)
+    ap.add_argument("--vocab", type=int, default=20000)
+    ap.add_argument("--doc-len", type=int, default=200)
+    ap.add_argument("--queries", type=int, default=500)
+    ap.add_argument("--terms", type=int, default=3)
+    ap.add_argument("--top-k", type=int, default=8)
+    ap.add_argument("--dense-hit", type=float, default=0.5)
+    ap.add_argument("--rrf-k", type=int, default=60)
+    ap.add_argument("--seed", type=int, default=7)
+    run(ap.parse_args())
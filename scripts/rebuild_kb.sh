@@ -1,3 +1,14 @@
 #!/usr/bin/env bash
 set -euo pipefail
-curl -s -X POST http://localhost:5002/rebuild | jq .
+# blue/green rebuild: starts (or resumes) filling a shadow collection, then polls until the alias switches
+KB=${KB_URL:-http://localhost:5002}
+curl -s -X POST "$KB/rebuild" | jq -c .
+while true; do
+  st=$(curl -s "$KB/rebuild/status")
+  echo "$st" | jq -c '{status, collection, progress, embedded, skipped}'
+  case $(echo "$st" | jq -r .status) in
+    done) echo "$st" | jq .; exit 0 ;;
+    failed|interrupted) echo "$st" | jq .; exit 1 ;;
+  esac
+  sleep 2
+done
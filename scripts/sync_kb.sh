@@ -0,0 +1,6 @@
+#!/usr/bin/env bash
+set -euo pipefail
+# incremental: only new/changed chunks are embedded; pass --full to re-embed everything
+full=false
+[[ "${1:-}" == "--full" ]] && full=true
+curl -s -X POST "http://localhost:5002/sync?full=${full}" | jq .
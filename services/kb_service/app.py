@@ -1,10 +1,16 @@
-import os,glob,json,requests
-from fastapi import FastAPI
+import os,glob,json,argparse,threading,requests
+from typing import Optional
+from fastapi import FastAPI,HTTPException
 from ddtrace import patch
 from pydantic import BaseModel
 
 import chromadb
 from chromadb.config import Settings
+from retrieval.kb_version import bump_kb_version
+from retrieval.kb_sync import Manifest,SyncPlan
+from retrieval.kb_alias import CollectionAlias
+from retrieval import embed_wire
+from rebuild import BlueGreenRebuilder,RebuildRunning,embed_upsert
 from opentelemetry import trace
 from opentelemetry.sdk.trace import TracerProvider
 from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
@@ -20,54 +26,113 @@ CHROMA_DIR=os.getenv("CHROMA_DIR","/chroma")
 KB_PATH=os.getenv("KB_PATH","/workspace/kb_data")
 RAW_PATH=os.getenv("RAW_PATH","/workspace/data")
 EMBEDDER=os.getenv("EMBEDDER_URL","http://text-embedder:5001/embed")
+EMBEDDER_BATCH=os.getenv("EMBEDDER_BATCH_URL",f"{EMBEDDER}_batch")  # many texts per call, binary float32 reply
+CHUNK_TOKENS=int(os.getenv("CHUNK_TOKENS","200"))
+CHUNK_OVERLAP=int(os.getenv("CHUNK_OVERLAP","32"))
+CHUNK_TOKENIZER=os.getenv("CHUNK_TOKENIZER","regex")  # or a HF tokenizer name (needs `tokenizers`)
+CHUNK_PROCESSES=int(os.getenv("CHUNK_PROCESSES","2"))
+MANIFEST_PATH=os.getenv("KB_MANIFEST",f"{CHROMA_DIR}/kb_manifest.json")
+KB_ALIAS_PATH=os.getenv("KB_ALIAS_PATH",f"{CHROMA_DIR}/kb_alias.json")  # names the live collection (rag-api follows it)
+REBUILD_STATE=os.getenv("REBUILD_STATE",f"{CHROMA_DIR}/kb_rebuild.json")
+REBUILD_WORKERS=int(os.getenv("REBUILD_WORKERS","8"))  # concurrent embed+upsert batches
+REBUILD_BATCH=int(os.getenv("REBUILD_BATCH","32"))
+REBUILD_GC_DELAY_S=float(os.getenv("REBUILD_GC_DELAY_S","30"))  # old collection outlives the switch this long
+REBUILD_RESUME_ON_START=os.getenv("REBUILD_RESUME_ON_START","1")=="1"
 
-client=chromadb.PersistentClient(path=CHROMA_DIR,settings=Settings(allow_reset=True,anonymized_telemetry=False))
-col=client.get_or_create_collection("kb")
+client=chromadb.PersistentClient(path=CHROMA_DIR,settings=Settings(allow_reset=False,anonymized_telemetry=False))
+alias=CollectionAlias(KB_ALIAS_PATH,"kb")
+col=alias.collection(client)
 
-class RebuildResp(BaseModel):
+sync_lock=threading.Lock()  # /sync and a rebuild's switch both write the live collection and the manifest
+
+class SyncResp(BaseModel):
     added:int
-def read_sources():
+    updated:int
+    deleted:int
+    skipped:int
+    kb_version:Optional[str]=None
+
+def source_paths():
     paths=glob.glob(f"{KB_PATH}/**/*",recursive=True)+glob.glob(f"{RAW_PATH}/**/*",recursive=True)
-    out=[]
-    for p in paths:
-        if os.path.isfile(p):
-            try:
-                with open(p,"r",encoding="utf-8",errors="ignore") as f:
-                    text=f.read()
-                if text.strip():
-                    out.append((p,text))
-            except:
-                continue
-    return out
-  
+    return [(p,p) for p in sorted(paths) if os.path.isfile(p)]
+
+http=requests.Session()  # keep-alive for the rebuild's embed workers
+http.mount("http://",requests.adapters.HTTPAdapter(pool_connections=1,pool_maxsize=REBUILD_WORKERS))
+
 def embed(txt):
-    r=requests.post(EMBEDDER,json={"text":txt},timeout=10)
+    r=http.post(EMBEDDER,json={"text":txt},timeout=10)
     r.raise_for_status()
     return r.json()["vector"]
+
+def embed_batch(texts):
+    r=http.post(EMBEDDER_BATCH,json={"texts":texts},headers={"Accept":embed_wire.content_type("float32")},timeout=30)
+    if r.status_code==404:  # embedder without /embed_batch
+        return [embed(t) for t in texts]
+    r.raise_for_status()
+    if r.headers.get("Content-Type","").startswith(embed_wire.MEDIA_TYPE):
+        return embed_wire.decode(r.content).tolist()
+    return r.json()["vectors"]
+
+def _switched(shadow):
+    global col
+    col=shadow
+
+rebuilder=BlueGreenRebuilder(client,alias,REBUILD_STATE,MANIFEST_PATH,source_paths,embed_batch,
+                             CHUNK_TOKENS,CHUNK_OVERLAP,CHUNK_TOKENIZER,processes=CHUNK_PROCESSES,
+                             workers=REBUILD_WORKERS,batch_size=REBUILD_BATCH,gc_delay_s=REBUILD_GC_DELAY_S,
+                             switch_lock=sync_lock,on_switch=_switched)
+if REBUILD_RESUME_ON_START and rebuilder.status().get("status")=="interrupted":
+    rebuilder.start()
   
 @app.get("/healthz")
 def healthz():
     return {"ok":True}
   
-@app.post("/rebuild",response_model=RebuildResp)
-def rebuild():
-    client.reset()
-    global col
-    col=client.get_or_create_collection("kb")
-    src=read_sources()
-    ids=[]
-    docs=[]
-    vecs=[]
-    for i,(p,t) in enumerate(src):
-        ids.append(f"doc-{i}")
-        docs.append(t)
-        vecs.append(embed(t))
-    if ids:
-        col.add(ids=ids,documents=docs,embeddings=vecs,metadatas=[{"source":s[0]} for s in src])
-    return {"added":len(ids)}
+def sync_collection(manifest,force=False):
+    # only new/changed chunks are embedded; chunks of removed files (and lost from changed ones) are deleted
+    plan=SyncPlan(manifest,source_paths(),CHUNK_TOKENS,CHUNK_OVERLAP,CHUNK_TOKENIZER,processes=CHUNK_PROCESSES,
+                  force=force,exists=lambda ids:col.get(ids=list(ids),include=[])["ids"])
+    # changed chunks stream through the rebuild's batched, retrying embed+upsert workers
+    embed_upsert(col,plan.changes(),embed_batch,batch_size=REBUILD_BATCH,workers=REBUILD_WORKERS)
+    if plan.refresh:
+        col.update(ids=[c["id"] for c in plan.refresh],metadatas=[c["metadata"] for c in plan.refresh])
+    if plan.deletes:
+        col.delete(ids=plan.deletes)
+    plan.commit()
+    return plan
+
+@app.post("/rebuild",status_code=202)
+def rebuild(wait:bool=False):
+    # blue/green: fills a shadow collection while /search keeps serving the live one, then switches the alias
+    try:
+        st=rebuilder.start()
+    except RebuildRunning:
+        st=rebuilder.status()
+    if wait:
+        rebuilder.join()
+        st=rebuilder.status()
+    return st
+
+@app.get("/rebuild/status")
+def rebuild_status():
+    return rebuilder.status()
+
+@app.post("/sync",response_model=SyncResp)
+def sync(full:bool=False):
+    if rebuilder.running:
+        raise HTTPException(409,"rebuild in progress; it replaces the collection and the manifest")
+    with sync_lock:
+        plan=sync_collection(Manifest(MANIFEST_PATH),force=full)
+        version=bump_kb_version(col) if plan.changed else None  # unchanged corpus: caches stay valid
+    return {**{k:plan.counts[k] for k in ("added","updated","deleted","skipped")},"kb_version":version}
   
 @app.post("/search")
 def search(q:str,top_k:int=3):
     v=embed(q)
     res=col.query(query_embeddings=[v],n_results=top_k,include=["documents","metadatas","distances"])
     return res
+
+if __name__=="__main__":
+    ap=argparse.ArgumentParser(description="Incremental KB sync (same as POST /sync)")
+    ap.add_argument("--full",action="store_true",help="re-embed every chunk")
+    print(json.dumps(sync(ap.parse_args().full)))
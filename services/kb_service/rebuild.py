@@ -0,0 +1,205 @@
+from __future__ import annotations
+import contextlib, json, os, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple
+
+from retrieval.kb_alias import CollectionAlias
+from retrieval.kb_sync import Manifest, SyncPlan
+from retrieval.kb_version import bump_kb_version
+
+# Blue/green rebuild: chunks are embedded into a new shadow collection while the
+# alias keeps serving the live one. Workers embed and upsert whole batches
+# concurrently. When the shadow is full, it gets a fresh kb_version and the alias
+# is switched to it in one rename. The old collection is dropped after a grace
+# period, so in-flight queries against it can finish.
+#
+# Progress is persisted to `state_path`. A rebuild that dies (crash, restart,
+# embedder outage) keeps its shadow collection. The next start() resumes it:
+# chunk ids are content hashes, so every chunk already in the shadow is skipped.
+
+_ACTIVE = ("running", "interrupted", "failed")
+
+def embed_upsert(collection, chunks: Iterable[dict], embed: Callable[[List[str]], Sequence], batch_size: int = 32,
+                 workers: int = 8, retries: int = 3, on_batch: Optional[Callable[[int], None]] = None,
+                 on_submit: Optional[Callable[[], None]] = None) -> None:
+    """Embed and upsert a stream of chunks in `batch_size` batches on `workers` threads.
+
+    At most 2 * workers batches are in flight, so only those are held in memory.
+    Each embed call is retried `retries` times with exponential backoff. The first
+    failure stops reading `chunks` and is re-raised once submitted batches finish.
+    """
+    inflight = threading.BoundedSemaphore(2 * workers)
+    errors: List[BaseException] = []
+
+    def run(batch: List[dict]) -> None:
+        texts = [c["text"] for c in batch]
+        for attempt in range(retries + 1):
+            try:
+                vecs = embed(texts)
+                break
+            except Exception:
+                if attempt == retries:
+                    raise
+                time.sleep(0.5 * 2 ** attempt)
+        collection.upsert(ids=[c["id"] for c in batch], documents=texts, embeddings=[list(map(float, v)) for v in vecs],
+                          metadatas=[c["metadata"] for c in batch])
+        if on_batch:
+            on_batch(len(batch))
+
+    def done(fut):
+        if fut.exception() is not None:
+            errors.append(fut.exception())
+        inflight.release()  # after recording the error, so the reader sees it before reading on
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="kb-embed") as pool:
+        batch = []
+        for chunk in chunks:
+            if errors:
+                break
+            batch.append(chunk)
+            if len(batch) >= batch_size:
+                inflight.acquire()
+                pool.submit(run, batch).add_done_callback(done)
+                batch = []
+                if on_submit:
+                    on_submit()
+        if batch and not errors:
+            inflight.acquire()
+            pool.submit(run, batch).add_done_callback(done)
+    if errors:
+        raise errors[0]
+
+class RebuildRunning(RuntimeError):
+    pass
+
+class BlueGreenRebuilder:
+    def __init__(self, client, alias: CollectionAlias, state_path: str, manifest_path: str,
+                 files: Callable[[], Iterable[Tuple[str, str]]], embed: Callable[[List[str]], Sequence],
+                 window: int, overlap: int, tokenizer: Optional[str] = None, processes: int = 0,
+                 workers: int = 8, batch_size: int = 32, retries: int = 3, gc_delay_s: float = 30.0,
+                 switch_lock: Optional[threading.Lock] = None, on_switch: Optional[Callable[[object], None]] = None):
+        self.client, self.alias = client, alias
+        self.state_path, self.manifest_path = state_path, manifest_path
+        self.files, self.embed = files, embed
+        self.window, self.overlap, self.tokenizer, self.processes = window, overlap, tokenizer, processes
+        self.workers, self.batch_size, self.retries, self.gc_delay_s = workers, batch_size, retries, gc_delay_s
+        self.switch_lock, self.on_switch = switch_lock, on_switch
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._state = self._load()
+        if self._state.get("status") == "running":  # the process died mid-rebuild
+            self._state["status"] = "interrupted"
+            self._save()
+
+    # --- state ---
+    def _load(self) -> dict:
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"status": "idle"}
+
+    def _save(self) -> None:
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        tmp = f"{self.state_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._state, f)
+        os.replace(tmp, self.state_path)
+
+    def _update(self, **kw) -> None:
+        with self._lock:
+            self._state.update(kw)
+            self._save()
+
+    def _progress(self, add: Optional[dict] = None, **fields) -> None:
+        with self._lock:
+            for k, v in (add or {}).items():
+                self._state[k] = self._state.get(k, 0) + v
+            self._state.update(fields)
+            now = time.time()
+            if now - self._state.get("saved_at", 0) >= 1.0:  # progress is persisted at most once a second
+                self._state["saved_at"] = now
+                self._save()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def status(self) -> dict:
+        with self._lock:
+            st = dict(self._state)
+        st.pop("saved_at", None)
+        st["alias"], st["live"] = self.alias.name, self.alias.target()
+        if st.get("files_total"):
+            st["progress"] = round(st.get("files_read", 0) / st["files_total"], 4)
+        return st
+
+    # --- control ---
+    def start(self) -> dict:
+        with self._lock:
+            if self.running:
+                raise RebuildRunning(self._state.get("collection"))
+            st = self._state
+            if st.get("status") in _ACTIVE and st.get("collection"):
+                st.update(status="running", resumed_at=time.time(), resumes=st.get("resumes", 0) + 1, error=None)
+            else:
+                name = f"{self.alias.name}_{time.strftime('%Y%m%d%H%M%S')}"
+                self._state = {"status": "running", "collection": name, "started_at": time.time(),
+                               "files_total": 0, "files_read": 0, "embedded": 0, "skipped": 0, "batches": 0}
+            self._save()
+            self._thread = threading.Thread(target=self._run, name="kb-rebuild", daemon=True)
+            self._thread.start()
+        return self.status()
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    # --- work ---
+    def _run(self) -> None:
+        try:
+            shadow = self.client.get_or_create_collection(self._state["collection"])
+            plan = self._fill(shadow)
+            self._switch(shadow, plan)
+        except Exception as e:
+            self._update(status="failed", error=f"{type(e).__name__}: {e}", failed_at=time.time())
+
+    def _fill(self, shadow) -> SyncPlan:
+        files = list(self.files())
+        self._update(files_total=len(files))
+        # an empty manifest makes every file "new"; ids already in the shadow (earlier attempt) are skipped
+        plan = SyncPlan(Manifest(None), files, self.window, self.overlap, self.tokenizer, processes=self.processes,
+                        exists=lambda ids: shadow.get(ids=list(ids), include=[])["ids"])
+        embed_upsert(shadow, plan.changes(), self.embed, self.batch_size, self.workers, self.retries,
+                     on_batch=lambda n: self._progress(add={"embedded": n, "batches": 1}),
+                     on_submit=lambda: self._progress(files_read=plan.counts["files_read"],
+                                                      skipped=plan.counts["skipped"]))
+        self._progress(files_read=plan.counts["files_read"], skipped=plan.counts["skipped"])
+        return plan
+
+    def _switch(self, shadow, plan: SyncPlan) -> None:
+        self._update(status="switching", chunks=shadow.count())
+        version = bump_kb_version(shadow)
+        with self.switch_lock or contextlib.nullcontext():
+            previous = self.alias.switch(shadow.name)
+            if self.on_switch:
+                self.on_switch(shadow)
+            plan.manifest.path = self.manifest_path  # the manifest now describes the new live collection
+            plan.commit()
+        self._update(status="done", kb_version=version, previous=previous, finished_at=time.time())
+        timer = threading.Timer(self.gc_delay_s, self._gc, args=(shadow.name,))
+        timer.daemon = True
+        timer.start()
+
+    def _gc(self, keep: str) -> None:
+        """Drop every other collection behind the alias (the previous target, abandoned shadows)."""
+        if self.running or self.alias.target() != keep:
+            return
+        prefix = f"{self.alias.name}_"
+        for c in self.client.list_collections():
+            name = getattr(c, "name", c)
+            if name != keep and (name == self.alias.name or name.startswith(prefix)):
+                try:
+                    self.client.delete_collection(name)
+                except Exception:
+                    pass
@@ -1,10 +1,14 @@
 import os,random,time
-from fastapi import FastAPI
+from fastapi import FastAPI,Request
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-from prometheus_client import Histogram,Counter,generate_latest,CONTENT_TYPE_LATEST
+from prometheus_client import Histogram,Counter,Gauge,generate_latest,CONTENT_TYPE_LATEST
 
 import chromadb
 from chromadb.config import Settings
+from retrieval.kb_alias import CollectionAlias
+from retrieval.context_pack import ContextPacker
+from utils.adaptive_limit import AdaptiveLimiter,Overloaded
 from ddtrace import patch,tracer as ddtracer
 from opentelemetry import trace
 from opentelemetry.sdk.trace import TracerProvider
@@ -19,13 +23,31 @@ trace.set_tracer_provider(tp)
 tr=trace.get_tracer("rag-api")
 CHROMA_DIR=os.getenv("CHROMA_DIR","/chroma")
 client=chromadb.PersistentClient(path=CHROMA_DIR,settings=Settings(allow_reset=False,anonymized_telemetry=False))
-col=client.get_or_create_collection("kb")
+alias=CollectionAlias(os.getenv("KB_ALIAS_PATH",f"{CHROMA_DIR}/kb_alias.json"),"kb")  # kb-service's blue/green rebuild switches it
+
+# retrieved context is packed into a token budget in rank order (was: every doc cut to 800 chars)
+packer=ContextPacker(int(os.getenv("CONTEXT_BUDGET_TOKENS","600")),tokenizer=os.getenv("PROMPT_TOKENIZER","regex"),
+                     separator="\n---\n",min_trim_tokens=int(os.getenv("CONTEXT_MIN_TRIM_TOKENS","32")))
 
 AB_MODE=os.getenv("AB_MODE","auto")
 AB_SPLIT=int(os.getenv("AB_SPLIT","80"))
 
 LAT=Histogram("rag_request_latency","seconds",buckets=[0.05,0.1,0.2,0.5,1,2,5])
 REQS=Counter("rag_requests_total","count",["variant"])
+INFLIGHT=Gauge("rag_query_inflight","/query requests holding a concurrency slot")
+QUEUED=Gauge("rag_query_queued","/query requests waiting for a concurrency slot")
+LIMIT=Gauge("rag_query_limit","current adaptive /query concurrency limit")
+SHED=Counter("rag_query_shed_total","/query requests rejected with 503",["reason"])
+
+def limiter_changed(in_flight,queued,limit):
+    INFLIGHT.set(in_flight);QUEUED.set(queued);LIMIT.set(limit)
+
+# adaptive cap on concurrent /query work (see utils/adaptive_limit.py)
+limiter=AdaptiveLimiter(initial=int(os.getenv("LIMIT_INITIAL","16")),min_limit=int(os.getenv("LIMIT_MIN","2")),
+                        max_limit=int(os.getenv("LIMIT_MAX","64")),max_queue=int(os.getenv("LIMIT_QUEUE","64")),
+                        queue_timeout_s=float(os.getenv("LIMIT_QUEUE_TIMEOUT_S","5")),
+                        tolerance=float(os.getenv("LIMIT_TOLERANCE","1.5")),
+                        on_change=limiter_changed,on_shed=lambda reason:SHED.labels(reason).inc())
 
 class Q(BaseModel):
     q:str
@@ -42,6 +64,11 @@ def answer_template(variant,query,context):
       
 app=FastAPI()
 
+@app.exception_handler(Overloaded)
+async def overloaded(request:Request,e:Overloaded):
+    return JSONResponse({"error":"overloaded","reason":e.reason,"retry_after_s":e.retry_after_s},503,
+                        headers={"Retry-After":str(e.retry_after_s)})
+
 @app.get("/healthz")
 def healthz():
     return {"ok":True,"ab_mode":AB_MODE,"ab_split":AB_SPLIT}
@@ -53,17 +80,20 @@ def metrics():
 @app.post("/query")
 def query(body:Q,top_k:int=3):
     start=time.time()
-    with tr.start_as_current_span("rag.query"):
+    with limiter.limit_slot(),tr.start_as_current_span("rag.query"):
         v=choose_variant()
         REQS.labels(v).inc()
-        res=col.query(query_texts=[body.q],n_results=top_k,include=["documents","metadatas","distances"])
-        ctxs=[]
-        for d in res.get("documents",[[]])[0]:
-            ctxs.append(d[:800])
-        context="\n---\n".join(ctxs)
+        res=alias.collection(client).query(query_texts=[body.q],n_results=top_k,include=["documents","metadatas","distances"])
+        docs=res.get("documents",[[]])[0]
+        metas=(res.get("metadatas") or [[]])[0] or [None]*len(docs)
+        packed=packer.pack(docs,[(m or {}).get("content_hash") for m in metas])
         duration=time.time()-start
-        span=trace.get_current_span().get_span_context()
+        cur=trace.get_current_span()
+        cur.set_attribute("rag.context_tokens",packed.tokens)
+        cur.set_attribute("rag.dropped_chunks",packed.dropped)
+        span=cur.get_span_context()
         trace_id=f"{span.trace_id:032x}"
         LAT.observe(duration,exemplar={"trace_id":trace_id})
-        ddtracer.set_tags({"ab.variant":v,"rag.top_k":top_k})
-        return {"variant":v,"trace_id":trace_id,"latency_s":duration,"answer":answer_template(v,body.q,context)}
+        ddtracer.set_tags({"ab.variant":v,"rag.top_k":top_k,"rag.context_tokens":packed.tokens,"rag.dropped_chunks":packed.dropped})
+        return {"variant":v,"trace_id":trace_id,"latency_s":duration,"context_tokens":packed.tokens,
+                "dropped_chunks":packed.dropped,"answer":answer_template(v,body.q,packed.text)}
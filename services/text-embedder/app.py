@@ -1,26 +1,47 @@
-import os,hashlib,math
-from fastapi import FastAPI
+import os
+from typing import List
+from fastapi import FastAPI,Request,Response
 from pydantic import BaseModel
 from ddtrace import patch
 from opentelemetry import trace
 from opentelemetry.sdk.trace import TracerProvider
 from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
 from opentelemetry.sdk.trace.export import BatchSpanProcessor
+from retrieval import embed_wire
+from retrieval.hash_embed import HashingEmbedder
 patch(fastapi=True)
 tp=TracerProvider()
 tp.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT","http://localhost:4317"),insecure=True)))
 trace.set_tracer_provider(tp)
 app=FastAPI()
+
+def _range(env,default):
+    lo,hi=os.getenv(env,default).split(",")
+    return int(lo),int(hi)
+
+# feature hashing: word + char n-grams -> EMBED_DIM signed buckets, L2-normalized (deterministic, no model)
+EMBED_DIM=int(os.getenv("EMBED_DIM","256"))
+EMBED_BATCH_MAX=int(os.getenv("EMBED_BATCH_MAX","1024"))
+embedder=HashingEmbedder(dim=EMBED_DIM,word_ngrams=_range("EMBED_WORD_NGRAMS","1,2"),
+                         char_ngrams=_range("EMBED_CHAR_NGRAMS","3,5"),
+                         char_weight=float(os.getenv("EMBED_CHAR_WEIGHT","0.5")))
+
 class EmbReq(BaseModel):
     text:str
-def to_vec(s,dim=128):
-    h=hashlib.sha256(s.encode()).digest()
-    vals=[h[i%len(h)]/255.0 for i in range(dim)]
-    n=math.sqrt(sum(v*v for v in vals)) or 1.0
-    return [v/n for v in vals]
+class EmbBatchReq(BaseModel):
+    texts:List[str]
 @app.get("/healthz")
 def healthz():
-    return {"ok":True}
+    return {"ok":True,"dim":EMBED_DIM}
 @app.post("/embed")
 def embed(r:EmbReq):
-    return {"vector":to_vec(r.text)}
+    return {"vector":embedder.encode([r.text])[0].tolist()}
+@app.post("/embed_batch")
+def embed_batch(r:EmbBatchReq,request:Request):
+    if len(r.texts)>EMBED_BATCH_MAX:
+        return Response(status_code=413,content=f"at most {EMBED_BATCH_MAX} texts per request")
+    vecs=embedder.encode(r.texts)
+    dtype=embed_wire.negotiate(request.headers.get("accept"))  # binary float32/float16/int8 if asked for
+    if dtype:
+        return Response(content=embed_wire.encode(vecs,dtype),media_type=embed_wire.content_type(dtype))
+    return {"vectors":vecs.tolist(),"dim":EMBED_DIM}
@@ -0,0 +1,13 @@
+import os, sys, tempfile
+
+# Repo root on sys.path for retrieval/, utils/, workshop_app/ and the lab2_rag alias of lab2-rag/.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# lab2-rag/api/app.py builds its OpenAI client and session/feedback writers at import time;
+# tests stub every LLM call, keep the JSONL records out of the repo's ./data and count prompt
+# tokens with the regex tokenizer (no model download in a warmup thread).
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="rag-test-data-"))
+os.environ.setdefault("PROMPT_TOKENIZER", "regex")
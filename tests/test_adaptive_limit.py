@@ -0,0 +1,88 @@
+import asyncio, threading, time
+import pytest
+from utils.adaptive_limit import AdaptiveLimiter, Overloaded
+
+def test_queues_over_limit_and_grants_in_order():
+    states, sheds = [], []
+    lim = AdaptiveLimiter(initial=2, min_limit=2, max_limit=2, max_queue=1, queue_timeout_s=2.0,
+                          on_change=lambda *s: states.append(s), on_shed=sheds.append)
+    a, b = lim.acquire(), lim.acquire()
+    got = []
+    t = threading.Thread(target=lambda: got.append(lim.acquire()))
+    t.start()
+    while lim.stats()["queued"] < 1:
+        time.sleep(0.001)
+    with pytest.raises(Overloaded) as e:  # queue holds one waiter
+        lim.acquire()
+    assert e.value.reason == "queue_full" and e.value.retry_after_s >= 1 and sheds == ["queue_full"]
+    a.release()
+    t.join(1)
+    assert got and states[-1] == (2, 0, 2)
+    got[0].release(), b.release()
+    assert lim.stats()["in_flight"] == 0
+
+def test_waiter_times_out_and_slow_backend_is_shed_early():
+    lim = AdaptiveLimiter(initial=1, min_limit=1, max_limit=1, queue_timeout_s=0.05)
+    s = lim.acquire()
+    t0 = time.monotonic()
+    with pytest.raises(Overloaded) as e:
+        lim.acquire()
+    assert e.value.reason == "timeout" and time.monotonic() - t0 >= 0.05
+    s.observe(2.0)  # requests now take 2s: a queued request could not start within 50ms
+    s.release()
+    lim.acquire()
+    with pytest.raises(Overloaded) as e:
+        lim.acquire()
+    assert e.value.reason == "deadline" and e.value.retry_after_s == 2
+    assert lim.stats()["queued"] == 0
+
+def run(lim, latency, n):
+    for _ in range(n):
+        slots = [lim.acquire() for _ in range(lim.limit)]
+        for s in slots:
+            s.observe(latency)
+            s.release()
+
+def test_limit_grows_at_steady_latency_and_shrinks_when_it_rises():
+    lim = AdaptiveLimiter(initial=4, min_limit=2, max_limit=64)
+    run(lim, 0.1, 20)
+    grown = lim.limit
+    assert grown > 4
+    run(lim, 0.5, 1)  # 5x slower: one round of samples pulls the limit down
+    assert lim.limit < grown / 2
+    s = lim.acquire()
+    before = lim._limit
+    s.drop()
+    s.release()
+    assert lim._limit == pytest.approx(before * 0.9)
+
+def test_idle_traffic_does_not_grow_the_limit():
+    lim = AdaptiveLimiter(initial=16, max_limit=64)
+    for _ in range(50):
+        s = lim.acquire()
+        s.observe(0.1)
+        s.release()
+    assert lim.limit == 16
+
+def test_async_waiters_share_the_limit_with_threads():
+    lim = AdaptiveLimiter(initial=1, min_limit=1, max_limit=1, queue_timeout_s=1.0)
+
+    async def main():
+        held = lim.acquire()
+        waiter = asyncio.create_task(lim.acquire_async())
+        cancelled = asyncio.create_task(lim.acquire_async())
+        await asyncio.sleep(0.01)
+        cancelled.cancel()
+        await asyncio.sleep(0.01)
+        assert lim.stats()["queued"] == 1
+        threading.Thread(target=held.release).start()
+        slot = await asyncio.wait_for(waiter, 1)
+        assert lim.stats()["in_flight"] == 1
+        slot.release()
+        with pytest.raises(RuntimeError):
+            async with lim.alimit_slot():
+                raise RuntimeError("llm down")
+
+    asyncio.run(main())
+    st = lim.stats()
+    assert st["in_flight"] == 0 and st["queued"] == 0
@@ -0,0 +1,45 @@
+import os
+import numpy as np
+from retrieval.ann import LocalIndex, Snapshot, build_snapshot, read_current
+
+def corpus(n=400, dim=16, seed=0):
+    x = np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+    return [f"doc-{i}" for i in range(n)], x, [f"text {i}" for i in range(n)], [{"i": i} for i in range(n)]
+
+def test_ivf_matches_exact_l2_and_returns_chroma_shape(tmp_path):
+    ids, x, docs, metas = corpus()
+    snap = Snapshot(build_snapshot(str(tmp_path), "v1", ids, x, docs, metas, space="l2", nlist=8))
+    q = x[7] + 0.01
+    res = snap.query([q], n_results=5, nprobe=8)  # nprobe == nlist -> exhaustive
+    exact = np.argsort(((x - q) ** 2).sum(axis=1))[:5]
+    assert res["ids"][0] == [ids[i] for i in exact]
+    assert res["documents"][0][0] == "text 7" and res["metadatas"][0][0] == {"i": 7}
+    assert abs(res["distances"][0][0] - float(((x[7] - q) ** 2).sum())) < 1e-3
+
+def test_partial_probe_keeps_high_recall(tmp_path):
+    ids, x, docs, metas = corpus(n=2000)
+    snap = Snapshot(build_snapshot(str(tmp_path), "v1", ids, x, docs, metas, space="cosine", nlist=32))
+    xn = x / np.linalg.norm(x, axis=1, keepdims=True)
+    hits = 0
+    for qi in range(50):
+        q = x[qi] + np.random.default_rng(qi).normal(scale=0.3, size=x.shape[1]).astype(np.float32)
+        exact = {ids[i] for i in np.argsort(-(xn @ (q / np.linalg.norm(q))))[:10]}
+        rows, _ = snap.search(q, 10, nprobe=8)
+        hits += len(exact & {snap.ids[r] for r in rows})
+    assert hits / 500 > 0.8
+
+def test_refresh_builds_once_and_switches_atomically(tmp_path):
+    ids, x, docs, metas = corpus(n=50)
+    calls = []
+    def fetch():
+        calls.append(1)
+        return ids, x, docs, metas, "l2"
+    a, b = LocalIndex(str(tmp_path)), LocalIndex(str(tmp_path))
+    assert a.refresh("v1", fetch) and b.refresh("v1", fetch)
+    assert len(calls) == 1 and read_current(str(tmp_path)) == "v1"
+    old = a.snapshot
+    a.refresh("v2", fetch)
+    assert a.version == "v2" and old.version == "v1" and len(old.query([x[0]], 1)["ids"][0]) == 1
+    assert b.load_current() and b.version == "v2"
+    a.refresh("v3", fetch)
+    assert sorted(d for d in os.listdir(tmp_path) if not d.startswith(".") and d != "CURRENT") == ["v2", "v3"]
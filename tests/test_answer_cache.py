@@ -0,0 +1,24 @@
+import numpy as np
+from lab2_rag.api.answer_cache import SemanticAnswerCache
+
+def vec(seed, noise=0.0, dim=64):
+    base = np.random.default_rng(seed).standard_normal(dim)
+    return base + noise * np.random.default_rng(seed + 100).standard_normal(dim)
+
+def test_paraphrase_hits_within_scope():
+    c = SemanticAnswerCache(threshold=0.9)
+    c.store(("llama3.1", "v1", "kb1"), vec(1), {"answer": "llama"})
+    hit = c.lookup(("llama3.1", "v1", "kb1"), vec(1, noise=0.05))
+    assert hit and hit[0]["answer"] == "llama" and hit[1] > 0.9
+
+def test_other_scope_or_question_misses():
+    c = SemanticAnswerCache(threshold=0.9)
+    c.store(("llama3.1", "v1", "kb1"), vec(1), {"answer": "llama"})
+    assert c.lookup(("llama3.1", "v1", "kb2"), vec(1)) is None
+    assert c.lookup(("llama3.1", "v1", "kb1"), vec(2)) is None
+
+def test_size_bound_evicts_lru():
+    c = SemanticAnswerCache(maxsize=2)
+    for i in range(3):
+        c.store("s", vec(i), i)
+    assert len(c) == 2 and c.lookup("s", vec(0)) is None
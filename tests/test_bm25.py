@@ -0,0 +1,28 @@
+from retrieval.bm25 import BM25Index, rrf_fuse
+
+def index():
+    idx = BM25Index()
+    idx.upsert("a", "Loki collects application logs via promtail")
+    idx.upsert("b", "Tempo stores traces from the OTel collector")
+    idx.upsert("c", "Prometheus scrapes metrics with exemplars")
+    return idx
+
+def test_search_finds_keyword_match():
+    hits = index().search("where are logs collected", k=2)
+    assert hits[0][0] == "a"
+
+def test_upsert_replaces_postings():
+    idx = index()
+    idx.upsert("a", "nothing relevant here")
+    assert all(doc_id != "a" for doc_id, _ in idx.search("loki logs"))
+    assert len(idx) == 3
+
+def test_snapshot_roundtrip(tmp_path):
+    p = str(tmp_path / "bm25.json")
+    index().save(p)
+    assert BM25Index.load(p).search("traces", k=1)[0][0] == "b"
+
+def test_rrf_prefers_docs_in_both_lists():
+    fused = rrf_fuse(["x", "y", "z"], ["z", "w"])
+    assert fused[0][0] == "z"
+    assert {d for d, _ in fused} == {"x", "y", "z", "w"}
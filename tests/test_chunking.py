@@ -0,0 +1,54 @@
+from retrieval.chunking import chunk_text, count_tokens, iter_chunks, sections
+
+PARA = "\n\n".join(" ".join(f"w{p}x{k}" for k in range(30)) for p in range(8))
+DOC = f"""Intro line.
+
+# Guide
+## Install
+{PARA}
+
+```
+# not a heading
+```
+## Usage
+Short usage.
+"""
+
+def test_sections_follow_headings_outside_code_fences():
+    paths = [p for p, _, _ in sections(DOC)]
+    assert paths == [(), ("Guide",), ("Guide", "Install"), ("Guide", "Usage")]
+
+def test_chunks_fit_the_window_overlap_and_carry_metadata():
+    chunks = chunk_text(DOC, "guide.md", window=64, overlap=8)
+    assert all(c["metadata"]["tokens"] <= 64 for c in chunks)
+    assert [c["metadata"]["heading_path"] for c in chunks][0] == ""
+    assert {c["metadata"]["heading_path"] for c in chunks} == {"", "Guide > Install", "Guide > Usage"}
+    install = [c for c in chunks if c["metadata"]["heading_path"] == "Guide > Install"]
+    assert len(install) > 1
+    for a, b in zip(install, install[1:]):
+        assert b["metadata"]["start"] < a["metadata"]["end"]  # overlapping windows
+    for c in chunks:
+        m = c["metadata"]
+        assert DOC[m["start"]:m["end"]] == c["text"]
+        assert m["source"] == "guide.md" and m["tokens"] == count_tokens(c["text"])
+    assert "# not a heading" in install[-1]["text"]
+
+def test_ids_are_stable_when_other_sections_change():
+    before = {c["text"]: c["id"] for c in chunk_text(DOC, "guide.md", window=64, overlap=8)}
+    edited = DOC.replace("Short usage.", "Short usage, now longer.")
+    after = {c["text"]: c["id"] for c in chunk_text(edited, "guide.md", window=64, overlap=8)}
+    kept = set(before) & set(after)
+    assert len(kept) == len(before) - 1
+    assert all(before[t] == after[t] for t in kept)
+    dup = chunk_text("# A\nsame\n# B\nsame\n# A\nsame\n", "d.md", window=64, overlap=0)
+    assert len({c["id"] for c in dup}) == 3
+
+def test_process_pool_matches_inline(tmp_path):
+    files = []
+    for i in range(6):
+        p = tmp_path / f"{i}.md"
+        p.write_text(DOC.replace("Guide", f"Guide {i}"), encoding="utf-8")
+        files.append((str(p), p.name))
+    inline = list(iter_chunks(files, window=64, overlap=8))
+    pooled = list(iter_chunks(files, window=64, overlap=8, processes=2))
+    assert [c["id"] for c in pooled] == [c["id"] for c in inline]
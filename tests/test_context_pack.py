@@ -0,0 +1,27 @@
+from retrieval.chunking import content_hash, count_tokens
+from retrieval.context_pack import ContextPacker
+
+def words(n, tag):
+    return " ".join(f"{tag}{i}" for i in range(n))
+
+def test_fills_budget_in_rank_order_then_trims_and_drops():
+    docs = [words(40, "a"), words(30, "b"), words(20, "c") + "\n\n" + words(40, "d"), words(10, "e")]
+    p = ContextPacker(100, separator="\n\n", min_trim_tokens=8).pack(docs)
+    assert p.kept == [0, 1, 2] and p.trimmed == 1 and p.dropped == 1
+    assert p.texts[:2] == docs[:2]
+    assert p.texts[2] == words(20, "c")  # cut back to the paragraph break inside the remaining 30 tokens
+    assert p.tokens == count_tokens(p.text) <= 100
+
+def test_small_leftover_drops_instead_of_trimming():
+    docs = [words(95, "a"), words(50, "b"), words(3, "c")]
+    p = ContextPacker(100, min_trim_tokens=8).pack(docs)
+    assert p.kept == [0] and p.dropped == 2 and p.trimmed == 0 and p.text == docs[0]
+
+def test_counts_are_cached_per_content_hash():
+    docs = [words(20, "a"), words(20, "b")]
+    packer = ContextPacker(0)
+    assert packer.pack(docs).text == "\n\n".join(docs)  # budget 0 = no limit
+    misses = packer.misses
+    packer.pack(docs, [content_hash(d) for d in docs])
+    packer.pack(list(reversed(docs)))
+    assert packer.misses == misses and packer.hits >= 4
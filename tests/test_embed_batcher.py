@@ -0,0 +1,42 @@
+import threading
+import numpy as np
+from lab2_rag.text_embedder.batcher import EncodeQueue
+
+def fake_encode(calls):
+    def encode(texts):
+        calls.append(list(texts))
+        return np.array([[len(t), 1.0] for t in texts], dtype=np.float32)
+    return encode
+
+def test_concurrent_requests_are_merged_and_keep_their_order():
+    calls = []
+    q = EncodeQueue(fake_encode(calls), max_batch=64, max_wait_ms=50, buckets=(8,))
+    out = {}
+    def ask(i):
+        out[i] = q.encode(["x" * i, "y" * (20 + i), "z"])
+    threads = [threading.Thread(target=ask, args=(i,)) for i in range(1, 6)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    q.close()
+    for i in range(1, 6):
+        assert out[i][:, 0].tolist() == [i, 20 + i, 1]
+    assert len(calls) < 10  # 15 texts, far fewer forward passes than one per request per bucket
+    for batch in calls:  # each pass stays inside one length bucket
+        assert all(len(t) <= 8 for t in batch) or all(len(t) > 8 for t in batch)
+
+def test_full_bucket_flushes_without_waiting():
+    calls = []
+    q = EncodeQueue(fake_encode(calls), max_batch=4, max_wait_ms=10_000)
+    got = q.encode(["a", "b", "c", "d"], timeout=2)
+    q.close()
+    assert got.shape == (4, 2) and calls == [["a", "b", "c", "d"]]
+
+def test_encode_errors_reach_the_caller():
+    q = EncodeQueue(lambda texts: 1 / 0, max_wait_ms=1)
+    try:
+        q.encode(["a"], timeout=2)
+        assert False, "expected ZeroDivisionError"
+    except ZeroDivisionError:
+        pass
+    finally:
+        q.close()
@@ -0,0 +1,41 @@
+import numpy as np
+from lab2_rag.text_embedder.embed_cache import EmbeddingCache
+
+def vec(i, dim=4):
+    return np.full(dim, float(i), dtype=np.float32)
+
+def test_key_covers_model_and_text():
+    a, b = EmbeddingCache("m1", 4), EmbeddingCache("m2", 4)
+    assert a.key("hello") == a.key("hello") != a.key("hello ")
+    assert a.key("hello") != b.key("hello")
+
+def test_memory_lru_evicts_oldest():
+    c = EmbeddingCache("m", 4, maxsize=2)
+    k = [c.key(str(i)) for i in range(3)]
+    c.put_many({k[0]: vec(0), k[1]: vec(1)})
+    c.get_many([k[0]])
+    c.put_many({k[2]: vec(2)})
+    assert set(c.get_many(k)) == {k[0], k[2]}
+
+def test_disk_tier_survives_restart_and_is_shared(tmp_path):
+    a = EmbeddingCache("m", 4, maxsize=10, directory=str(tmp_path))
+    b = EmbeddingCache("m", 4, maxsize=10, directory=str(tmp_path))  # second replica, same file
+    ka, kb = a.key("alpha"), a.key("beta")
+    a.put_many({ka: vec(1)})
+    b.put_many({kb: vec(2)})
+    assert np.array_equal(b.get_many([ka])[ka], vec(1))  # appended by the other replica
+    fresh = EmbeddingCache("m", 4, maxsize=10, directory=str(tmp_path))
+    got = fresh.get_many([ka, kb])
+    assert np.array_equal(got[ka], vec(1)) and np.array_equal(got[kb], vec(2))
+    assert fresh.stats()["disk_entries"] == 2
+
+def test_torn_tail_is_ignored(tmp_path):
+    a = EmbeddingCache("m", 4, directory=str(tmp_path))
+    a.put_many({a.key("x"): vec(3)})
+    with open(a.path, "ab") as f:
+        f.write(b"\x01" * 7)  # half-written record
+    fresh = EmbeddingCache("m", 4, directory=str(tmp_path))
+    assert fresh.stats()["disk_entries"] == 1
+    fresh.put_many({fresh.key("y"): vec(4)})
+    again = EmbeddingCache("m", 4, directory=str(tmp_path))
+    assert np.array_equal(again.get_many([again.key("y")])[again.key("y")], vec(4))
@@ -0,0 +1,23 @@
+import numpy as np
+from retrieval import embed_wire
+
+X = np.random.default_rng(0).normal(size=(3, 8)).astype(np.float32)
+
+def test_float32_roundtrip_is_a_zero_copy_view():
+    buf = embed_wire.encode(X, "float32")
+    got = embed_wire.decode(buf)
+    assert got.shape == (3, 8) and np.array_equal(got, X)
+    assert not got.flags.owndata and len(buf) == 16 + X.nbytes
+
+def test_float16_and_int8_are_close():
+    assert np.abs(embed_wire.decode(embed_wire.encode(X, "float16")) - X).max() < 1e-2
+    i8 = embed_wire.encode(X, "int8")
+    assert len(i8) == 16 + 3 * 4 + X.size
+    assert np.abs(embed_wire.decode(i8) - X).max() <= np.abs(X).max() / 127
+
+def test_accept_negotiation():
+    assert embed_wire.negotiate("application/json") is None
+    assert embed_wire.negotiate(None) is None
+    assert embed_wire.negotiate("application/x-embeddings; dtype=float16") == "float16"
+    assert embed_wire.negotiate("application/octet-stream") == "float32"
+    assert embed_wire.negotiate(embed_wire.content_type("int8")) == "int8"
@@ -0,0 +1,49 @@
+import pytest
+from lab2_rag.api import hallu
+from lab2_rag.api.rerank_batcher import RerankBatcher
+
+CONTEXTS = ["The collector exports traces to Tempo.", "Loki stores the logs."]
+
+def test_split_sentences_and_v2_answer_text():
+    assert hallu.split_sentences("Traces go to Tempo. Logs go to Loki!\n- ok") == \
+        ["Traces go to Tempo.", "Logs go to Loki!"]
+    assert hallu.answer_text('{"answer": "Loki stores logs.", "citations": []}') == "Loki stores logs."
+
+def test_sentence_support_scores_each_sentence_against_best_context():
+    out = hallu.sentence_support("The collector exports traces. Bananas are yellow.", CONTEXTS)
+    sents = {s["text"]: s["support"] for s in out["sentences"]}
+    assert sents["The collector exports traces."] == 1.0
+    assert sents["Bananas are yellow."] == 0.0
+    assert out["support"] == 0.5 and out["min_sentence_support"] == 0.0
+
+def test_async_submit_matches_sync_scoring():
+    b = RerankBatcher(hallu.predict_pairs, max_batch=16, max_wait_ms=1, name="nli-test")
+    sents, pairs = hallu.sentence_pairs("Loki stores the logs. Tempo stores traces.", CONTEXTS)
+    got = hallu.aggregate(sents, len(CONTEXTS), b.submit(pairs).result(2))
+    b.close()
+    assert got == hallu.sentence_support("Loki stores the logs. Tempo stores traces.", CONTEXTS)
+
+def test_async_support_record_shares_the_answer_id(monkeypatch):
+    from concurrent.futures import Future
+    pytest.importorskip("flask")
+    pytest.importorskip("chromadb")
+    from lab2_rag.api import app as core
+
+    class Done:  # scores at submit, so the support record is written before finish_answer returns
+        def depth(self):
+            return 0
+        def submit(self, pairs):
+            f = Future()
+            f.set_result(hallu.predict_pairs(pairs))
+            return f
+
+    written = []
+    monkeypatch.setattr(core, "support_batcher", Done())
+    monkeypatch.setattr(core, "HALLU_MODE", "async")
+    monkeypatch.setattr(core, "append_session", written.append)
+    ctx = core.AskContext(q="Where do logs go?", topk=2, temperature=0.0, explain=False, model="gpt-4o-mini", pv="v1")
+    docs = [({"id": f"d{i}", "text": t, "metadata": {}, "dense_sim": 0.5}, 0.5) for i, t in enumerate(CONTEXTS)]
+    resp = core.finish_answer(ctx, "Loki stores the logs.", docs, "prompt", None)
+    answer, support = written
+    assert resp["support_pending"] and resp["answer_id"] == answer["answer_id"] == support["answer_id"]
+    assert support["type"] == "support" and support["answer_ts"] == answer["ts"] and "trace_id" not in support
@@ -0,0 +1,26 @@
+import numpy as np
+from retrieval.hash_embed import HashingEmbedder
+
+TEXTS = ["The collector exports traces to Datadog",
+         "the collector exported the traces to datadog!",
+         "Bananas are a yellow fruit",
+         ""]
+
+def test_shape_norm_and_empty_rows():
+    v = HashingEmbedder(dim=64).encode(TEXTS)
+    assert v.shape == (4, 64) and v.dtype == np.float32
+    assert np.allclose(np.linalg.norm(v[:3], axis=1), 1.0, atol=1e-5)
+    assert not v[3].any()
+    assert HashingEmbedder(dim=64).encode([]).shape == (0, 64)
+
+def test_deterministic_and_independent_of_batch():
+    a = HashingEmbedder(dim=128).encode(TEXTS)
+    b = np.vstack([HashingEmbedder(dim=128).encode([t]) for t in TEXTS])
+    assert np.array_equal(a, b)
+
+def test_related_text_is_closer_than_unrelated():
+    v = HashingEmbedder(dim=256).encode(TEXTS)
+    assert v[0] @ v[1] > 0.5 > v[0] @ v[2]
+    # char n-grams: a misspelling still lands near the original
+    w = HashingEmbedder(dim=256, word_ngrams=(1, 1)).encode(["observability pipeline", "observabilty pipelines", "banana"])
+    assert w[0] @ w[1] > w[0] @ w[2] + 0.3
@@ -0,0 +1,58 @@
+import threading
+import pytest
+from lab2_rag.kb_service.pipeline import Checkpoint, run_pipeline
+
+def docs(n):
+    for i in range(n):
+        yield {"id": f"d{i}", "text": f"text {i}", "metadata": {"source": f"d{i}"}}
+
+def quiet(**kw):
+    pass
+
+def test_every_doc_is_embedded_and_upserted_once(tmp_path):
+    upserted, lock = {}, threading.Lock()
+    def upsert(ids, texts, metas, vecs):
+        with lock:
+            for i, t, v in zip(ids, texts, vecs):
+                assert i not in upserted
+                upserted[i] = (t, v)
+    ckpt = Checkpoint(str(tmp_path / "ckpt"))
+    stats = run_pipeline(docs(103), lambda texts: [[len(t)] for t in texts], upsert,
+                         batch_size=8, upsert_batch=20, workers=3, queue_size=2, checkpoint=ckpt, log=quiet)
+    assert len(upserted) == 103
+    assert upserted["d7"] == ("text 7", [6])
+    assert stats["stages"]["embed"]["items"] == 103 and stats["stages"]["upsert"]["items"] == 103
+    assert len(Checkpoint(ckpt.path).done) == 103
+
+def test_embed_failures_are_retried(monkeypatch):
+    monkeypatch.setattr("lab2_rag.kb_service.pipeline.time.sleep", lambda s: None)
+    attempts = []
+    def flaky(texts):
+        attempts.append(1)
+        if len(attempts) % 2:
+            raise ConnectionError("embedder restarting")
+        return [[0.0] for _ in texts]
+    rows = []
+    run_pipeline(docs(10), flaky, lambda ids, *_: rows.extend(ids), batch_size=5, workers=1, retries=2, log=quiet)
+    assert sorted(rows) == sorted(f"d{i}" for i in range(10))
+
+def test_failed_run_resumes_from_checkpoint(tmp_path, monkeypatch):
+    monkeypatch.setattr("lab2_rag.kb_service.pipeline.time.sleep", lambda s: None)
+    path = str(tmp_path / "ckpt")
+    def broken(texts):
+        if "text 25" in texts:
+            raise RuntimeError("embedder down")
+        return [[0.0] for _ in texts]
+    first = []
+    with pytest.raises(RuntimeError):
+        run_pipeline(docs(40), broken, lambda ids, *_: first.extend(ids), batch_size=5, upsert_batch=5,
+                     workers=1, retries=1, checkpoint=Checkpoint(path), log=quiet)
+    assert first and "d25" not in first
+
+    second, skipped = [], []
+    stats = run_pipeline(docs(40), lambda texts: [[0.0] for _ in texts], lambda ids, *_: second.extend(ids),
+                         batch_size=5, workers=2, checkpoint=Checkpoint(path),
+                         on_skip=lambda d: skipped.append(d["id"]), log=quiet)
+    assert not set(first) & set(second)
+    assert set(first) | set(second) == {f"d{i}" for i in range(40)}
+    assert sorted(skipped) == sorted(first) and stats["skipped"] == len(first)
@@ -0,0 +1,128 @@
+import json
+import pytest
+from retrieval.kb_alias import CollectionAlias
+from services.kb_service.rebuild import BlueGreenRebuilder, RebuildRunning, embed_upsert
+
+class FakeCollection:
+    def __init__(self, name):
+        self.name, self.rows, self.metadata = name, {}, {}
+
+    def upsert(self, ids, documents, embeddings, metadatas):
+        for i, d in zip(ids, documents):
+            self.rows[i] = d
+
+    def get(self, ids, include):
+        return {"ids": [i for i in ids if i in self.rows]}
+
+    def count(self):
+        return len(self.rows)
+
+    def modify(self, metadata):
+        self.metadata = metadata
+
+class FakeClient:
+    def __init__(self):
+        self.cols = {}
+
+    def get_or_create_collection(self, name):
+        return self.cols.setdefault(name, FakeCollection(name))
+
+    def list_collections(self):
+        return list(self.cols)
+
+    def delete_collection(self, name):
+        del self.cols[name]
+
+def kb(tmp_path, n=6):
+    root = tmp_path / "kb"
+    root.mkdir()
+    for i in range(n):
+        (root / f"{i}.md").write_text(f"# Doc {i}\n" + " ".join(f"w{i}x{k}" for k in range(40)), encoding="utf-8")
+    return [(str(p), p.name) for p in sorted(root.glob("*.md"))]
+
+def rebuilder(tmp_path, client, files, embed, **kw):
+    alias = CollectionAlias(str(tmp_path / "alias.json"), "kb")
+    return BlueGreenRebuilder(client, alias, str(tmp_path / "state.json"), str(tmp_path / "manifest.json"),
+                              lambda: files, embed, window=64, overlap=8, workers=3, batch_size=2,
+                              retries=0, gc_delay_s=0, **kw)
+
+def test_rebuild_fills_shadow_switches_alias_and_drops_old(tmp_path):
+    client, files = FakeClient(), kb(tmp_path)
+    live = client.get_or_create_collection("kb")
+    live.rows["old"] = "stale"
+    seen_live = []
+    rb = rebuilder(tmp_path, client, files,
+                   lambda texts: seen_live.append(client.cols["kb"].count()) or [[1.0, 0.0] for _ in texts])
+    st = rb.start()
+    assert st["status"] == "running" and st["live"] == "kb"
+    rb.join()
+    st = rb.status()
+    assert st["status"] == "done" and st["embedded"] == 6 and st["progress"] == 1.0
+    assert st["live"] == st["collection"] != "kb" and st["previous"] == "kb"
+    assert set(seen_live) == {1}  # the live collection served unchanged during the fill
+    assert rb.alias.collection(client).count() == 6 and client.cols[st["collection"]].metadata["kb_version"]
+    assert sorted(json.load(open(tmp_path / "manifest.json"))["files"]) == [f"{i}.md" for i in range(6)]
+    rb._gc(st["collection"])
+    assert list(client.cols) == [st["collection"]]
+
+def test_interrupted_rebuild_resumes_its_shadow(tmp_path):
+    client, files = FakeClient(), kb(tmp_path)
+    calls = []
+    def flaky(texts):
+        calls.append(len(texts))
+        if len(calls) == 2:
+            raise ConnectionError("embedder restarting")
+        return [[0.0, 1.0] for _ in texts]
+    rb = rebuilder(tmp_path, client, files, flaky)
+    rb.start()
+    rb.join()
+    st = rb.status()
+    assert st["status"] == "failed" and "embedder restarting" in st["error"] and st["live"] == "kb"
+    shadow = st["collection"]
+    partial = client.cols[shadow].count()
+    assert 0 < partial < 6
+
+    embedded = []
+    rb2 = rebuilder(tmp_path, client, files, lambda texts: embedded.extend(texts) or [[0.0, 1.0] for _ in texts])
+    rb2.start()
+    rb2.join()
+    st = rb2.status()
+    assert st["status"] == "done" and st["collection"] == shadow and st["resumes"] == 1
+    assert len(embedded) == 6 - partial and client.cols[shadow].count() == 6
+
+def test_second_start_while_running_is_rejected(tmp_path):
+    import threading
+    client, files, gate = FakeClient(), kb(tmp_path, 2), threading.Event()
+    rb = rebuilder(tmp_path, client, files, lambda texts: gate.wait() and [[0.0] for _ in texts])
+    rb.start()
+    with pytest.raises(RebuildRunning):
+        rb.start()
+    gate.set()
+    rb.join()
+    assert rb.status()["status"] == "done"
+
+def test_embed_upsert_streams_batches_and_retries(monkeypatch):
+    monkeypatch.setattr("services.kb_service.rebuild.time.sleep", lambda s: None)
+    read, calls = [], []
+
+    def chunks():
+        for i in range(7):
+            read.append(i)
+            yield {"id": f"c{i}", "text": f"t{i}", "metadata": {}}
+
+    def flaky(texts):
+        calls.append(len(texts))
+        if len(calls) == 1:
+            raise ConnectionError("embedder restarting")
+        return [[0.0]] * len(texts)
+
+    col, batches = FakeCollection("kb"), []
+    embed_upsert(col, chunks(), flaky, batch_size=3, workers=1, retries=1, on_batch=batches.append)
+    assert col.count() == 7 and sorted(batches) == [1, 3, 3] and len(calls) == 4
+
+    def down(texts):
+        raise ConnectionError("down")
+    read.clear()
+    with pytest.raises(ConnectionError):
+        embed_upsert(FakeCollection("kb"), chunks(), down, batch_size=1, workers=1, retries=0)
+    assert len(read) < 7  # reading stopped at the first failure
@@ -0,0 +1,62 @@
+import os
+from retrieval.kb_sync import Manifest, SyncPlan
+
+SECTION = "## Part {i}\n" + " ".join(f"word{{i}}x{k}" for k in range(20)) + "\n\n"
+
+def write(root, name, parts):
+    p = root / name
+    p.write_text("# Doc\n" + "".join(SECTION.format(i=i) for i in parts), encoding="utf-8")
+    return p
+
+def run(root, store, manifest_path, **kw):
+    files = [(str(p), p.name) for p in sorted(root.glob("*.md"))]
+    plan = SyncPlan(Manifest(manifest_path), files, window=64, overlap=8, **kw)
+    embedded = list(plan.changes())
+    for c in embedded:
+        store[c["id"]] = c["text"]
+    for doc_id in plan.deletes:
+        store.pop(doc_id)
+    plan.commit()
+    return plan, embedded
+
+def test_sync_embeds_only_changes_and_deletes_removed_files(tmp_path):
+    kb, store, manifest = tmp_path / "kb", {}, str(tmp_path / "manifest.json")
+    kb.mkdir()
+    write(kb, "a.md", range(3))
+    b = write(kb, "b.md", range(10, 12))
+    plan, embedded = run(kb, store, manifest)
+    assert plan.counts["added"] == 5 and len(embedded) == 5 and plan.changed
+
+    plan, embedded = run(kb, store, manifest)  # unchanged: stat only, nothing read
+    assert embedded == [] and not plan.changed
+    assert plan.counts["skipped"] == 5 and plan.counts["files_read"] == 0
+
+    write(kb, "a.md", [0, 1, 5])  # one section replaced
+    os.remove(b)
+    write(kb, "c.md", [20])
+    plan, embedded = run(kb, store, manifest)
+    c = plan.counts
+    assert (c["added"], c["updated"], c["deleted"], c["skipped"]) == (1, 1, 2, 2)
+    assert len(embedded) == 2 and len(store) == 4
+    assert sorted(Manifest(manifest).files) == ["a.md", "c.md"]
+    assert not any("word10x" in t for t in store.values())
+
+def test_touched_file_is_rehashed_not_rechunked(tmp_path):
+    store, manifest = {}, str(tmp_path / "m.json")
+    a = write(tmp_path, "a.md", range(2))
+    run(tmp_path, store, manifest)
+    st = os.stat(a)
+    os.utime(a, (st.st_atime, st.st_mtime + 10))
+    plan, embedded = run(tmp_path, store, manifest)
+    assert embedded == [] and plan.counts["files_read"] == 1 and not plan.changed
+
+def test_existing_ids_skip_embedding_and_param_change_forces(tmp_path):
+    write(tmp_path, "a.md", range(3))
+    store = {}
+    run(tmp_path, store, None)  # no manifest persisted
+    plan, embedded = run(tmp_path, store, str(tmp_path / "m.json"), exists=lambda ids: [i for i in ids if i in store])
+    assert embedded == [] and plan.counts["skipped"] == 3 and len(plan.refresh) == 3
+
+    files = [(str(tmp_path / "a.md"), "a.md")]
+    plan = SyncPlan(Manifest(str(tmp_path / "m.json")), files, window=32, overlap=4)
+    assert plan.force and list(plan.changes())
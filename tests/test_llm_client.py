@@ -0,0 +1,42 @@
+import threading, time
+import pytest
+
+pytest.importorskip("openai")
+from workshop_app import llm_client
+from workshop_app.llm_client import PoolConfig, close_clients, get_client
+
+def test_one_pooled_client_per_base_url_and_key():
+    close_clients()
+    cfg = PoolConfig(max_connections=4, connect_timeout_s=1.5, read_timeout_s=30)
+    a = get_client("http://llm.local/v1", "k1", cfg)
+    assert get_client("http://llm.local/v1/", "k1") is a
+    assert get_client("http://llm.local/v1", "k2") is not a
+    assert get_client("http://other.local/v1", "k1") is not a
+    assert a.max_retries == 0
+    t = a._client.timeout
+    assert (t.connect, t.read) == (1.5, 30)
+    assert all("k1" not in part for key in llm_client._clients for part in key)
+    close_clients()
+    assert not llm_client._clients and a._client.is_closed
+    assert get_client("http://llm.local/v1", "k1") is not a
+    close_clients()
+
+def test_coalesced_chat_shares_the_leaders_completion(monkeypatch):
+    gate, calls = threading.Event(), []
+    def once(user_text, system_text, model, *_):
+        calls.append(user_text)
+        gate.wait(1)
+        return llm_client.LLMResult("hi", model, 3, 1, 5)
+    monkeypatch.setattr(llm_client, "_chat_once", once)
+    base = llm_client.coalesce_stats()["coalesced"]
+    out = []
+    threads = [threading.Thread(target=lambda: out.append(llm_client.chat("same", coalesce=True))) for _ in range(3)]
+    for t in threads:
+        t.start()
+    while llm_client.coalesce_stats()["coalesced"] < base + 2:
+        time.sleep(0.001)
+    gate.set()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1 and sorted(r.coalesced for r in out) == [False, True, True]
+    assert all(r.content == "hi" for r in out)
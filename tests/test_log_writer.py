@@ -0,0 +1,49 @@
+import glob, gzip, json, os, signal, subprocess, sys, time
+from lab2_rag.api.log_writer import JsonlWriter
+
+def read_all(d):
+    out = []
+    for p in sorted(glob.glob(os.path.join(d, "*.jsonl*"))):
+        opener = gzip.open if p.endswith(".gz") else open
+        with opener(p, "rt", encoding="utf-8") as f:
+            out += [json.loads(l) for l in f]
+    return out
+
+def test_close_flushes_everything(tmp_path):
+    w = JsonlWriter(str(tmp_path), flush_interval_s=60, batch_size=1000)
+    for i in range(50):
+        assert w.write({"i": i})
+    w.close()
+    assert sorted(r["i"] for r in read_all(str(tmp_path))) == list(range(50))
+
+def test_rotation_compresses_closed_segments(tmp_path):
+    w = JsonlWriter(str(tmp_path), flush_interval_s=0.01, batch_size=1, rotate_bytes=64, compress=True)
+    for i in range(20):
+        w.write({"i": i, "pad": "x" * 40})
+    w.close()
+    time.sleep(0.2)  # gzip runs in its own thread
+    assert glob.glob(os.path.join(str(tmp_path), "*.jsonl.gz"))
+    assert len(read_all(str(tmp_path))) == 20
+
+def test_drop_policy_counts(tmp_path):
+    dropped = []
+    w = JsonlWriter(str(tmp_path), queue_size=1, flush_interval_s=60, batch_size=10**6,
+                    backpressure="drop", on_drop=lambda: dropped.append(1))
+    results = [w.write({"i": i}) for i in range(200)]
+    w.close()
+    assert dropped and results.count(False) == len(dropped)
+
+def test_sigterm_flushes_buffered_records(tmp_path):
+    script = (
+        "import os, signal, time\n"
+        "from lab2_rag.api.log_writer import JsonlWriter, exit_on_sigterm\n"
+        f"w = JsonlWriter({str(tmp_path)!r}, flush_interval_s=60, batch_size=1000)\n"
+        "assert exit_on_sigterm()\n"
+        "for i in range(20): w.write({'i': i})\n"
+        "os.kill(os.getpid(), signal.SIGTERM)\n"
+        "time.sleep(10)\n"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    r = subprocess.run([sys.executable, "-c", script], cwd=root, timeout=20)
+    assert r.returncode == 128 + signal.SIGTERM
+    assert sorted(x["i"] for x in read_all(str(tmp_path))) == list(range(20))
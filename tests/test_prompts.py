@@ -0,0 +1,23 @@
+from lab2_rag.api.prompts import check_prefix, get_prompt, get_system, is_json, prefix_digest, versions
+
+SYS = "Answer using only the provided CONTEXT."
+
+def test_prefix_versions_keep_static_text_ahead_of_variables():
+    old = {v: check_prefix(v, SYS) for v in ("v1", "v2")}
+    for v in ("v3", "v4"):
+        r = check_prefix(v, SYS)
+        assert r["ok"] and r["static_share"] > 0.9
+        assert r["static_share"] > max(o["static_share"] for o in old.values())
+
+def test_digest_is_the_same_for_every_request_of_a_version():
+    for v in versions():
+        digests = {prefix_digest(v, SYS, get_prompt(v, q, ctx))
+                   for q, ctx in [("a?", "one"), ("What is RAG?", "x" * 500), ("", "")]}
+        assert len(digests) == 1
+    assert prefix_digest("v3", SYS, get_prompt("v3", "q", "c")) != prefix_digest("v4", SYS, get_prompt("v4", "q", "c"))
+
+def test_mapping_versions():
+    assert get_system("v1", SYS) == SYS and get_system("v3", SYS) != SYS
+    assert get_prompt("v3", "why?", "because").endswith("because\n\nQUESTION: why?\n")
+    assert is_json("v2") and is_json("v4") and not is_json("v1") and not is_json("v3")
+    assert get_prompt("nope", "q", "c") == get_prompt("v1", "q", "c")
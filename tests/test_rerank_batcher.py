@@ -0,0 +1,31 @@
+import threading
+from lab2_rag.api.rerank_batcher import RerankBatcher, as_score_list
+
+def test_concurrent_requests_share_one_pass_and_get_own_scores():
+    calls = []
+    def score(pairs):
+        calls.append(len(pairs))
+        return [float(len(p[1])) for p in pairs]
+    b = RerankBatcher(score, max_batch=64, max_wait_ms=50)
+    out = {}
+    def ask(i):
+        out[i] = b.score([("q", "x" * i), ("q", "y" * (i + 1))])
+    threads = [threading.Thread(target=ask, args=(i,)) for i in range(1, 5)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    b.close()
+    assert out == {i: [float(i), float(i + 1)] for i in range(1, 5)}
+    assert sum(calls) == 8 and len(calls) < 4
+
+def test_errors_propagate_to_callers():
+    b = RerankBatcher(lambda pairs: 1 / 0, max_wait_ms=1)
+    try:
+        b.score([("q", "p")])
+        assert False, "expected ZeroDivisionError"
+    except ZeroDivisionError:
+        pass
+    finally:
+        b.close()
+
+def test_single_float_score_is_listified():
+    assert as_score_list(0.5) == [0.5]
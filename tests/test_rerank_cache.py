@@ -0,0 +1,30 @@
+from lab2_rag.api.rerank_cache import RerankScoreCache
+
+def test_disk_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "rerank.sqlite")
+    c = RerankScoreCache("bge", path=path)
+    k = c.key("What model?", "001_intro.md", "llama3.1 via ollama")
+    c.put_many({k: 0.8})
+    fresh = RerankScoreCache("bge", path=path)
+    assert fresh.get_many([k]) == {k: 0.8}
+
+def test_key_depends_on_content_and_model_not_spacing():
+    a, b = RerankScoreCache("bge"), RerankScoreCache("other")
+    k = a.key("What  model?", "c1", "text")
+    assert k == a.key("what model?", "c1", "text")
+    assert k != a.key("what model?", "c1", "edited text")
+    assert k != b.key("what model?", "c1", "text")
+
+def test_disk_tier_is_bounded(tmp_path):
+    path = str(tmp_path / "rerank.sqlite")
+    c = RerankScoreCache("bge", maxsize=1, path=path, disk_max_rows=3)
+    keys = [c.key(f"q{i}", "c", "t") for i in range(5)]
+    for k in keys[:3]:
+        c.put_many({k: 0.5})
+    c.get_many([keys[0]])  # disk hit refreshes its last-used time
+    c.put_many({keys[3]: 0.5, keys[4]: 0.5})
+    assert c.prune() == 2
+    fresh = RerankScoreCache("bge", path=path, disk_max_rows=3)
+    assert set(fresh.get_many(keys)) == {keys[0], keys[3], keys[4]}
+    aged = RerankScoreCache("bge", path=path, disk_ttl_s=1e-9)
+    assert aged.get_many(keys) == {}
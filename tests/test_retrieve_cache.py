@@ -0,0 +1,39 @@
+import time
+from lab2_rag.api import cache
+from retrieval.kb_version import VersionWatcher, bump_kb_version, read_kb_version, read_space
+
+def test_lru_eviction_counts():
+    ev = []
+    c = cache.TTLCache(maxsize=2, ttl_s=60, on_evict=lambda r, n: ev.append((r, n)))
+    c.put("a", 1); c.put("b", 2); c.get("a"); c.put("c", 3)
+    assert c.get("b") is None and c.get("a") == 1
+    assert ev == [("lru", 1)]
+
+def test_ttl_expiry():
+    c = cache.TTLCache(maxsize=4, ttl_s=0.01)
+    c.put("a", 1); time.sleep(0.02)
+    assert c.get("a") is None
+
+def test_normalize_query():
+    assert cache.normalize_query("  What   MODEL? ") == "what model?"
+
+def test_version_watcher_fires_on_change():
+    versions, seen = iter(["v1", "v2"]), []
+    w = VersionWatcher(lambda: next(versions), interval_s=0, on_change=lambda o, n: seen.append((o, n)))
+    assert w.current() == "v1" and w.current() == "v2"
+    assert seen == [("v1", "v2")]
+
+class _Col:
+    def __init__(self, metadata):
+        self.metadata = metadata
+
+    def modify(self, metadata):
+        assert not any(k.startswith("hnsw:") for k in metadata)  # Chroma refuses to change them
+        self.metadata = metadata  # what a reloaded collection reports: hnsw:* is gone
+
+def test_bump_keeps_the_distance_space():
+    col = _Col({"hnsw:space": "cosine"})
+    v1 = bump_kb_version(col)
+    assert read_kb_version(col) == v1 and read_space(col) == "cosine"
+    bump_kb_version(col)
+    assert read_space(col) == "cosine" and read_space(_Col(None)) == "l2"
@@ -0,0 +1,88 @@
+import asyncio, threading, time
+import pytest
+from utils.single_flight import SingleFlight, flight_key
+
+def test_concurrent_duplicates_share_one_call():
+    sf, calls, gate = SingleFlight(), [], threading.Event()
+    def work():
+        calls.append(1)
+        gate.wait(1)
+        return "answer"
+    out = []
+    threads = [threading.Thread(target=lambda: out.append(sf.do("k", work))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    while sf.stats()["coalesced"] < 4:
+        time.sleep(0.001)
+    gate.set()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1 and sorted(out) == [("answer", False)] + [("answer", True)] * 4
+    assert sf.do("k", lambda: "again") == ("again", False)  # nothing is cached after the flight lands
+    assert flight_key("m", "sys", "q", 0.2, "v1") != flight_key("m", "sys", "q", 0.3, "v1")
+
+def test_leader_error_reaches_followers():
+    sf, gate = SingleFlight(), threading.Event()
+    def boom():
+        gate.wait(1)
+        raise ConnectionError("llm down")
+    errors = []
+    def call():
+        try:
+            sf.do("k", boom)
+        except ConnectionError as e:
+            errors.append(str(e))
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for t in threads:
+        t.start()
+    while sf.stats()["coalesced"] < 2:
+        time.sleep(0.001)
+    gate.set()
+    for t in threads:
+        t.join()
+    assert errors == ["llm down"] * 3 and sf.stats()["in_flight"] == 0
+
+def test_late_stream_follower_replays_then_follows():
+    sf, first, rest = SingleFlight(), threading.Event(), threading.Event()
+    def tokens():
+        yield "a"
+        first.set()
+        rest.wait(1)
+        yield from ("b", "c")
+    lead, shared = sf.stream("k", tokens)
+    assert not shared
+    first.wait(1)
+    follow, shared = sf.stream("k", tokens)
+    assert shared
+    rest.set()
+    assert list(follow) == ["a", "b", "c"] and list(lead) == ["a", "b", "c"]
+
+def test_async_followers_and_cancelled_leader():
+    sf, calls = SingleFlight(), []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return 42
+
+    async def tokens():
+        for t in ("x", "y"):
+            await asyncio.sleep(0.01)
+            yield t
+
+    async def main():
+        leader = asyncio.create_task(sf.ado("k", work))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(sf.ado("k", work))
+        await asyncio.sleep(0.01)
+        leader.cancel()  # the client went away; the shared generation keeps going
+        assert await follower == (42, True) and len(calls) == 1
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+
+        a, _ = sf.astream("s", tokens)
+        b, shared = sf.astream("s", tokens)
+        assert shared
+        return [t async for t in a], [t async for t in b]
+
+    assert asyncio.run(main()) == (["x", "y"], ["x", "y"])
@@ -0,0 +1,29 @@
+from lab2_rag.api.streaming import V2StreamValidator, sse
+
+def feed_all(chunks):
+    v = V2StreamValidator()
+    for c in chunks:
+        v.feed(c)
+    return v
+
+def test_valid_json_object_across_chunks():
+    v = feed_all(['  {"ans', 'wer": "a } in \\"str\\"",', ' "citations": [], "confidence": 0.9}', "\n"])
+    assert v.ok and v.complete
+
+def test_rejects_prose_early():
+    v = V2StreamValidator()
+    assert v.feed("Sure! Here") is False
+    assert v.pos == 1
+
+def test_rejects_trailing_text():
+    v = feed_all(['{"answer": "x"}', " extra"])
+    assert not v.ok
+
+def test_rejects_mismatched_closer():
+    for text in ['{"a": [1}', '{"a": ]', '{"a": {"b": 1]}']:
+        v = V2StreamValidator()
+        assert v.feed(text) is False and not v.ok
+    assert feed_all(['{"a": [{"b": [1]}]', "}"]).complete
+
+def test_sse_frame():
+    assert sse("token", {"t": "hi"}) == 'event: token\ndata: {"t": "hi"}\n\n'
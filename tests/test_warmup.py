@@ -0,0 +1,50 @@
+import threading, time
+import pytest
+from lab2_rag.api.warmup import Warmup
+
+def test_components_load_in_background_and_report_status():
+    done = []
+    w = Warmup(on_done=done.append)
+    w.add("fast", lambda: "ok")
+    w.add("slow", lambda: time.sleep(0.05) or "model")
+    w.add("broken", lambda: 1 / 0)
+    w.start()
+    assert w.get("slow") is None
+    assert w.wait("slow", timeout=2) == "model"
+    w.wait("fast", timeout=2)
+    try:
+        w.wait("broken", timeout=2)
+        assert False, "expected RuntimeError"
+    except RuntimeError:
+        pass
+    st = w.status(["fast", "slow"])
+    assert st["ready"] and st["components"]["broken"]["error"]
+    assert done and st["import_to_ready_s"] == done[0]
+
+def test_pending_until_loaded_or_failed():
+    gate = threading.Event()
+    w = Warmup()
+    w.add("slow", lambda: gate.wait(2) and "model")
+    w.add("broken", lambda: 1 / 0)
+    assert w.pending("slow") and not w.pending("unknown")
+    w.start()
+    try:
+        w.wait("broken", timeout=2)
+    except RuntimeError:
+        pass
+    assert w.pending("slow") and not w.pending("broken")
+    gate.set()
+    w.wait("slow", timeout=2)
+    assert not w.pending("slow")
+
+def test_request_path_does_not_wait_for_chroma():
+    pytest.importorskip("flask")
+    pytest.importorskip("chromadb")
+    from lab2_rag.api import app as core
+    assert core.warm.pending("chroma")  # no Chroma server under test: it keeps retrying
+    t = time.monotonic()
+    with pytest.raises(RuntimeError):
+        core.collection()
+    assert core.hybrid_retrieve("what model does the demo use?") == []  # sparse-only, nothing indexed
+    core.cached_retrieve("what model does the demo use?")
+    assert time.monotonic() - t < 1.0
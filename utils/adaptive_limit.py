@@ -0,0 +1,223 @@
+from __future__ import annotations
+import asyncio, math, threading, time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Callable, Optional
+
+# Adaptive concurrency limit (gradient, after Netflix's concurrency-limits).
+# Every finished request reports how long it held its slot. A slow EMA of those
+# samples (long_rtt) stands for "healthy" latency, a fast one (short_rtt) for
+# current latency. Each sample moves the limit towards
+#   limit * clamp(tolerance * long_rtt / short_rtt, 0.5, 1) + sqrt(limit)
+# so the limit creeps up while latency holds and shrinks as soon as the backend
+# queues (short_rtt > tolerance * long_rtt). Failed requests back the limit off
+# multiplicatively. The limit does not grow while less than half of it is used.
+#
+# Requests over the limit wait in a bounded FIFO until their deadline. A full
+# queue, or an expected wait longer than the deadline, is rejected at once with
+# Overloaded (-> 503 + Retry-After), instead of piling up until client timeouts.
+
+class Overloaded(RuntimeError):
+    def __init__(self, reason: str, retry_after_s: int):
+        super().__init__(f"overloaded ({reason})")
+        self.reason, self.retry_after_s = reason, retry_after_s
+
+class _Waiter:
+    __slots__ = ("state", "wake")
+
+    def __init__(self, wake: Callable[[], None]):
+        self.state, self.wake = "waiting", wake  # waiting -> granted | cancelled
+
+class Slot:
+    """One admitted request. `drop()` marks it failed; `observe(s)` overrides the measured latency."""
+    __slots__ = ("_limiter", "_t0", "_latency", "_dropped", "_released")
+
+    def __init__(self, limiter: "AdaptiveLimiter"):
+        self._limiter, self._t0 = limiter, time.monotonic()
+        self._latency: Optional[float] = None
+        self._dropped = self._released = False
+
+    def observe(self, latency_s: float) -> None:
+        self._latency = latency_s
+
+    def drop(self) -> None:
+        self._dropped = True
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            latency = self._latency if self._latency is not None else time.monotonic() - self._t0
+            self._limiter._release(latency, self._dropped)
+
+class AdaptiveLimiter:
+    """Gradient concurrency limiter with a bounded, deadline-aware wait queue.
+
+    `limit_slot()` / `alimit_slot()` wrap a request (blocking threads / asyncio); both raise
+    Overloaded when the request is shed. `on_change(in_flight, queued, limit)` runs
+    under the lock after every state change (keep it cheap, e.g. gauge sets);
+    `on_shed(reason)` runs once per rejected request.
+    """
+
+    def __init__(self, initial: int = 8, min_limit: int = 1, max_limit: int = 64, max_queue: int = 32,
+                 queue_timeout_s: float = 5.0, tolerance: float = 1.5, smoothing: float = 0.2,
+                 long_window: int = 600, backoff: float = 0.9,
+                 on_change: Optional[Callable[[int, int, int], None]] = None,
+                 on_shed: Optional[Callable[[str], None]] = None):
+        self.min_limit, self.max_limit = min_limit, max_limit
+        self.max_queue, self.queue_timeout_s = max_queue, queue_timeout_s
+        self.tolerance, self.smoothing, self.backoff = tolerance, smoothing, backoff
+        self._long_alpha = 2.0 / (long_window + 1)
+        self.on_change, self.on_shed = on_change, on_shed
+        self._limit = float(max(min_limit, min(max_limit, initial)))
+        self._long_rtt = self._short_rtt = 0.0
+        self._in_flight = 0
+        self._waiters: "deque[_Waiter]" = deque()
+        self._lock = threading.Lock()
+        self._changed()
+
+    @property
+    def limit(self) -> int:
+        return max(self.min_limit, int(self._limit))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"limit": self.limit, "in_flight": self._in_flight, "queued": len(self._waiters),
+                    "short_rtt_s": round(self._short_rtt, 4), "long_rtt_s": round(self._long_rtt, 4)}
+
+    # --- admission ---
+    @contextmanager
+    def limit_slot(self, timeout: Optional[float] = None):
+        slot = self.acquire(timeout)
+        try:
+            yield slot
+        except BaseException:
+            slot.drop()
+            raise
+        finally:
+            slot.release()
+
+    @asynccontextmanager
+    async def alimit_slot(self, timeout: Optional[float] = None):
+        slot = await self.acquire_async(timeout)
+        try:
+            yield slot
+        except BaseException:
+            slot.drop()
+            raise
+        finally:
+            slot.release()
+
+    def acquire(self, timeout: Optional[float] = None) -> Slot:
+        ev = threading.Event()
+        w, wait_s = self._enter(ev.set, timeout)
+        if w is None:
+            return Slot(self)
+        ev.wait(wait_s)
+        return self._settle(w)
+
+    async def acquire_async(self, timeout: Optional[float] = None) -> Slot:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        w, wait_s = self._enter(lambda: loop.call_soon_threadsafe(_resolve, fut), timeout)
+        if w is None:
+            return Slot(self)
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), wait_s)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            with self._lock:
+                granted = w.state == "granted"
+                self._cancel(w)
+            if granted:
+                self._release(None, False)
+            raise
+        return self._settle(w)
+
+    def _enter(self, wake: Callable[[], None], timeout: Optional[float]):
+        """Admit now (None, 0), queue (waiter, wait_s) or raise Overloaded."""
+        wait_s = self.queue_timeout_s if timeout is None else min(timeout, self.queue_timeout_s)
+        with self._lock:
+            if self._in_flight < self.limit and not self._waiters:
+                self._in_flight += 1
+                self._changed()
+                return None, 0.0
+            queued = len(self._waiters)
+            expected = self._expected_wait(queued + 1)
+            if queued >= self.max_queue:
+                reason = "queue_full"
+            elif wait_s <= 0 or expected > wait_s:
+                reason = "deadline"
+            else:
+                w = _Waiter(wake)
+                self._waiters.append(w)
+                self._changed()
+                return w, wait_s
+        self._shed(reason, expected)
+
+    def _settle(self, w: _Waiter) -> Slot:
+        with self._lock:
+            if w.state == "granted":
+                return Slot(self)
+            self._cancel(w)
+            expected = self._expected_wait(len(self._waiters) + 1)
+        self._shed("timeout", expected)
+
+    def _cancel(self, w: _Waiter) -> None:
+        if w.state == "waiting":
+            w.state = "cancelled"
+            try:
+                self._waiters.remove(w)
+            except ValueError:
+                pass
+            self._changed()
+
+    def _shed(self, reason: str, expected_wait_s: float):
+        if self.on_shed:
+            self.on_shed(reason)
+        raise Overloaded(reason, max(1, min(60, math.ceil(expected_wait_s or self._short_rtt or 1.0))))
+
+    def _expected_wait(self, position: int) -> float:
+        """Seconds until the `position`-th waiter gets a slot, at the current latency."""
+        return self._short_rtt * math.ceil(position / max(1, self.limit))
+
+    # --- feedback ---
+    def _release(self, latency: Optional[float], dropped: bool) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            if dropped:
+                self._limit = max(self.min_limit, self._limit * self.backoff)
+            elif latency is not None and latency > 0:
+                self._sample(latency)
+            self._grant()
+            self._changed()
+
+    def _sample(self, rtt: float) -> None:
+        if self._long_rtt == 0.0:
+            self._long_rtt = self._short_rtt = rtt
+            return
+        self._short_rtt += 0.5 * (rtt - self._short_rtt)
+        self._long_rtt += self._long_alpha * (rtt - self._long_rtt)
+        if self._long_rtt > 2 * self._short_rtt:  # latency recovered: let the baseline follow it down
+            self._long_rtt *= 0.95
+        if self._in_flight + 1 < self._limit / 2:  # app-limited: the sample says nothing about a higher limit
+            return
+        gradient = max(0.5, min(1.0, self.tolerance * self._long_rtt / self._short_rtt))
+        target = self._limit * gradient + math.sqrt(self._limit)
+        self._limit = (1 - self.smoothing) * self._limit + self.smoothing * target
+        self._limit = max(self.min_limit, min(self.max_limit, self._limit))
+
+    def _grant(self) -> None:
+        while self._waiters and self._in_flight < self.limit:
+            w = self._waiters.popleft()
+            w.state = "granted"
+            self._in_flight += 1
+            w.wake()
+
+    def _changed(self) -> None:
+        if self.on_change:
+            self.on_change(self._in_flight, len(self._waiters), self.limit)
+
+def _resolve(fut: "asyncio.Future") -> None:
+    if not fut.done():
+        fut.set_result(None)
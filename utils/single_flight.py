@@ -0,0 +1,195 @@
+from __future__ import annotations
+import asyncio, hashlib, json, threading
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+# Single-flight: concurrent callers with the same key share one execution.
+# The first caller (leader) starts the work; callers arriving while it runs
+# (followers) wait for the leader's result or exception instead of starting
+# their own. Nothing is kept once the work finishes - this is deduplication of
+# in-flight work, not a cache, so a later identical request runs again.
+#
+# Streams are pumped by a background thread (or task) into a broadcast buffer.
+# Every consumer, the leader included, replays it from the start and then
+# follows it live, so one consumer disconnecting never cuts off the others.
+
+def flight_key(*parts: Any) -> str:
+    """Stable digest of the request fields that decide the output (model, prompts, temperature, version)."""
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+def _resolve(fut: "asyncio.Future") -> None:
+    if not fut.done():
+        fut.set_result(None)
+
+class _Broadcast:
+    def __init__(self):
+        self.items: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._cond = threading.Condition()
+        self._wakers: List[Tuple[asyncio.AbstractEventLoop, "asyncio.Future"]] = []
+
+    def _notify(self) -> None:
+        self._cond.notify_all()
+        for loop, fut in self._wakers:
+            loop.call_soon_threadsafe(_resolve, fut)
+        self._wakers.clear()
+
+    def put(self, item: Any) -> None:
+        with self._cond:
+            self.items.append(item)
+            self._notify()
+
+    def close(self, error: Optional[BaseException] = None) -> None:
+        with self._cond:
+            self.done, self.error = True, error
+            self._notify()
+
+    def _tail(self, i: int):
+        batch = self.items[i:]
+        if batch or not self.done:
+            return batch
+        if self.error is not None:
+            raise self.error
+        return None
+
+    def follow(self) -> Iterator[Any]:
+        i = 0
+        while True:
+            with self._cond:
+                while i >= len(self.items) and not self.done:
+                    self._cond.wait()
+                batch = self._tail(i)
+            if batch is None:
+                return
+            i += len(batch)
+            yield from batch
+
+    async def afollow(self) -> AsyncIterator[Any]:
+        i = 0
+        while True:
+            fut = None
+            with self._cond:
+                if i >= len(self.items) and not self.done:
+                    loop = asyncio.get_running_loop()
+                    fut = loop.create_future()
+                    self._wakers.append((loop, fut))
+                else:
+                    batch = self._tail(i)
+            if fut is not None:
+                await fut
+                continue
+            if batch is None:
+                return
+            i += len(batch)
+            for item in batch:
+                yield item
+
+class SingleFlight:
+    """Coalesces concurrent identical calls: `do` / `ado` for results, `stream` / `astream` for streams.
+
+    Every method returns (value, shared); `shared` is True for followers. Thread-safe;
+    asyncio followers may wait on a leader running in another thread or loop.
+    """
+
+    def __init__(self, name: str = "single-flight"):
+        self.name = name
+        self.leaders = self.coalesced = 0
+        self._calls: Dict[Hashable, Future] = {}
+        self._streams: Dict[Hashable, _Broadcast] = {}
+        self._tasks: set = set()
+        self._lock = threading.Lock()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"leaders": self.leaders, "coalesced": self.coalesced,
+                    "in_flight": len(self._calls) + len(self._streams)}
+
+    def _join(self, table: dict, key: Hashable, make: Callable[[], Any]):
+        with self._lock:
+            entry = table.get(key)
+            if entry is not None:
+                self.coalesced += 1
+                return entry, False
+            entry = table[key] = make()
+            self.leaders += 1
+            return entry, True
+
+    def _finish(self, table: dict, key: Hashable, entry: Any) -> None:
+        with self._lock:
+            if table.get(key) is entry:
+                del table[key]
+
+    # --- results ---
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        fut, leader = self._join(self._calls, key, Future)
+        if not leader:
+            return fut.result(), True
+        try:
+            value = fn()
+        except BaseException as e:
+            self._finish(self._calls, key, fut)
+            fut.set_exception(e)
+            raise
+        self._finish(self._calls, key, fut)
+        fut.set_result(value)
+        return value, False
+
+    async def ado(self, key: Hashable, afn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        fut, leader = self._join(self._calls, key, Future)
+        if leader:
+            # the work runs as its own task, so a leader whose client goes away does not cancel it for followers
+            task = asyncio.ensure_future(afn())
+            self._tasks.add(task)
+            task.add_done_callback(lambda t: self._settle(key, fut, t))
+            return await asyncio.shield(task), False
+        return await asyncio.wrap_future(fut), True
+
+    def _settle(self, key: Hashable, fut: Future, task: "asyncio.Task") -> None:
+        self._tasks.discard(task)
+        self._finish(self._calls, key, fut)
+        if task.cancelled():
+            fut.set_exception(asyncio.CancelledError())
+        elif task.exception() is not None:
+            fut.set_exception(task.exception())
+        else:
+            fut.set_result(task.result())
+
+    # --- streams ---
+    def stream(self, key: Hashable, make_iter: Callable[[], Iterable[Any]]) -> Tuple[Iterator[Any], bool]:
+        b, leader = self._join(self._streams, key, _Broadcast)
+        if leader:
+            threading.Thread(target=self._pump, args=(key, b, make_iter), name=f"{self.name}-pump",
+                             daemon=True).start()
+        return b.follow(), not leader
+
+    def _pump(self, key: Hashable, b: _Broadcast, make_iter: Callable[[], Iterable[Any]]) -> None:
+        error = None
+        try:
+            for item in make_iter():
+                b.put(item)
+        except BaseException as e:
+            error = e
+        finally:
+            self._finish(self._streams, key, b)
+            b.close(error)
+
+    def astream(self, key: Hashable, make_aiter: Callable[[], AsyncIterator[Any]]) -> Tuple[AsyncIterator[Any], bool]:
+        """Like `stream`, pumped by a task on the running loop. Call from a coroutine."""
+        b, leader = self._join(self._streams, key, _Broadcast)
+        if leader:
+            task = asyncio.ensure_future(self._apump(key, b, make_aiter))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return b.afollow(), not leader
+
+    async def _apump(self, key: Hashable, b: _Broadcast, make_aiter: Callable[[], AsyncIterator[Any]]) -> None:
+        error = None
+        try:
+            async for item in make_aiter():
+                b.put(item)
+        except BaseException as e:
+            error = e
+        finally:
+            self._finish(self._streams, key, b)
+            b.close(error)
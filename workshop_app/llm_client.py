@@ -1,14 +1,24 @@
 from __future__ import annotations
 
+import hashlib
+import importlib.util
+import logging
 import os
+import threading
 import time
-from dataclasses import dataclass
-from typing import Any, Dict, Optional
+from dataclasses import dataclass, replace
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
 
 from tenacity import retry, stop_after_attempt, wait_exponential
 
+from utils.single_flight import SingleFlight, flight_key
 from workshop_app.redaction import redact_output, redact_text
 
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+log = logging.getLogger("workshop.llm_client")
+
 
 @dataclass
 class LLMResult:
@@ -17,6 +27,111 @@ class LLMResult:
     input_tokens: Optional[int]
     output_tokens: Optional[int]
     latency_ms: int
+    coalesced: bool = False  # served by an identical in-flight call (chat(coalesce=True))
+
+
+TEMPERATURE = 0.2
+
+# Identical concurrent chat(coalesce=True) calls share one completion.
+_flights = SingleFlight("workshop-llm")
+
+
+def coalesce_stats() -> Dict[str, int]:
+    return _flights.stats()
+
+
+@dataclass(frozen=True)
+class PoolConfig:
+    max_connections: int = 100
+    max_keepalive: int = 20
+    keepalive_expiry_s: float = 60.0
+    connect_timeout_s: float = 5.0
+    read_timeout_s: float = 60.0
+    write_timeout_s: float = 10.0
+    pool_timeout_s: float = 5.0
+    http2: bool = True
+
+    @classmethod
+    def from_env(cls) -> "PoolConfig":
+        return cls(
+            max_connections=int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "100")),
+            max_keepalive=int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "20")),
+            keepalive_expiry_s=float(os.getenv("LLM_KEEPALIVE_EXPIRY_S", "60")),
+            connect_timeout_s=float(os.getenv("LLM_CONNECT_TIMEOUT_S", "5")),
+            read_timeout_s=float(os.getenv("LLM_READ_TIMEOUT_S", "60")),
+            write_timeout_s=float(os.getenv("LLM_WRITE_TIMEOUT_S", "10")),
+            pool_timeout_s=float(os.getenv("LLM_POOL_TIMEOUT_S", "5")),
+            http2=os.getenv("LLM_HTTP2", "1") == "1",
+        )
+
+
+# One long-lived client per (base URL, API key): its httpx pool keeps connections
+# (and their TLS sessions) alive across calls and threads. Keys are hashed so the
+# registry never holds a readable secret of its own.
+_clients: Dict[Tuple[str, str], "OpenAI"] = {}
+_clients_lock = threading.Lock()
+
+
+def _registry_key(base_url: str, api_key: Optional[str]) -> Tuple[str, str]:
+    return base_url.rstrip("/"), hashlib.sha256((api_key or "").encode()).hexdigest()
+
+
+def _build_client(base_url: str, api_key: Optional[str], cfg: PoolConfig) -> "OpenAI":
+    import httpx
+    from openai import OpenAI
+
+    # HTTP/2 needs the optional `h2` package (httpx[http2]); without it the pool speaks HTTP/1.1 keep-alive.
+    http2 = cfg.http2 and importlib.util.find_spec("h2") is not None
+    http_client = httpx.Client(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=cfg.max_connections,
+            max_keepalive_connections=cfg.max_keepalive,
+            keepalive_expiry=cfg.keepalive_expiry_s,
+        ),
+        timeout=httpx.Timeout(
+            connect=cfg.connect_timeout_s,
+            read=cfg.read_timeout_s,
+            write=cfg.write_timeout_s,
+            pool=cfg.pool_timeout_s,
+        ),
+    )
+    log.info("LLM client created (base_url=%s, http2=%s, max_connections=%s)", base_url, http2, cfg.max_connections)
+    # max_retries=0: chat() already retries with tenacity, SDK retries would multiply the attempts.
+    return OpenAI(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=0)
+
+
+def get_client(
+    base_url: Optional[str] = None,
+    api_key: Optional[str] = None,
+    config: Optional[PoolConfig] = None,
+) -> "OpenAI":
+    """
+    Process-wide pooled client for `base_url` + `api_key` (defaults: OPENAI_BASE_URL / OPENAI_API_KEY).
+    The first call builds it with `config` (default: PoolConfig.from_env()); later calls reuse it.
+    """
+    base_url = base_url or os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+    api_key = api_key if api_key is not None else os.getenv("OPENAI_API_KEY")
+    key = _registry_key(base_url, api_key)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _clients[key] = _build_client(base_url, api_key, config or PoolConfig.from_env())
+    return client
+
+
+def close_clients() -> None:
+    """Close every pooled client (FastAPI shutdown). A later get_client() builds a fresh one."""
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        try:
+            client.close()
+        except Exception as e:
+            log.warning("LLM client close failed: %s", e)
 
 
 def _truncate(text: str, max_chars: int) -> str:
@@ -25,6 +140,17 @@ def _truncate(text: str, max_chars: int) -> str:
     return text[: max_chars - 20] + "\n...[TRUNCATED]"
 
 
+def _tag_current_span(key: str, value: Any) -> None:
+    try:
+        from ddtrace import tracer  # type: ignore
+
+        s = tracer.current_span()
+        if s is not None:
+            s.set_tag(key, value)
+    except Exception:
+        pass
+
+
 @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=0.5, min=0.5, max=4))
 def chat(
     user_text: str,
@@ -32,24 +158,43 @@ def chat(
     session_id: Optional[str] = None,
     prompt_id: str = "workshop.chat",
     prompt_version: str = "1.0.0",
+    coalesce: bool = False,
 ) -> LLMResult:
     """
     LLM call wrapped with Datadog LLM Observability span (manual).
     - Keeps deterministic instrumentation and avoids double-capture.
     - Adds optional prompt metadata for Prompt Tracking (preview feature).  [oai_citation:5‡docs.datadoghq.com](https://docs.datadoghq.com/llm_observability/setup/?utm_source=chatgpt.com)
+    - coalesce=True: a call identical to one already in flight (model, system/user text,
+      temperature, prompt version) waits for that call's result instead of paying for its own.
     """
     max_chars = int(os.getenv("WORKSHOP_MAX_INPUT_CHARS", "12000"))
     user_text = _truncate(user_text, max_chars)
     system_text = _truncate(system_text, max_chars)
+    model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+    if not coalesce:
+        return _chat_once(user_text, system_text, model, session_id, prompt_id, prompt_version)
 
-    from openai import OpenAI
-
-    client = OpenAI(
-        api_key=os.getenv("OPENAI_API_KEY"),
-        base_url=os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1"),
+    start = time.time()
+    key = flight_key(model, system_text, user_text, TEMPERATURE, prompt_id, prompt_version)
+    result, shared = _flights.do(
+        key, lambda: _chat_once(user_text, system_text, model, session_id, prompt_id, prompt_version)
     )
-    model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+    _tag_current_span("llm.coalesced", shared)
+    if shared:
+        log.debug("chat coalesced (prompt_id=%s, total=%s)", prompt_id, _flights.coalesced)
+        result = replace(result, latency_ms=int((time.time() - start) * 1000), coalesced=True)
+    return result
+
 
+def _chat_once(
+    user_text: str,
+    system_text: str,
+    model: str,
+    session_id: Optional[str],
+    prompt_id: str,
+    prompt_version: str,
+) -> LLMResult:
+    client = get_client()
     start = time.time()
 
     # Datadog LLMObs manual span
@@ -84,7 +229,7 @@ def chat(
                     {"role": "system", "content": system_text},
                     {"role": "user", "content": user_text},
                 ],
-                temperature=0.2,
+                temperature=TEMPERATURE,
             )
 
             content = resp.choices[0].message.content or ""
@@ -123,7 +268,7 @@ def chat(
                 {"role": "system", "content": system_text},
                 {"role": "user", "content": user_text},
             ],
-            temperature=0.2,
+            temperature=TEMPERATURE,
         )
         content = resp.choices[0].message.content or ""
         usage = getattr(resp, "usage", None)
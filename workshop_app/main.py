@@ -7,12 +7,15 @@ from typing import Optional
 from fastapi import FastAPI
 from pydantic import BaseModel
 
-from workshop_app.llm_client import chat
+from workshop_app.llm_client import chat, close_clients, coalesce_stats
 from workshop_app.observability import current_trace_ids, init_datadog_llmobs
 
 logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
 log = logging.getLogger("workshop.main")
 
+# Share one completion between identical concurrent /chat requests (double submits, retried clicks)
+CHAT_SINGLE_FLIGHT = os.getenv("CHAT_SINGLE_FLIGHT", "0") == "1"
+
 app = FastAPI(title="Datadog LLM Workshop API", version=os.getenv("DD_VERSION", "0.1.0"))
 
 
@@ -28,6 +31,7 @@ class ChatResponse(BaseModel):
     latency_ms: int
     input_tokens: Optional[int] = None
     output_tokens: Optional[int] = None
+    coalesced: bool = False
     trace_id: Optional[str] = None
     span_id: Optional[str] = None
 
@@ -39,9 +43,16 @@ def _startup() -> None:
     log.info("startup complete")
 
 
+@app.on_event("shutdown")
+def _shutdown() -> None:
+    # Drain the pooled LLM connections instead of leaving them to the interpreter teardown
+    close_clients()
+    log.info("shutdown complete")
+
+
 @app.get("/healthz")
 def healthz() -> dict:
-    return {"ok": True}
+    return {"ok": True, "single_flight": coalesce_stats()}
 
 
 @app.post("/chat", response_model=ChatResponse)
@@ -51,6 +62,7 @@ def chat_endpoint(req: ChatRequest) -> ChatResponse:
         user_text=req.query,
         system_text=system_text,
         session_id=req.session_id,
+        coalesce=CHAT_SINGLE_FLIGHT,
     )
     ids = current_trace_ids()
     return ChatResponse(
@@ -59,6 +71,7 @@ def chat_endpoint(req: ChatRequest) -> ChatResponse:
         latency_ms=result.latency_ms,
         input_tokens=result.input_tokens,
         output_tokens=result.output_tokens,
+        coalesced=result.coalesced,
         trace_id=ids["trace_id"],
         span_id=ids["span_id"],
     )